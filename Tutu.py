@@ -11,6 +11,12 @@ import comfy.utils
 import re
 import base64
 import uuid
+import copy
+import threading
+import atexit
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 # ===== 增强配置管理系统 =====
 class ConfigurationError(Exception):
@@ -29,6 +35,38 @@ logging.basicConfig(
     format='[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s'
 )
 logger = logging.getLogger('TutuAPI')
+# 节点消息由 NodeLogger 按各节点的 log_level 过滤，logger 本身放行 DEBUG
+logger.setLevel(logging.DEBUG)
+
+# 节点的日志详细程度选项；DEBUG 会输出逐行SSE解析等调试信息
+LOG_LEVELS = ["INFO", "DEBUG", "WARNING", "ERROR"]
+# 阶段耗时摘要的日志级别，OFF 表示只通过 timings 输出返回
+TIMINGS_LOG_LEVELS = ["INFO", "DEBUG", "OFF"]
+
+
+class NodeLogger(logging.LoggerAdapter):
+    """
+    按节点设置详细程度的 TutuAPI 日志器
+
+    级别由节点的 log_level 决定，与全局日志级别无关（TutuAPI logger 放行
+    DEBUG）；消息使用 %-格式化参数，未启用的级别不会构建任何字符串。
+    """
+
+    def __init__(self, logger, level=logging.INFO):
+        super().__init__(logger, {})
+        self.threshold = level
+
+    def set_verbosity(self, level_name):
+        self.threshold = getattr(logging, level_name, logging.INFO)
+
+    def isEnabledFor(self, level):
+        return level >= self.threshold and not self.logger.disabled
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            msg, kwargs = self.process(msg, kwargs)
+            self.logger.log(level, msg, *args, **kwargs)
+
 
 class TutuAPIError(Exception):
     """Tutu API 基础异常类"""
@@ -87,6 +125,16 @@ def create_error_output(message, error_type):
 
     return (error_tensor, message, error_type)
 
+def classify_api_error(error):
+    """返回错误类别：connection_error / timeout_error / response_format_error / general_error"""
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "connection_error"
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+        return "timeout_error"
+    if isinstance(error, json.JSONDecodeError):
+        return "response_format_error"
+    return "general_error"
+
 def handle_api_error(error, provider, context=""):
     """统一处理 API 错误"""
 
@@ -99,25 +147,19 @@ def handle_api_error(error, provider, context=""):
         "traceback": traceback.format_exc()
     }
 
-    logger.error(f"[Tutu Error] {debug_info}")
-    print(f"[Tutu Debug] {debug_info}")
+    logger.error("[Tutu Error] %s", debug_info)
 
     # 根据错误类型提供用户友好的消息
-    if isinstance(error, requests.exceptions.ConnectionError):
+    category = classify_api_error(error)
+    if category == "connection_error":
         user_message = f"无法连接到 {provider} 服务器，请检查网络连接"
-        return create_error_output(user_message, "connection_error")
-
-    elif isinstance(error, requests.exceptions.Timeout):
+    elif category == "timeout_error":
         user_message = f"{provider} 服务响应超时，请稍后重试"
-        return create_error_output(user_message, "timeout_error")
-
-    elif isinstance(error, json.JSONDecodeError):
+    elif category == "response_format_error":
         user_message = f"{provider} 返回了无效的响应格式"
-        return create_error_output(user_message, "response_format_error")
-
     else:
         user_message = f"{provider} 服务出现错误: {str(error)}"
-        return create_error_output(user_message, "general_error")
+    return create_error_output(user_message, category)
 
 def validate_image_response(images, expected_count, provider):
     """验证返回的图像数量和质量"""
@@ -128,7 +170,7 @@ def validate_image_response(images, expected_count, provider):
         )
 
     if len(images) != expected_count:
-        logger.warning(f"[Tutu Warning] {provider} 返回了 {len(images)} 张图像，期望 {expected_count} 张")
+        logger.warning("[Tutu Warning] %s 返回了 %s 张图像，期望 %s 张", provider, len(images), expected_count)
 
     # 验证图像有效性
     valid_images = []
@@ -136,7 +178,7 @@ def validate_image_response(images, expected_count, provider):
         if image and hasattr(image, 'size'):
             valid_images.append(image)
         else:
-            logger.warning(f"[Tutu Warning] 第 {i+1} 张图像无效，已跳过")
+            logger.warning("[Tutu Warning] 第 %s 张图像无效，已跳过", i + 1)
 
     if not valid_images:
         raise ImageGenerationError(
@@ -149,16 +191,22 @@ def validate_image_response(images, expected_count, provider):
 def log_api_call(provider, model, num_images, success=True):
     """记录 API 调用统计"""
     if success:
-        logger.info(f"成功调用 {provider} - {model} - 生成 {num_images} 张图像")
+        logger.info("成功调用 %s - %s - 生成 %s 张图像", provider, model, num_images)
     else:
-        logger.warning(f"调用 {provider} - {model} 失败")
+        logger.warning("调用 %s - %s 失败", provider, model)
 
 # ===== 统一错误处理系统结束 =====
 import folder_paths
 import mimetypes
 import cv2
 import shutil
-from .utils import pil2tensor, tensor2pil
+import tempfile
+from .file_utils import file_signature, atomic_write_json, file_lock, update_json_file
+from .preset_store import get_preset_store, DEFAULT_PRESETS
+from .telemetry import RSS_SAMPLE_INTERVAL, MemoryTracker, StageTimer, profilable, response_bytes
+from .metrics import UPLOADS, record_generation
+from .journal import new_request_id, record_request
+from .utils import pil2tensor, tensor2pil, decode_image_bytes, encode_image, downscale_to_max_side, IMAGE_ENCODING_OPTIONS, normalize_batch, BATCH_SIZE_MODES, decode_image_to_file, image_size, batch_memory_bytes, parse_resolution
 from comfy.utils import common_upscale
 from comfy.comfy_types import IO
 
@@ -218,31 +266,35 @@ def validate_api_key(provider, api_key):
 
     return True, "密钥格式有效"
 
+def mask_secret(value):
+    """只显示前4个和后4个字符"""
+    return f"{value[:4]}...{value[-4:]}" if len(value) > 8 else "***"
+
 def secure_log_config(config):
     """安全地记录配置信息，隐藏敏感数据"""
     safe_config = {}
     for key, value in config.items():
         if 'key' in key.lower() and isinstance(value, str):
-            # 只显示前4个和后4个字符
-            if len(value) > 8:
-                safe_config[key] = f"{value[:4]}...{value[-4:]}"
-            else:
-                safe_config[key] = "***"
+            safe_config[key] = mask_secret(value)
         else:
             safe_config[key] = value
     return safe_config
 
-def get_config():
-    """加载和验证API配置"""
-    global _config_cache, _config_cache_time
-
-    # 检查缓存是否有效
-    current_time = time.time()
-    if _config_cache and (current_time - _config_cache_time) < _config_cache_duration:
-        return _config_cache
-
-    config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Tutuapi.json')
-
+def secure_log_headers(headers):
+    """安全地记录请求头，隐藏 Authorization 中的密钥"""
+    safe_headers = dict(headers)
+    authorization = safe_headers.get("Authorization")
+    if isinstance(authorization, str):
+        scheme, _, token = authorization.rpartition(" ")
+        safe_headers["Authorization"] = f"{scheme} {mask_secret(token)}" if scheme else mask_secret(token)
+    return safe_headers
+
+def get_config_path():
+    """获取配置文件路径"""
+    return _config_path
+
+def _load_config_file(config_path):
+    """读取并迁移配置文件，出错时返回默认配置"""
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
@@ -254,10 +306,6 @@ def get_config():
             # 保存迁移后的配置
             save_config(config)
 
-        # 更新缓存
-        _config_cache = config
-        _config_cache_time = current_time
-
         # 安全日志输出
         safe_config = secure_log_config(config)
         print(f"[Tutu] 配置加载成功: {safe_config}")
@@ -268,43 +316,59 @@ def get_config():
         print("[Tutu] 配置文件不存在，创建默认配置")
         default_config = create_default_config()
         save_config(default_config)
-
-        # 更新缓存
-        _config_cache = default_config
-        _config_cache_time = current_time
-
         return default_config
     except json.JSONDecodeError as e:
         print(f"[Tutu] 配置文件JSON格式错误: {e}")
-        default_config = create_default_config()
-
-        # 更新缓存
-        _config_cache = default_config
-        _config_cache_time = current_time
-
-        return default_config
+        return create_default_config()
     except Exception as e:
         print(f"[Tutu] 配置加载错误: {e}")
-        default_config = create_default_config()
-
-        # 更新缓存
-        _config_cache = default_config
-        _config_cache_time = current_time
+        return create_default_config()
+
+def get_config_snapshot():
+    """
+    获取当前配置的只读快照（热路径使用）
+
+    快照只在配置文件的 mtime/size 变化时重新加载，并在锁内整体替换；
+    文件未变化时读取无需加锁，只有一次 stat 调用。
+    """
+    global _config_snapshot
+
+    config_path = get_config_path()
+    snapshot = _config_snapshot
+    if snapshot is not None and snapshot.signature == file_signature(config_path):
+        return snapshot.config
+
+    with _config_lock:
+        # 其他线程可能已经完成了重新加载
+        signature = file_signature(config_path)
+        snapshot = _config_snapshot
+        if snapshot is not None and snapshot.signature == signature:
+            return snapshot.config
+
+        # 先记录签名再读取：读取期间文件若被改写，下次调用会再次加载
+        config = dict(_load_config_file(config_path))
+        # 尚未写入的更新叠加在重新加载的配置上，其他进程改写文件时不会丢失
+        config.update(_pending_updates)
+        snapshot = ConfigSnapshot(signature, MappingProxyType(config))
+        _config_snapshot = snapshot
+        return snapshot.config
 
-        return default_config
+def get_config():
+    """加载和验证API配置，返回可修改的副本"""
+    return dict(get_config_snapshot())
 
 def save_config(config):
-    """保存配置文件"""
-    global _config_cache, _config_cache_time
+    """保存配置文件（跨进程文件锁 + 临时文件重命名，原子替换）"""
+    global _config_snapshot
 
-    config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Tutuapi.json')
+    config_path = get_config_path()
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        with file_lock(config_path):
+            atomic_write_json(config_path, config, indent=4)
+            signature = file_signature(config_path)
 
-        # 清除缓存，确保下次读取时重新加载
-        _config_cache = None
-        _config_cache_time = 0
+        # 直接用写入的内容更新快照，避免下次读取时重新加载
+        _config_snapshot = ConfigSnapshot(signature, MappingProxyType(dict(config)))
 
         # 安全日志输出
         safe_config = secure_log_config(config)
@@ -312,15 +376,66 @@ def save_config(config):
     except Exception as e:
         print(f"[Tutu] 配置保存失败: {e}")
 
+def update_config(updates):
+    """
+    合并配置更新（延迟写入）
+
+    值未变化时不做任何事；有变化时立即更新内存快照，文件写入合并后
+    由后台定时器在 _config_write_delay 秒后完成，进程退出时也会写入。
+    写入时只合并变化的键，其他进程同时写入的配置不会被覆盖。
+    返回是否有变化。
+    """
+    global _config_snapshot, _pending_updates, _config_write_timer
+
+    with _config_lock:
+        current = get_config_snapshot()
+        changed = {key: value for key, value in updates.items() if current.get(key) != value}
+        if not changed:
+            return False
+
+        config = dict(current)
+        config.update(changed)
+        # 保留当前文件签名：写入完成前快照保持有效，读取方不会重新加载旧文件
+        _config_snapshot = ConfigSnapshot(_config_snapshot.signature, MappingProxyType(config))
+        _pending_updates.update(changed)
+
+        if _config_write_timer is None:
+            _config_write_timer = threading.Timer(_config_write_delay, flush_config)
+            _config_write_timer.daemon = True
+            _config_write_timer.start()
+
+    return True
+
+def flush_config():
+    """立即写入等待中的配置更新（在文件锁内重新读取文件后合并）"""
+    global _config_snapshot, _pending_updates, _config_write_timer
+
+    with _config_lock:
+        updates = _pending_updates
+        _pending_updates = {}
+        if _config_write_timer is not None:
+            _config_write_timer.cancel()
+            _config_write_timer = None
+        if not updates:
+            return
+
+        config_path = get_config_path()
+        try:
+            config, signature = update_json_file(config_path, lambda data: data.update(updates),
+                                                 create_default_config(), indent=4)
+            _config_snapshot = ConfigSnapshot(signature, MappingProxyType(config))
+            print(f"[Tutu] 配置保存成功: {secure_log_config(config)}")
+        except Exception as e:
+            print(f"[Tutu] 配置保存失败: {e}")
+
 def clear_config_cache():
     """清除配置缓存"""
-    global _config_cache, _config_cache_time
-    _config_cache = None
-    _config_cache_time = 0
+    global _config_snapshot
+    _config_snapshot = None
 
 def get_api_key_for_provider(provider):
     """获取指定提供商的API密钥，带完整错误处理"""
-    config = get_config()
+    config = get_config_snapshot()
     key_mapping = {
         "ai.comfly.chat": "comfly_api_key",
         "OpenRouter": "openrouter_api_key",
@@ -364,10 +479,20 @@ ai.comfly.chat 配置说明:
     return help_messages.get(provider, "请检查API密钥配置")
 # ===== 增强配置管理系统结束 =====
 
-# 配置缓存优化
-_config_cache = None
-_config_cache_time = 0
-_config_cache_duration = 30  # 缓存30秒
+# 配置缓存优化：不可变快照，按配置文件 mtime/size 失效
+class ConfigSnapshot(NamedTuple):
+    signature: Optional[Tuple[int, int]]
+    config: Mapping
+
+_config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Tutuapi.json')
+_config_snapshot = None
+_config_lock = threading.RLock()
+
+# 延迟写入：等待写入的配置项及其定时器
+_pending_updates = {}
+_config_write_timer = None
+_config_write_delay = 2.0  # 秒
+atexit.register(flush_config)
 
 # 图片输入映射常量
 IMAGE_INPUT_MAPPING = [
@@ -378,6 +503,41 @@ IMAGE_INPUT_MAPPING = [
     ("input_image_5", "图片5")
 ]
 
+# 输入图片编码线程池（Pillow编码时释放GIL，多张输入图片可并行编码）
+_input_encode_pool = ThreadPoolExecutor(
+    max_workers=min(len(IMAGE_INPUT_MAPPING), os.cpu_count() or 1),
+    thread_name_prefix="tutu-encode"
+)
+
+# 各模型输入图片的长边上限（像素）。Gemini图像模型会在内部对输入下采样，
+# 超出上限的分辨率只会增加编码和上传耗时
+MODEL_INPUT_MAX_SIDE = {
+    "gemini-2.5-flash-image-preview": 2048,
+    "gemini-2.0-flash-preview-image-generation": 2048,
+    "google/gemini-2.5-flash-image-preview": 2048,
+    "gemini-2.5-flash-image": 2048,
+    "gemini-2.5-flash-image-hd": 3072,
+}
+DEFAULT_INPUT_MAX_SIDE = 2048
+
+def get_input_max_side(model):
+    """获取模型的输入图片长边上限"""
+    return MODEL_INPUT_MAX_SIDE.get(clean_model_name(model), DEFAULT_INPUT_MAX_SIDE)
+
+# 读取data URL图片尺寸时解码的base64前缀长度（字符，4的倍数）
+DATA_URL_HEADER_CHARS = 64 * 1024
+
+def data_url_image_size(url):
+    """只解码data URL开头的一段读取图片尺寸，不复制整个base64文本"""
+    start = url.find(',') + 1
+    if not start:
+        return None
+    head = url[start:start + DATA_URL_HEADER_CHARS]
+    try:
+        return image_size(base64.b64decode(head[:len(head) - len(head) % 4]))
+    except ValueError:
+        return None
+
 def get_image_inputs_list(input_image_1, input_image_2, input_image_3, input_image_4, input_image_5):
     """根据图片输入生成带标签的图片列表"""
     images = [input_image_1, input_image_2, input_image_3, input_image_4, input_image_5]
@@ -398,43 +558,30 @@ def clean_model_name(model_with_tag):
 
 
 # ===== 预设管理系统 =====
+# 预设通过共享的预设库读写（presets.json 内存索引，或可选的 SQLite 后端 presets.db）
 def get_presets_file():
     """获取预设文件路径"""
-    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'presets.json')
+    return get_preset_store().path
 
 def load_presets():
-    """加载预设配置"""
-    try:
-        with open(get_presets_file(), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    """加载预设配置（返回可修改的副本）"""
+    store = get_preset_store()
+    if not store.exists():
         # 如果文件不存在，创建默认结构
-        default_presets = {
-            "gemini": []
-        }
-        save_all_presets(default_presets)
-        return default_presets
-    except json.JSONDecodeError:
-        print("[Tutu] 预设文件格式错误，使用默认配置")
-        return {"gemini": []}
+        save_all_presets(copy.deepcopy(DEFAULT_PRESETS))
+    return copy.deepcopy(store.data())
 
 def save_all_presets(presets):
     """保存所有预设到文件"""
-    with open(get_presets_file(), 'w', encoding='utf-8') as f:
-        json.dump(presets, f, indent=2, ensure_ascii=False)
+    get_preset_store().save_all(presets)
 
 def save_preset(category, name, config, description=""):
     """保存单个预设"""
     if not name.strip():
         raise ValueError("预设名称不能为空")
-        
-    presets = load_presets()
-    if category not in presets:
-        presets[category] = []
     
     # 检查是否已存在同名预设
-    existing_names = [p["name"] for p in presets[category]]
-    if name in existing_names:
+    if get_preset_by_name(category, name) is not None:
         # 如果存在同名，添加时间戳后缀
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         name = f"{name}_{timestamp}"
@@ -448,73 +595,42 @@ def save_preset(category, name, config, description=""):
         "created_date": time.strftime("%Y-%m-%d %H:%M:%S")
     }
     
-    presets[category].append(preset)
-    save_all_presets(presets)
+    get_preset_store().add(category, preset)
     return preset["id"]
 
 def delete_preset(category, preset_id):
     """删除指定预设"""
-    presets = load_presets()
-    if category not in presets:
-        return False
-    
-    original_count = len(presets[category])
-    presets[category] = [p for p in presets[category] if p["id"] != preset_id]
-    
-    if len(presets[category]) < original_count:
-        save_all_presets(presets)
-        return True
-    return False
+    return get_preset_store().delete(category, preset_id)
 
 def get_preset_by_name(category, name):
     """根据名称获取预设"""
-    presets = load_presets()
-    if category not in presets:
-        return None
-    
-    for preset in presets[category]:
-        if preset["name"] == name:
-            return preset
-    return None
+    return get_preset_store().get_by_name(category, name)
 
 def get_preset_by_id(category, preset_id):
     """根据ID获取预设"""
-    presets = load_presets()
-    if category not in presets:
-        return None
-    
-    for preset in presets[category]:
-        if preset["id"] == preset_id:
-            return preset
-    return None
+    return get_preset_store().get_by_id(category, preset_id)
 
 def get_preset_names(category):
     """获取指定分类的所有预设名称"""
-    presets = load_presets()
-    if category not in presets:
-        return []
-    return [p["name"] for p in presets[category]]
+    return get_preset_store().get_names(category)
+
+def search_presets(query, category="gemini", limit=20):
+    """按名称、描述和提示词模板搜索预设"""
+    return get_preset_store().search(query, category, limit)
 
 def update_preset(category, preset_id, new_config=None, new_name=None, new_description=None):
     """更新现有预设"""
-    presets = load_presets()
-    if category not in presets:
-        return False
-    
-    for preset in presets[category]:
-        if preset["id"] == preset_id:
-            if new_config is not None:
-                preset["config"] = new_config
-            if new_name is not None:
-                preset["name"] = new_name
-            if new_description is not None:
-                preset["description"] = new_description
-            preset["updated_time"] = time.time()
-            preset["updated_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            save_all_presets(presets)
-            return True
-    return False
+    changes = {}
+    if new_config is not None:
+        changes["config"] = new_config
+    if new_name is not None:
+        changes["name"] = new_name
+    if new_description is not None:
+        changes["description"] = new_description
+    changes["updated_time"] = time.time()
+    changes["updated_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    return get_preset_store().update(category, preset_id, changes)
 
 # ===== 预设管理系统结束 =====
 
@@ -577,20 +693,65 @@ class TutuGeminiAPI:
                 "input_image_3": ("IMAGE",),
                 "input_image_4": ("IMAGE",),
                 "input_image_5": ("IMAGE",),
+                "input_image_encoding": (IMAGE_ENCODING_OPTIONS, {
+                    "default": "PNG",
+                    "tooltip": "Encoding for input images sent to the API: PNG/WebP are lossless, JPEG is high quality (q95), Auto picks by content"
+                }),
+                "max_input_image_kb": ("INT", {
+                    "default": 0, "min": 0, "max": 65536, "step": 256,
+                    "tooltip": "Byte budget per encoded input image in KB (0 = unlimited); smaller encodings are used when exceeded"
+                }),
+                "downscale_inputs": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Downscale to model limit",
+                    "label_off": "Send full resolution",
+                    "tooltip": "Shrink input images to the model's long-side limit before encoding"
+                }),
+                "batch_size_mode": (BATCH_SIZE_MODES, {
+                    "default": "pad to largest",
+                    "tooltip": "How generated images of different sizes are combined into one batch"
+                }),
+                "target_resolution": ("STRING", {
+                    "default": "1024x1024",
+                    "tooltip": "Output size (WIDTHxHEIGHT) for 'letterbox to target'"
+                }),
+                "log_level": (LOG_LEVELS, {
+                    "default": "INFO",
+                    "tooltip": "Console verbosity for this node; DEBUG traces request building and SSE parsing"
+                }),
+                "timings_log_level": (TIMINGS_LOG_LEVELS, {
+                    "default": "INFO",
+                    "tooltip": "Level at which the per-stage latency summary is logged (OFF = only the timings output)"
+                }),
+                "profile": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Run this execution under cProfile and tracemalloc; result paths are appended to the response"
+                }),
+                "memory_budget_mb": ("INT", {
+                    "default": 0, "min": 0, "max": 65536, "step": 64,
+                    "tooltip": "Memory budget per generation in MB (0 = unlimited); larger expected outputs are decoded in low-memory mode, spilling frames to temp files"
+                }),
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "STRING", "STRING")
-    RETURN_NAMES = ("generated_images", "response", "image_url")
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("generated_images", "response", "image_url", "timings")
     FUNCTION = "process"
     CATEGORY = "Tutu"
 
     def __init__(self):
-        config = get_config()
+        config = get_config_snapshot()
         self.comfly_api_key = config.get('comfly_api_key', config.get('api_key', ''))  # 向后兼容
         self.openrouter_api_key = config.get('openrouter_api_key', '')
         self.apicore_api_key = config.get('apicore_api_key', '')
         self.timeout = 120
+        self.image_encoding = "PNG"
+        self.image_byte_budget = 0
+        self.input_max_side = 0
+        self.memory_budget = 0
+        self.log = NodeLogger(logger)
+        self.timings = StageTimer()
+        self.timings_log_level = "INFO"
     
     def _truncate_base64_in_response(self, text, max_base64_len=100):
         """截断响应文本中的base64内容以避免刷屏"""
@@ -626,8 +787,7 @@ class TutuGeminiAPI:
         print(f"\n[Tutu] 📋 ======== 预设列表 ========")
         
         try:
-            presets = load_presets()
-            gemini_presets = presets.get("gemini", [])
+            gemini_presets = get_preset_store().get_presets("gemini")
             
             if not gemini_presets:
                 print(f"[Tutu] ⚪ 当前没有保存的预设")
@@ -683,22 +843,43 @@ class TutuGeminiAPI:
             # APICore.ai使用标准headers，无需额外配置
             pass
 
-        print(f"[Tutu DEBUG] Generated headers for {api_provider}: {headers}")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Generated headers for %s: %s", api_provider, secure_log_headers(headers))
         return headers
 
     def image_to_base64(self, image):
-        """将图片转换为base64，保持原始质量"""
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        """按当前编码策略将图片转换为base64，返回 (base64, MIME类型)"""
+        image_data, mime_type = encode_image(image, self.image_encoding, self.image_byte_budget)
+        return base64.b64encode(image_data).decode('utf-8'), mime_type
+
+    def _prepare_input_image(self, image_tensor):
+        """将输入tensor转换为data URL（tensor→PIL→编码→base64），在编码线程池中执行"""
+        pil_image = downscale_to_max_side(tensor2pil(image_tensor)[0], self.input_max_side)
+        image_base64, mime_type = self.image_to_base64(pil_image)
+        return f"data:{mime_type};base64,{image_base64}"
+
+    def _prepare_input_images(self, image_inputs):
+        """并行编码所有非空输入图片，结果按 IMAGE_INPUT_MAPPING 顺序返回 (变量名, 标签, data URL)"""
+        pending = [(image_var, image_tensor, image_label) for image_var, image_tensor, image_label in image_inputs
+                   if image_tensor is not None]
+        tensors = [image_tensor for _, image_tensor, _ in pending]
+
+        if len(tensors) > 1:
+            # map 保持提交顺序
+            image_urls = list(_input_encode_pool.map(self._prepare_input_image, tensors))
+        else:
+            image_urls = [self._prepare_input_image(image_tensor) for image_tensor in tensors]
+
+        return [(image_var, image_label, image_url)
+                for (image_var, _, image_label), image_url in zip(pending, image_urls)]
 
     def upload_image(self, image, max_retries=3):
         """上传图像到临时托管服务，支持多个备选服务"""
         
-        # 准备图像数据
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        buffered.seek(0)
+        # 准备图像数据（按当前编码策略编码）
+        with self.timings.span("image_encode"):
+            image_data, mime_type = encode_image(image, self.image_encoding, self.image_byte_budget)
+        file_name = "image." + mime_type.split('/')[1].replace('jpeg', 'jpg')
         
         # 备选上传服务列表（按优先级排序，使用最简单可靠的服务）
         upload_services = [
@@ -731,17 +912,21 @@ class TutuGeminiAPI:
                 "response_key": "url"
             }
         ]
-        
+
+        with self.timings.span("upload"):
+            return self._upload_with_fallback(upload_services, file_name, image_data, mime_type, max_retries)
+
+    def _upload_with_fallback(self, upload_services, file_name, image_data, mime_type, max_retries):
+        """按顺序尝试各上传服务，返回第一个成功的URL，全部失败时返回None"""
         for service in upload_services:
             for attempt in range(max_retries):
+                if attempt:
+                    self.timings.count("retries")
                 try:
-                    print(f"[Tutu DEBUG] 尝试上传到 {service['name']} (尝试 {attempt + 1}/{max_retries})...")
-                    
-                    # 重置buffer位置
-                    buffered.seek(0)
+                    self.log.debug("尝试上传到 %s (尝试 %s/%s)...", service['name'], attempt + 1, max_retries)
                     
                     # 准备文件上传
-                    files = {service['files_key']: ('image.png', buffered.getvalue(), 'image/png')}
+                    files = {service['files_key']: (file_name, image_data, mime_type)}
                     
                     # 准备额外数据（如果需要）
                     data = service.get('extra_data', {})
@@ -789,36 +974,39 @@ class TutuGeminiAPI:
                                         if not image_url:
                                             break
                             except Exception as e:
-                                print(f"[Tutu DEBUG] JSON解析失败: {str(e)}")
+                                self.log.debug("JSON解析失败: %s", e)
                                 # JSON解析失败，尝试纯文本
                                 image_url = response.text.strip()
                         
                         if image_url and image_url.startswith('http'):
-                            print(f"[Tutu DEBUG] 成功上传到 {service['name']}: {image_url}")
+                            self.log.debug("成功上传到 %s: %s", service['name'], image_url)
+                            UPLOADS.inc(service['name'], "success")
                             return image_url
                         else:
-                            print(f"[Tutu DEBUG] {service['name']} 响应格式异常: {result}")
+                            self.log.debug("%s 响应格式异常: %s", service['name'], result)
                     else:
-                        print(f"[Tutu DEBUG] {service['name']} 上传失败，状态码: {response.status_code}")
+                        self.log.debug("%s 上传失败，状态码: %s", service['name'], response.status_code)
+                    UPLOADS.inc(service['name'], "failure")
                         
                 except Exception as e:
-                    print(f"[Tutu DEBUG] {service['name']} 上传出错 (尝试 {attempt + 1}): {str(e)}")
+                    self.log.debug("%s 上传出错 (尝试 %s): %s", service['name'], attempt + 1, e)
+                    UPLOADS.inc(service['name'], "error")
                     if attempt < max_retries - 1:
                         time.sleep(1)  # 等待1秒后重试
                     continue
                     
         # 所有服务都失败，返回None
-        print(f"[Tutu DEBUG] 所有上传服务都失败，将使用压缩的base64格式")
+        self.log.debug("所有上传服务都失败，将使用压缩的base64格式")
         return None
 
     def process_apicore_response(self, response):
         """处理APICore.ai的标准JSON响应"""
         try:
-            print(f"[Tutu DEBUG] 开始处理APICore.ai标准JSON响应...")
+            self.log.debug("开始处理APICore.ai标准JSON响应...")
 
             # 解析JSON响应
             response_data = response.json()
-            print(f"[Tutu DEBUG] APICore.ai响应数据结构: {list(response_data.keys())}")
+            self.log.debug("APICore.ai响应数据结构: %s", list(response_data.keys()))
 
             # 提取图片URL - APICore.ai可能使用不同的响应格式
             image_content = ""
@@ -826,33 +1014,33 @@ class TutuGeminiAPI:
             # 常见的APICore.ai响应格式检查
             if 'data' in response_data:
                 data = response_data['data']
-                print(f"[Tutu DEBUG] 找到data字段，类型: {type(data)}")
+                self.log.debug("找到data字段，类型: %s", type(data))
 
                 if isinstance(data, list):
                     # 如果data是数组，遍历每个元素
                     for i, item in enumerate(data):
-                        print(f"[Tutu DEBUG] 处理data[{i}]: {list(item.keys()) if isinstance(item, dict) else type(item)}")
+                        self.log.debug("处理data[%s]: %s", i, list(item.keys()) if isinstance(item, dict) else type(item))
 
                         if isinstance(item, dict):
                             # 查找图片URL字段
                             for url_field in ['url', 'image_url', 'generated_image', 'data']:
                                 if url_field in item:
                                     url = item[url_field]
-                                    print(f"[Tutu DEBUG] 🎯 在data[{i}].{url_field}找到图片URL: {url[:50] if isinstance(url, str) else type(url)}...")
+                                    self.log.debug("🎯 在data[%s].%s找到图片URL: %s...", i, url_field, url[:50] if isinstance(url, str) else type(url))
                                     if isinstance(url, str):
                                         image_content += url + " "
                         elif isinstance(item, str) and ('http' in item or 'data:image/' in item):
                             # 如果数组元素直接是URL字符串
-                            print(f"[Tutu DEBUG] 🎯 data[{i}]直接是URL: {item[:50]}...")
+                            self.log.debug("🎯 data[%s]直接是URL: %s...", i, item[:50])
                             image_content += item + " "
 
                 elif isinstance(data, dict):
                     # 如果data是字典，直接查找URL字段
-                    print(f"[Tutu DEBUG] data是字典: {list(data.keys())}")
+                    self.log.debug("data是字典: %s", list(data.keys()))
                     for url_field in ['url', 'image_url', 'generated_image', 'data']:
                         if url_field in data:
                             url = data[url_field]
-                            print(f"[Tutu DEBUG] 🎯 在data.{url_field}找到图片URL: {url[:50] if isinstance(url, str) else type(url)}...")
+                            self.log.debug("🎯 在data.%s找到图片URL: %s...", url_field, url[:50] if isinstance(url, str) else type(url))
                             if isinstance(url, str):
                                 image_content += url + " "
 
@@ -860,27 +1048,27 @@ class TutuGeminiAPI:
             for url_field in ['url', 'image_url', 'generated_image', 'images', 'choices']:
                 if url_field in response_data:
                     value = response_data[url_field]
-                    print(f"[Tutu DEBUG] 检查顶级字段{url_field}: {type(value)}")
+                    self.log.debug("检查顶级字段%s: %s", url_field, type(value))
 
                     if isinstance(value, str) and ('http' in value or 'data:image/' in value):
-                        print(f"[Tutu DEBUG] 🎯 在顶级{url_field}找到图片URL: {value[:50]}...")
+                        self.log.debug("🎯 在顶级%s找到图片URL: %s...", url_field, value[:50])
                         image_content += value + " "
                     elif isinstance(value, list):
                         for i, item in enumerate(value):
                             if isinstance(item, str) and ('http' in item or 'data:image/' in item):
-                                print(f"[Tutu DEBUG] 🎯 在{url_field}[{i}]找到图片URL: {item[:50]}...")
+                                self.log.debug("🎯 在%s[%s]找到图片URL: %s...", url_field, i, item[:50])
                                 image_content += item + " "
                             elif isinstance(item, dict):
                                 # 查找嵌套的URL字段
                                 for nested_field in ['url', 'image_url', 'generated_image']:
                                     if nested_field in item and isinstance(item[nested_field], str):
                                         url = item[nested_field]
-                                        print(f"[Tutu DEBUG] 🎯 在{url_field}[{i}].{nested_field}找到图片URL: {url[:50]}...")
+                                        self.log.debug("🎯 在%s[%s].%s找到图片URL: %s...", url_field, i, nested_field, url[:50])
                                         image_content += url + " "
 
             # 如果仍然没有找到图片，尝试在整个响应中搜索
             if not image_content.strip():
-                print(f"[Tutu DEBUG] 未在标准字段找到图片，搜索整个响应...")
+                self.log.debug("未在标准字段找到图片，搜索整个响应...")
                 response_str = json.dumps(response_data)
 
                 # 使用正则表达式查找可能的图片URL
@@ -894,40 +1082,43 @@ class TutuGeminiAPI:
                 for pattern in patterns:
                     urls = re.findall(pattern, response_str)
                     if urls:
-                        print(f"[Tutu DEBUG] 🎯 用正则表达式{pattern}找到: {len(urls)}个URL")
+                        self.log.debug("🎯 用正则表达式%s找到: %s个URL", pattern, len(urls))
                         for url in urls:
-                            print(f"[Tutu DEBUG] 🎯 提取URL: {url[:50]}...")
+                            self.log.debug("🎯 提取URL: %s...", url[:50])
                             image_content += url + " "
                         break
 
             # 如果找到了图片内容，返回
             if image_content.strip():
-                print(f"[Tutu DEBUG] APICore.ai响应处理成功，找到{len(image_content.split())}个图片URL")
+                self.log.debug("APICore.ai响应处理成功，找到%s个图片URL", len(image_content.split()))
                 return image_content.strip()
             else:
                 # 如果没有找到图片，返回原始响应用于调试
-                print(f"[Tutu DEBUG] APICore.ai响应中未找到图片URL，返回原始响应")
-                print(f"[Tutu DEBUG] 完整响应结构: {json.dumps(response_data, indent=2)[:500]}...")
+                self.log.debug("APICore.ai响应中未找到图片URL，返回原始响应")
+                if self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug("完整响应结构: %s...", json.dumps(response_data, indent=2)[:500])
                 return json.dumps(response_data, ensure_ascii=False)
 
         except json.JSONDecodeError as e:
-            print(f"[Tutu ERROR] APICore.ai响应JSON解析失败: {e}")
+            self.log.error("APICore.ai响应JSON解析失败: %s", e)
             # 尝试直接返回文本内容
             response_text = response.text
-            print(f"[Tutu DEBUG] 尝试处理纯文本响应: {response_text[:200]}...")
+            self.log.debug("尝试处理纯文本响应: %s...", response_text[:200])
             return response_text
         except Exception as e:
-            print(f"[Tutu ERROR] APICore.ai响应处理出错: {e}")
+            self.log.error("APICore.ai响应处理出错: %s", e)
             return f"APICore.ai响应处理错误: {str(e)}"
 
     def process_sse_stream(self, response, api_provider="ai.comfly.chat"):
         """Process Server-Sent Events (SSE) stream from the API with provider-specific handling"""
         accumulated_content = ""
         chunk_count = 0
-        raw_response_parts = []
+        raw_response_count = 0
         current_json_buffer = ""
         
-        print(f"[Tutu DEBUG] 开始处理SSE流 (API: {api_provider})...")
+        # 逐行日志只在DEBUG级别构建，关闭时热路径不做任何字符串处理
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        self.log.debug("开始处理SSE流 (API: %s)...", api_provider)
         
         # Different APIs might have different response structures
         is_comfly = api_provider == "ai.comfly.chat"
@@ -937,16 +1128,17 @@ class TutuGeminiAPI:
         try:
             for line in response.iter_lines(decode_unicode=True, chunk_size=None):
                 if line:
-                    print(f"[Tutu DEBUG] SSE原始行: {repr(line[:100])}")
+                    if debug:
+                        self.log.debug("SSE原始行: %r", line[:100])
                     
                 if line and line.startswith('data: '):
                     chunk_count += 1
                     data_content = line[6:]  # Remove 'data: ' prefix
                     
-                    print(f"[Tutu DEBUG] 处理第{chunk_count}个数据块...")
+                    self.log.debug("处理第%s个数据块...", chunk_count)
                     
                     if data_content.strip() == '[DONE]':
-                        print(f"[Tutu DEBUG] 收到结束信号[DONE]")
+                        self.log.debug("收到结束信号[DONE]")
                         break
                     
                     # 累积可能被分割的JSON数据
@@ -955,7 +1147,8 @@ class TutuGeminiAPI:
                     try:
                         # 尝试解析累积的JSON
                         chunk_data = json.loads(current_json_buffer)
-                        print(f"[Tutu DEBUG] JSON解析成功: {list(chunk_data.keys())}")
+                        if debug:
+                            self.log.debug("JSON解析成功: %s", list(chunk_data.keys()))
                         
                         # 清空缓冲区，因为JSON解析成功了
                         current_json_buffer = ""
@@ -964,17 +1157,19 @@ class TutuGeminiAPI:
                         if 'choices' in chunk_data and chunk_data['choices']:
                             # 处理所有choices，支持多图生成
                             for choice_idx, choice in enumerate(chunk_data['choices']):
-                                print(f"[Tutu DEBUG] Choice {choice_idx} 结构: {choice}")
+                                self.log.debug("Choice %s 结构: %s", choice_idx, choice)
 
                                 # 检查delta中的所有字段
                                 if 'delta' in choice:
                                     delta = choice['delta']
-                                    print(f"[Tutu DEBUG] Choice {choice_idx} Delta所有字段: {list(delta.keys())}")
+                                    if debug:
+                                        self.log.debug("Choice %s Delta所有字段: %s", choice_idx, list(delta.keys()))
 
                                     # 检查content字段
                                     if 'content' in delta:
                                         content = delta['content']
-                                        print(f"[Tutu DEBUG] Choice {choice_idx} Delta.content: {repr(content[:200]) if content else 'None/Empty'}")
+                                        if debug:
+                                            self.log.debug("Choice %s Delta.content: %s", choice_idx, repr(content[:200]) if content else 'None/Empty')
                                         if content:
                                             # 修复编码问题
                                             try:
@@ -983,26 +1178,31 @@ class TutuGeminiAPI:
                                             except (UnicodeDecodeError, UnicodeEncodeError):
                                                 pass
                                             accumulated_content += content
-                                            print(f"[Tutu DEBUG] 添加choice {choice_idx} delta.content: {repr(content[:100])}")
+                                            if debug:
+                                                self.log.debug("添加choice %s delta.content: %r", choice_idx, content[:100])
 
                                     # 检查是否有其他包含图片数据的字段
                                     for key, value in delta.items():
                                         if key != 'content' and isinstance(value, str):
-                                            print(f"[Tutu DEBUG] Delta.{key}: {repr(value[:200]) if len(str(value)) > 200 else repr(value)}")
+                                            if debug:
+                                                self.log.debug("Delta.%s: %s", key, repr(value[:200]) if len(str(value)) > 200 else repr(value))
                                             # 检查是否是图片数据
                                             if 'data:image/' in str(value) or 'base64,' in str(value):
-                                                print(f"[Tutu DEBUG] 🎯找到图片数据在delta.{key}中!")
+                                                self.log.debug("🎯找到图片数据在delta.%s中!", key)
                                                 accumulated_content += str(value)
-                                                print(f"[Tutu DEBUG] 添加图片数据: {len(str(value))}字符")
+                                                if debug:
+                                                    self.log.debug("添加图片数据: %s字符", len(str(value)))
 
                                 # 检查message中的内容
                                 elif 'message' in choice:
                                     message = choice['message']
-                                    print(f"[Tutu DEBUG] Choice {choice_idx} Message所有字段: {list(message.keys())}")
+                                    if debug:
+                                        self.log.debug("Choice %s Message所有字段: %s", choice_idx, list(message.keys()))
 
                                     if 'content' in message:
                                         content = message['content']
-                                        print(f"[Tutu DEBUG] Choice {choice_idx} Message.content: {repr(content[:200]) if content else 'None/Empty'}")
+                                        if debug:
+                                            self.log.debug("Choice %s Message.content: %s", choice_idx, repr(content[:200]) if content else 'None/Empty')
                                         if content:
                                             try:
                                                 if isinstance(content, str):
@@ -1010,48 +1210,54 @@ class TutuGeminiAPI:
                                             except (UnicodeDecodeError, UnicodeEncodeError):
                                                 pass
                                             accumulated_content += content
-                                        print(f"[Tutu DEBUG] 添加message.content: {repr(content[:100])}")
+                                        if debug:
+                                            self.log.debug("添加message.content: %r", content[:100])
                                 
-                                # 检查message中的其他字段
-                                for key, value in message.items():
-                                    if key != 'content' and isinstance(value, str):
-                                        print(f"[Tutu DEBUG] Message.{key}: {repr(value[:200]) if len(str(value)) > 200 else repr(value)}")
-                                        # 检查是否是图片数据
-                                        if 'data:image/' in str(value) or 'base64,' in str(value):
-                                            print(f"[Tutu DEBUG] 🎯找到图片数据在message.{key}中!")
-                                            accumulated_content += str(value)
-                                            print(f"[Tutu DEBUG] 添加图片数据: {len(str(value))}字符")
+                                    # 检查message中的其他字段
+                                    for key, value in message.items():
+                                        if key != 'content' and isinstance(value, str):
+                                            if debug:
+                                                self.log.debug("Message.%s: %s", key, repr(value[:200]) if len(str(value)) > 200 else repr(value))
+                                            # 检查是否是图片数据
+                                            if 'data:image/' in str(value) or 'base64,' in str(value):
+                                                self.log.debug("🎯找到图片数据在message.%s中!", key)
+                                                accumulated_content += str(value)
+                                                if debug:
+                                                    self.log.debug("添加图片数据: %s字符", len(str(value)))
                             
-                            # 检查choice的其他字段，可能图片数据在别处
-                            for key, value in choice.items():
-                                if key not in ['delta', 'message', 'index', 'finish_reason', 'native_finish_reason', 'logprobs']:
-                                    if isinstance(value, str) and ('data:image/' in value or 'base64,' in value):
-                                        print(f"[Tutu DEBUG] 🎯找到图片数据在choice.{key}中!")
-                                        accumulated_content += value
-                                        print(f"[Tutu DEBUG] 添加图片数据: {len(value)}字符")
-                                    elif value:
-                                        print(f"[Tutu DEBUG] Choice.{key}: {repr(str(value)[:200])}")
+                                # 检查choice的其他字段，可能图片数据在别处
+                                for key, value in choice.items():
+                                    if key not in ['delta', 'message', 'index', 'finish_reason', 'native_finish_reason', 'logprobs']:
+                                        if isinstance(value, str) and ('data:image/' in value or 'base64,' in value):
+                                            self.log.debug("🎯找到图片数据在choice.%s中!", key)
+                                            accumulated_content += value
+                                            self.log.debug("添加图片数据: %s字符", len(value))
+                                        elif value:
+                                            if debug:
+                                                self.log.debug("Choice.%s: %r", key, str(value)[:200])
                         
                         # 检查整个chunk中是否有图片数据 - 针对不同API提供商
                         chunk_str = json.dumps(chunk_data)
                         
                         if is_comfly:
                             # comfly可能把图片数据放在不同的位置
-                            print(f"[Tutu DEBUG] 🔍 comfly专用检查: 搜索整个响应块")
+                            self.log.debug("🔍 comfly专用检查: 搜索整个响应块")
                             
                             # 检查是否有任何图片相关的字段
                             for key, value in chunk_data.items():
                                 if key not in ['id', 'object', 'created', 'model', 'system_fingerprint', 'choices', 'usage']:
                                     if isinstance(value, str) and ('data:image/' in value or 'http' in value):
-                                        print(f"[Tutu DEBUG] 🎯 comfly在{key}字段发现可能的图片数据!")
+                                        self.log.debug("🎯 comfly在%s字段发现可能的图片数据!", key)
                                         accumulated_content += " " + value
                                     elif value:
-                                        print(f"[Tutu DEBUG] comfly额外字段{key}: {repr(str(value)[:100])}")
+                                        if debug:
+                                            self.log.debug("comfly额外字段%s: %r", key, str(value)[:100])
                             
                             # 检查choices之外的图片数据
                             if 'data:image/' in chunk_str or 'generated_image' in chunk_str or 'image_url' in chunk_str:
-                                print(f"[Tutu DEBUG] 🎯 comfly JSON中发现图片相关数据!")
-                                print(f"[Tutu DEBUG] 完整chunk (前500字符): {chunk_str[:500]}")
+                                self.log.debug("🎯 comfly JSON中发现图片相关数据!")
+                                if debug:
+                                    self.log.debug("完整chunk (前500字符): %s", chunk_str[:500])
                                 
                                 # 尝试提取所有可能的图片URL
                                 import re
@@ -1065,44 +1271,45 @@ class TutuGeminiAPI:
                                 for pattern in patterns:
                                     urls = re.findall(pattern, chunk_str)
                                     if urls:
-                                        print(f"[Tutu DEBUG] 🎯 comfly用模式 {pattern} 找到: {len(urls)}个URL")
+                                        self.log.debug("🎯 comfly用模式 %s 找到: %s个URL", pattern, len(urls))
                                         for url in urls:
                                             if url.startswith('data:image/'):
-                                                print(f"[Tutu DEBUG] 🎯 comfly提取base64图片")
-                                            else:
-                                                print(f"[Tutu DEBUG] 🎯 comfly提取URL: {url[:50]}...") 
+                                                self.log.debug("🎯 comfly提取base64图片")
+                                            elif debug:
+                                                self.log.debug("🎯 comfly提取URL: %s...", url[:50])
                                             accumulated_content += " " + url
                                             
                         elif is_openrouter:
                             # OpenRouter的原有处理逻辑
                             if 'data:image/' in chunk_str:
-                                print(f"[Tutu DEBUG] 🎯 OpenRouter在JSON中发现图片数据!")
+                                self.log.debug("🎯 OpenRouter在JSON中发现图片数据!")
                                 import re
                                 image_urls_in_chunk = re.findall(r'data:image/[^"]+', chunk_str)
                                 if image_urls_in_chunk:
                                     for url in image_urls_in_chunk:
                                         if url.startswith('data:image/'):
-                                            print(f"[Tutu DEBUG] 🎯 OpenRouter提取base64图片")
-                                        else:
-                                            print(f"[Tutu DEBUG] 🎯 OpenRouter提取URL: {url[:50]}...")
+                                            self.log.debug("🎯 OpenRouter提取base64图片")
+                                        elif debug:
+                                            self.log.debug("🎯 OpenRouter提取URL: %s...", url[:50])
                                         accumulated_content += " " + url
 
                         elif is_apicore:
                             # APICore.ai 专用处理逻辑
-                            print(f"[Tutu DEBUG] 🔍 APICore.ai专用检查: 搜索图片数据")
+                            self.log.debug("🔍 APICore.ai专用检查: 搜索图片数据")
 
                             # 检查是否有任何图片相关的字段
                             for key, value in chunk_data.items():
                                 if key not in ['id', 'object', 'created', 'model', 'system_fingerprint', 'choices', 'usage']:
                                     if isinstance(value, str) and ('data:image/' in value or 'http' in value):
-                                        print(f"[Tutu DEBUG] 🎯 APICore.ai在{key}字段发现图片数据!")
+                                        self.log.debug("🎯 APICore.ai在%s字段发现图片数据!", key)
                                         accumulated_content += " " + value
                                     elif value:
-                                        print(f"[Tutu DEBUG] APICore.ai额外字段{key}: {repr(str(value)[:100])}")
+                                        if debug:
+                                            self.log.debug("APICore.ai额外字段%s: %r", key, str(value)[:100])
 
                             # 全面搜索APICore.ai中的图片数据
                             if 'data:image/' in chunk_str or 'generated_image' in chunk_str or 'image_url' in chunk_str:
-                                print(f"[Tutu DEBUG] 🎯 APICore.ai JSON中发现图片相关数据!")
+                                self.log.debug("🎯 APICore.ai JSON中发现图片相关数据!")
                                 import re
                                 patterns = [
                                     r'data:image/[^",\s]+',  # base64 图片
@@ -1114,25 +1321,27 @@ class TutuGeminiAPI:
                                 for pattern in patterns:
                                     urls = re.findall(pattern, chunk_str)
                                     if urls:
-                                        print(f"[Tutu DEBUG] 🎯 APICore.ai用模式找到: {len(urls)}个URL")
+                                        self.log.debug("🎯 APICore.ai用模式找到: %s个URL", len(urls))
                                         for url in urls:
                                             if url.startswith('data:image/'):
-                                                print(f"[Tutu DEBUG] 🎯 APICore.ai提取base64图片")
-                                            else:
-                                                print(f"[Tutu DEBUG] 🎯 APICore.ai提取URL: {url[:50]}...")
+                                                self.log.debug("🎯 APICore.ai提取base64图片")
+                                            elif debug:
+                                                self.log.debug("🎯 APICore.ai提取URL: %s...", url[:50])
                                             accumulated_content += " " + url
                         
-                        # 保存完整的响应数据用于调试
-                        raw_response_parts.append(chunk_data)
+                        # 只统计完整响应块数，不保留块数据
+                        raw_response_count += 1
                                 
                     except json.JSONDecodeError as e:
-                        print(f"[Tutu DEBUG] JSON解析失败: {e}")
-                        print(f"[Tutu DEBUG] 当前缓冲区内容: {repr(current_json_buffer[:200])}")
+                        self.log.debug("JSON解析失败: %s", e)
+                        if debug:
+                            self.log.debug("当前缓冲区内容: %r", current_json_buffer[:200])
                         # 不要清空缓冲区，可能还有更多数据到来
                         
                 elif line:
                     # 处理不以"data: "开头的行，它们可能是JSON的续行
-                    print(f"[Tutu DEBUG] 非data行: {repr(line[:100])}")
+                    if debug:
+                        self.log.debug("非data行: %r", line[:100])
                     if current_json_buffer:
                         # 如果有未完成的JSON，尝试添加这行
                         # 先尝试修复编码问题
@@ -1141,7 +1350,7 @@ class TutuGeminiAPI:
                             if isinstance(line, str) and '\\x' in repr(line):
                                 # 尝试修复UTF-8编码问题
                                 fixed_line = line.encode('latin1').decode('utf-8')
-                                print(f"[Tutu DEBUG] 编码修复后: {repr(fixed_line)}")
+                                self.log.debug("编码修复后: %r", fixed_line)
                             else:
                                 fixed_line = line
                         except (UnicodeDecodeError, UnicodeEncodeError):
@@ -1150,7 +1359,8 @@ class TutuGeminiAPI:
                         current_json_buffer += fixed_line
                         try:
                             chunk_data = json.loads(current_json_buffer)
-                            print(f"[Tutu DEBUG] 续行JSON解析成功: {list(chunk_data.keys())}")
+                            if debug:
+                                self.log.debug("续行JSON解析成功: %s", list(chunk_data.keys()))
                             
                             # 清空缓冲区
                             current_json_buffer = ""
@@ -1159,17 +1369,19 @@ class TutuGeminiAPI:
                             if 'choices' in chunk_data and chunk_data['choices']:
                                 # 处理所有choices，支持多图生成
                                 for choice_idx, choice in enumerate(chunk_data['choices']):
-                                    print(f"[Tutu DEBUG] 续行Choice {choice_idx} 结构: {choice}")
+                                    self.log.debug("续行Choice %s 结构: %s", choice_idx, choice)
 
                                     # 检查delta中的所有字段
                                     if 'delta' in choice:
                                         delta = choice['delta']
-                                        print(f"[Tutu DEBUG] 续行Choice {choice_idx} Delta所有字段: {list(delta.keys())}")
+                                        if debug:
+                                            self.log.debug("续行Choice %s Delta所有字段: %s", choice_idx, list(delta.keys()))
 
                                         # 检查content字段
                                         if 'content' in delta:
                                             content = delta['content']
-                                            print(f"[Tutu DEBUG] 续行Choice {choice_idx} Delta.content: {repr(content[:200]) if content else 'None/Empty'}")
+                                            if debug:
+                                                self.log.debug("续行Choice %s Delta.content: %s", choice_idx, repr(content[:200]) if content else 'None/Empty')
                                             if content:
                                                 try:
                                                     if isinstance(content, str):
@@ -1177,67 +1389,74 @@ class TutuGeminiAPI:
                                                 except (UnicodeDecodeError, UnicodeEncodeError):
                                                     pass
                                                 accumulated_content += content
-                                                print(f"[Tutu DEBUG] 从续行添加choice {choice_idx} delta.content: {repr(content[:100])}")
+                                                if debug:
+                                                    self.log.debug("从续行添加choice %s delta.content: %r", choice_idx, content[:100])
 
                                         # 检查其他字段中的图片数据
                                         for key, value in delta.items():
                                             if key != 'content' and isinstance(value, str):
-                                                print(f"[Tutu DEBUG] 续行Delta.{key}: {repr(value[:200]) if len(str(value)) > 200 else repr(value)}")
+                                                if debug:
+                                                    self.log.debug("续行Delta.%s: %s", key, repr(value[:200]) if len(str(value)) > 200 else repr(value))
                                                 if 'data:image/' in str(value) or 'base64,' in str(value):
-                                                    print(f"[Tutu DEBUG] 🎯续行中找到图片数据在delta.{key}!")
+                                                    self.log.debug("🎯续行中找到图片数据在delta.%s!", key)
                                                     accumulated_content += str(value)
-                                                print(f"[Tutu DEBUG] 从续行添加图片数据: {len(str(value))}字符")
+                                                if debug:
+                                                    self.log.debug("从续行添加图片数据: %s字符", len(str(value)))
                                         
-                                # 检查message中的内容
-                                elif 'message' in choice:
-                                    message = choice['message']
-                                    print(f"[Tutu DEBUG] 续行Message所有字段: {list(message.keys())}")
+                                    # 检查message中的内容
+                                    elif 'message' in choice:
+                                        message = choice['message']
+                                        if debug:
+                                            self.log.debug("续行Message所有字段: %s", list(message.keys()))
                                     
-                                    if 'content' in message:
-                                        content = message['content']
-                                        print(f"[Tutu DEBUG] 续行Message.content: {repr(content[:200]) if content else 'None/Empty'}")
-                                        if content:
-                                            try:
-                                                if isinstance(content, str):
-                                                    content = content.encode('latin1').decode('utf-8')
-                                            except (UnicodeDecodeError, UnicodeEncodeError):
-                                                pass
-                                            accumulated_content += content
-                                            print(f"[Tutu DEBUG] 从续行添加message.content: {repr(content[:100])}")
+                                        if 'content' in message:
+                                            content = message['content']
+                                            if debug:
+                                                self.log.debug("续行Message.content: %s", repr(content[:200]) if content else 'None/Empty')
+                                            if content:
+                                                try:
+                                                    if isinstance(content, str):
+                                                        content = content.encode('latin1').decode('utf-8')
+                                                except (UnicodeDecodeError, UnicodeEncodeError):
+                                                    pass
+                                                accumulated_content += content
+                                                if debug:
+                                                    self.log.debug("从续行添加message.content: %r", content[:100])
                                     
-                                    # 检查message中的其他字段
-                                    for key, value in message.items():
-                                        if key != 'content' and isinstance(value, str):
-                                            if 'data:image/' in str(value) or 'base64,' in str(value):
-                                                print(f"[Tutu DEBUG] 🎯续行中找到图片数据在message.{key}!")
-                                                accumulated_content += str(value)
-                                                print(f"[Tutu DEBUG] 从续行添加图片数据: {len(str(value))}字符")
+                                        # 检查message中的其他字段
+                                        for key, value in message.items():
+                                            if key != 'content' and isinstance(value, str):
+                                                if 'data:image/' in str(value) or 'base64,' in str(value):
+                                                    self.log.debug("🎯续行中找到图片数据在message.%s!", key)
+                                                    accumulated_content += str(value)
+                                                    if debug:
+                                                        self.log.debug("从续行添加图片数据: %s字符", len(str(value)))
                                 
-                                # 检查choice中的其他字段
-                                for key, value in choice.items():
-                                    if key not in ['delta', 'message', 'index', 'finish_reason', 'native_finish_reason', 'logprobs']:
-                                        if isinstance(value, str) and ('data:image/' in value or 'base64,' in value):
-                                            print(f"[Tutu DEBUG] 🎯续行中找到图片数据在choice.{key}!")
-                                            accumulated_content += value
-                                            print(f"[Tutu DEBUG] 从续行添加图片数据: {len(value)}字符")
+                                    # 检查choice中的其他字段
+                                    for key, value in choice.items():
+                                        if key not in ['delta', 'message', 'index', 'finish_reason', 'native_finish_reason', 'logprobs']:
+                                            if isinstance(value, str) and ('data:image/' in value or 'base64,' in value):
+                                                self.log.debug("🎯续行中找到图片数据在choice.%s!", key)
+                                                accumulated_content += value
+                                                self.log.debug("从续行添加图片数据: %s字符", len(value))
                             
                             # 续行中的图片数据检查 - 针对不同API提供商
                             chunk_str = json.dumps(chunk_data)
                             
                             if is_comfly:
                                 # comfly续行处理
-                                print(f"[Tutu DEBUG] 🔍 comfly续行检查: 搜索图片数据")
+                                self.log.debug("🔍 comfly续行检查: 搜索图片数据")
                                 
                                 # 检查顶级字段中的图片数据
                                 for key, value in chunk_data.items():
                                     if key not in ['id', 'object', 'created', 'model', 'system_fingerprint', 'choices', 'usage']:
                                         if isinstance(value, str) and ('data:image/' in value or 'http' in value):
-                                            print(f"[Tutu DEBUG] 🎯 comfly续行在{key}发现图片数据!")
+                                            self.log.debug("🎯 comfly续行在%s发现图片数据!", key)
                                             accumulated_content += " " + value
                                 
                                 # 全面搜索续行中的图片数据
                                 if 'data:image/' in chunk_str or 'generated_image' in chunk_str or 'image_url' in chunk_str:
-                                    print(f"[Tutu DEBUG] 🎯 comfly续行JSON中发现图片相关数据!")
+                                    self.log.debug("🎯 comfly续行JSON中发现图片相关数据!")
                                     import re
                                     patterns = [
                                         r'data:image/[^",\s]+',
@@ -1249,41 +1468,41 @@ class TutuGeminiAPI:
                                     for pattern in patterns:
                                         urls = re.findall(pattern, chunk_str)
                                         if urls:
-                                            print(f"[Tutu DEBUG] 🎯 comfly续行用模式找到: {len(urls)}个URL")
+                                            self.log.debug("🎯 comfly续行用模式找到: %s个URL", len(urls))
                                             for url in urls:
                                                 if url.startswith('data:image/'):
-                                                    print(f"[Tutu DEBUG] 🎯 comfly续行提取base64图片")
-                                                else:
-                                                    print(f"[Tutu DEBUG] 🎯 comfly续行提取URL: {url[:50]}...")
+                                                    self.log.debug("🎯 comfly续行提取base64图片")
+                                                elif debug:
+                                                    self.log.debug("🎯 comfly续行提取URL: %s...", url[:50])
                                                 accumulated_content += " " + url
                                                 
                             elif is_openrouter:
                                 # OpenRouter续行处理
                                 if 'data:image/' in chunk_str:
-                                    print(f"[Tutu DEBUG] 🎯 OpenRouter续行中发现图片数据!")
+                                    self.log.debug("🎯 OpenRouter续行中发现图片数据!")
                                     import re
                                     image_urls_in_chunk = re.findall(r'data:image/[^"]+', chunk_str)
                                     if image_urls_in_chunk:
                                         for url in image_urls_in_chunk:
                                             if url.startswith('data:image/'):
-                                                print(f"[Tutu DEBUG] 🎯 OpenRouter续行提取base64图片")
-                                            else:
-                                                print(f"[Tutu DEBUG] 🎯 OpenRouter续行提取URL: {url[:50]}...")
+                                                self.log.debug("🎯 OpenRouter续行提取base64图片")
+                                            elif debug:
+                                                self.log.debug("🎯 OpenRouter续行提取URL: %s...", url[:50])
                                             accumulated_content += " " + url
                             elif is_apicore:
                                 # APICore.ai续行处理
-                                print(f"[Tutu DEBUG] 🔍 APICore.ai续行检查: 搜索图片数据")
+                                self.log.debug("🔍 APICore.ai续行检查: 搜索图片数据")
 
                                 # 检查顶级字段中的图片数据
                                 for key, value in chunk_data.items():
                                     if key not in ['id', 'object', 'created', 'model', 'system_fingerprint', 'choices', 'usage']:
                                         if isinstance(value, str) and ('data:image/' in value or 'http' in value):
-                                            print(f"[Tutu DEBUG] 🎯 APICore.ai续行在{key}发现图片数据!")
+                                            self.log.debug("🎯 APICore.ai续行在%s发现图片数据!", key)
                                             accumulated_content += " " + value
 
                                 # 全面搜索续行中的图片数据
                                 if 'data:image/' in chunk_str or 'generated_image' in chunk_str or 'image_url' in chunk_str:
-                                    print(f"[Tutu DEBUG] 🎯 APICore.ai续行JSON中发现图片相关数据!")
+                                    self.log.debug("🎯 APICore.ai续行JSON中发现图片相关数据!")
                                     import re
                                     patterns = [
                                         r'data:image/[^",\s]+',
@@ -1295,141 +1514,123 @@ class TutuGeminiAPI:
                                     for pattern in patterns:
                                         urls = re.findall(pattern, chunk_str)
                                         if urls:
-                                            print(f"[Tutu DEBUG] 🎯 APICore.ai续行用模式找到: {len(urls)}个URL")
+                                            self.log.debug("🎯 APICore.ai续行用模式找到: %s个URL", len(urls))
                                             for url in urls:
                                                 if url.startswith('data:image/'):
-                                                    print(f"[Tutu DEBUG] 🎯 APICore.ai续行提取base64图片")
-                                                else:
-                                                    print(f"[Tutu DEBUG] 🎯 APICore.ai续行提取URL: {url[:50]}...")
+                                                    self.log.debug("🎯 APICore.ai续行提取base64图片")
+                                                elif debug:
+                                                    self.log.debug("🎯 APICore.ai续行提取URL: %s...", url[:50])
                                                 accumulated_content += " " + url
                             
-                            # 保存完整的响应数据用于调试
-                            raw_response_parts.append(chunk_data)
+                            # 只统计完整响应块数，不保留块数据
+                            raw_response_count += 1
                             
                         except json.JSONDecodeError as e:
-                            print(f"[Tutu DEBUG] 续行JSON仍然解析失败: {e}")
+                            self.log.debug("续行JSON仍然解析失败: %s", e)
                             # 仍然不完整，继续等待
                             pass
                         
         except Exception as e:
-            print(f"[Tutu ERROR] SSE流处理错误: {e}")
+            self.log.error("SSE流处理错误: %s", e)
             
-        print(f"[Tutu DEBUG] SSE处理完成:")
-        print(f"[Tutu DEBUG] - 总共处理了{chunk_count}个数据块")
-        print(f"[Tutu DEBUG] - 累积内容长度: {len(accumulated_content)}")
-        
-        # 简单截断长内容，避免base64刷屏
-        if 'data:image/' in accumulated_content:
-            base64_count = accumulated_content.count('data:image/')
-            print(f"[Tutu DEBUG] - 累积内容: 包含{base64_count}个base64图片 + 文本({len(accumulated_content)}字符)")
-        elif len(accumulated_content) > 200:
-            print(f"[Tutu DEBUG] - 累积内容: {repr(accumulated_content[:200])}...")
-        else:
-            print(f"[Tutu DEBUG] - 累积内容: {repr(accumulated_content)}")
-        
-        print(f"[Tutu DEBUG] - 完整响应块数: {len(raw_response_parts)}")
+        if debug:
+            self.log.debug("SSE处理完成:")
+            self.log.debug("- 总共处理了%s个数据块", chunk_count)
+            self.log.debug("- 累积内容长度: %s", len(accumulated_content))
+
+            # 简单截断长内容，避免base64刷屏
+            if 'data:image/' in accumulated_content:
+                base64_count = accumulated_content.count('data:image/')
+                self.log.debug("- 累积内容: 包含%s个base64图片 + 文本(%s字符)", base64_count, len(accumulated_content))
+            elif len(accumulated_content) > 200:
+                self.log.debug("- 累积内容: %r...", accumulated_content[:200])
+            else:
+                self.log.debug("- 累积内容: %r", accumulated_content)
+
+            self.log.debug("- 完整响应块数: %s", raw_response_count)
             
         return accumulated_content
 
     def extract_image_urls(self, response_text):
-        print(f"[Tutu DEBUG] 开始提取图片URL...")
-        print(f"[Tutu DEBUG] 响应文本长度: {len(response_text)}")
+        self.log.debug("开始提取图片URL...")
+        self.log.debug("响应文本长度: %s", len(response_text))
         
         # 简单处理响应文本，避免base64刷屏
-        if 'data:image/' in response_text:
-            base64_count = response_text.count('data:image/')
-            print(f"[Tutu DEBUG] 响应文本: 包含{base64_count}个base64图片({len(response_text)}字符)")
-        elif len(response_text) > 500:
-            print(f"[Tutu DEBUG] 响应文本内容: {response_text[:500]}...")
-        else:
-            print(f"[Tutu DEBUG] 响应文本内容: {response_text}")
+        if self.log.isEnabledFor(logging.DEBUG):
+            if 'data:image/' in response_text:
+                base64_count = response_text.count('data:image/')
+                self.log.debug("响应文本: 包含%s个base64图片(%s字符)", base64_count, len(response_text))
+            elif len(response_text) > 500:
+                self.log.debug("响应文本内容: %s...", response_text[:500])
+            else:
+                self.log.debug("响应文本内容: %s", response_text)
         
         # Check for markdown image format
-        print(f"[Tutu DEBUG] 1. 检查markdown图片格式...")
+        self.log.debug("1. 检查markdown图片格式...")
         image_pattern = r'!\[.*?\]\((.*?)\)'
         matches = re.findall(image_pattern, response_text)
         if matches:
             # 简单显示URL数量，避免刷屏
             base64_count = sum(1 for url in matches if url.startswith('data:image/'))
             http_count = len(matches) - base64_count
-            print(f"[Tutu DEBUG] 找到markdown图片: {base64_count}个base64图片, {http_count}个HTTP链接")
+            self.log.debug("找到markdown图片: %s个base64图片, %s个HTTP链接", base64_count, http_count)
             return matches
 
         # Check for direct HTTP image URLs  
-        print(f"[Tutu DEBUG] 2. 检查直接HTTP图片URL...")
+        self.log.debug("2. 检查直接HTTP图片URL...")
         url_pattern = r'https?://\S+\.(?:jpg|jpeg|png|gif|webp)'
         matches = re.findall(url_pattern, response_text)
         if matches:
-            print(f"[Tutu DEBUG] 找到HTTP图片URL: {len(matches)}个")
+            self.log.debug("找到HTTP图片URL: %s个", len(matches))
             return matches
         
         # Check for any URLs
-        print(f"[Tutu DEBUG] 3. 检查任何URL...")
+        self.log.debug("3. 检查任何URL...")
         all_url_pattern = r'https?://[^\s)]+'
         matches = re.findall(all_url_pattern, response_text)
         if matches:
-            print(f"[Tutu DEBUG] 找到一般URL: {len(matches)}个")
+            self.log.debug("找到一般URL: %s个", len(matches))
             return matches
             
         # Check for base64 data URLs
-        print(f"[Tutu DEBUG] 4. 检查base64数据URL...")
+        self.log.debug("4. 检查base64数据URL...")
         base64_pattern = r'data:image/[^;]+;base64,[A-Za-z0-9+/=]+'
         matches = re.findall(base64_pattern, response_text)
         if matches:
-            print(f"[Tutu DEBUG] 找到base64 URL: {len(matches)}个")
+            self.log.debug("找到base64 URL: %s个", len(matches))
             return matches
         
-        print(f"[Tutu DEBUG] 未找到任何图片URL")
+        self.log.debug("未找到任何图片URL")
         return []
 
     def resize_to_target_size(self, image, target_size):
         """Resize image to target size while preserving aspect ratio with padding"""
-
-        img_width, img_height = image.size
-        target_width, target_height = target_size
-
-        width_ratio = target_width / img_width
-        height_ratio = target_height / img_height
-        scale = min(width_ratio, height_ratio)
-
-        new_width = int(img_width * scale)
-        new_height = int(img_height * scale)
-
-        resized_img = image.resize((new_width, new_height), Image.LANCZOS)
-
-        new_img = Image.new("RGB", (target_width, target_height), (255, 255, 255))
-
-        paste_x = (target_width - new_width) // 2
-        paste_y = (target_height - new_height) // 2
- 
-        new_img.paste(resized_img, (paste_x, paste_y))
-        
-        return new_img
+        batch = normalize_batch([np.asarray(image.convert("RGB"))], "letterbox to target", target_size)
+        return tensor2pil(batch)[0]
 
     def parse_resolution(self, resolution_str):
         """Parse resolution string (e.g., '1024x1024') to width and height"""
-        width, height = map(int, resolution_str.split('x'))
-        return (width, height)
+        return parse_resolution(resolution_str)
 
     def _log_process_start(self, prompt, api_provider, model, input_image_1, input_image_2, input_image_3, input_image_4, input_image_5):
         """记录处理开始时的调试信息"""
-        print(f"\n[Tutu DEBUG] ========== Starting Gemini API Process ==========")
-        print(f"[Tutu DEBUG] Parameters:")
-        print(f"[Tutu DEBUG] - API Provider: {api_provider}")
-        print(f"[Tutu DEBUG] - Model: {model}")
-        print(f"[Tutu DEBUG] - Prompt length: {len(prompt) if prompt else 0}")
-        print(f"[Tutu DEBUG] - Has input_image_1: {input_image_1 is not None}")
-        print(f"[Tutu DEBUG] - Has input_image_2: {input_image_2 is not None}")
-        print(f"[Tutu DEBUG] - Has input_image_3: {input_image_3 is not None}")
-        print(f"[Tutu DEBUG] - Has input_image_4: {input_image_4 is not None}")
-        print(f"[Tutu DEBUG] - Has input_image_5: {input_image_5 is not None}")
+        self.log.debug("========== Starting Gemini API Process ==========")
+        self.log.debug("Parameters:")
+        self.log.debug("- API Provider: %s", api_provider)
+        self.log.debug("- Model: %s", model)
+        self.log.debug("- Prompt length: %s", len(prompt) if prompt else 0)
+        self.log.debug("- Has input_image_1: %s", input_image_1 is not None)
+        self.log.debug("- Has input_image_2: %s", input_image_2 is not None)
+        self.log.debug("- Has input_image_3: %s", input_image_3 is not None)
+        self.log.debug("- Has input_image_4: %s", input_image_4 is not None)
+        self.log.debug("- Has input_image_5: %s", input_image_5 is not None)
 
         # Display model selection guide
-        print(f"\n[Tutu INFO] 💡 Model Selection Guide:")
-        print(f"[Tutu INFO] • For ai.comfly.chat: Select [Comfly] tagged models")
-        print(f"[Tutu INFO] • For OpenRouter: Select [OpenRouter] tagged models")
-        print(f"[Tutu INFO] • For APICore.ai: Select [APICore] tagged models")
-        print(f"[Tutu INFO] • Current combination: {api_provider} + {model}")
+        self.log.debug("💡 Model Selection Guide:")
+        self.log.debug("• For ai.comfly.chat: Select [Comfly] tagged models")
+        self.log.debug("• For OpenRouter: Select [OpenRouter] tagged models")
+        self.log.debug("• For APICore.ai: Select [APICore] tagged models")
+        self.log.debug("• Current combination: %s + %s", api_provider, model)
 
     def _get_api_endpoint(self, api_provider):
         """根据API提供商获取端点URL"""
@@ -1452,25 +1653,25 @@ class TutuGeminiAPI:
         for image_var, image_tensor, image_label in image_inputs:
             if image_tensor is not None:
                 try:
-                    # 转换tensor为PIL图像
-                    pil_image = tensor2pil(image_tensor)
+                    # 转换tensor为PIL图像，并缩小到模型的输入上限
+                    pil_image = downscale_to_max_side(tensor2pil(image_tensor)[0], self.input_max_side)
                     # 上传图像获得URL
                     image_url = self.upload_image(pil_image)
                     if image_url:
                         image_urls.append(image_url)
-                        print(f"[Tutu] {image_label}上传成功: {image_url}")
+                        self.log.info("%s上传成功: %s", image_label, image_url)
                     else:
-                        print(f"[Tutu Warning] {image_label}上传失败")
+                        self.log.warning("%s上传失败", image_label)
                 except Exception as e:
-                    print(f"[Tutu Error] {image_label}处理失败: {str(e)}")
+                    self.log.error("%s处理失败: %s", image_label, e)
 
         if image_urls:
             # 构建多图片参考格式: "URL1 URL2 用户描述"
             final_prompt = f"{' '.join(image_urls)} {prompt}"
-            print(f"[Tutu] APICore.ai多图片参考: {len(image_urls)}张图片 + 用户描述")
+            self.log.info("APICore.ai多图片参考: %s张图片 + 用户描述", len(image_urls))
             return final_prompt
         else:
-            print("[Tutu Warning] 所有图片上传失败，使用纯文本模式")
+            self.log.warning("所有图片上传失败，使用纯文本模式")
             return prompt
 
     def _build_request_content(self, prompt, api_provider, num_images, input_image_1, input_image_2, input_image_3, input_image_4, input_image_5):
@@ -1485,28 +1686,24 @@ class TutuGeminiAPI:
             # 对于图片编辑任务，先添加图片，再添加指令文本
             image_inputs = get_image_inputs_list(input_image_1, input_image_2, input_image_3, input_image_4, input_image_5)
 
-            for image_var, image_tensor, image_label in image_inputs:
-                if image_tensor is not None:
-                    pil_image = tensor2pil(image_tensor)[0]
-                    print(f"[Tutu DEBUG] 处理 {image_var} (标识为 {image_label})...")
-
-                    # 统一使用base64格式，保持原始质量
-                    print(f"[Tutu DEBUG] {image_var} 使用base64格式...")
-                    image_base64 = self.image_to_base64(pil_image)
-                    image_url = f"data:image/png;base64,{image_base64}"
-                    print(f"[Tutu DEBUG] {image_var} base64大小: {len(image_base64)} 字符")
-
-                    # 先添加图片标识文本
-                    content.append({
-                        "type": "text",
-                        "text": f"[这是{image_label}]"
-                    })
-
-                    # 再添加图片
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {"url": image_url}
-                    })
+            # 统一使用base64格式，编码方式由 input_image_encoding 决定，多张图片并行编码
+            self.log.debug("使用base64格式编码输入图片 (%s)...", self.image_encoding)
+            with self.timings.span("image_encode"):
+                prepared_images = self._prepare_input_images(image_inputs)
+            for image_var, image_label, image_url in prepared_images:
+                self.log.debug("%s (标识为 %s) data URL大小: %s 字符", image_var, image_label, len(image_url))
+
+                # 先添加图片标识文本
+                content.append({
+                    "type": "text",
+                    "text": f"[这是{image_label}]"
+                })
+
+                # 再添加图片
+                content.append({
+                    "type": "image_url",
+                    "image_url": {"url": image_url}
+                })
 
             # 添加文本指令
             if api_provider == "ai.comfly.chat":
@@ -1541,7 +1738,7 @@ MUST return a generated image, not text description."""
 
             # 计算图片数量（每张图片对应两个元素：标签+图片）
             image_count = sum(1 for _, img, _ in image_inputs if img is not None)
-            print(f"[Tutu DEBUG] content数组长度: {len(content)} (图片: {image_count}, 图片标签: {image_count}, 文本指令: 1)")
+            self.log.debug("content数组长度: %s (图片: %s, 图片标签: %s, 文本指令: 1)", len(content), image_count, image_count)
         else:
             # 生成图片任务（无输入图片）
             if num_images == 1:
@@ -1563,33 +1760,29 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
 
     def _update_api_keys(self, comfly_api_key, openrouter_api_key, apicore_api_key):
         """更新API密钥配置"""
-        config_changed = False
-        config = get_config()
+        updates = {}
 
         # 处理 comfly API key
         if comfly_api_key.strip():
-            print(f"[Tutu DEBUG] Using provided comfly API key: {comfly_api_key[:10]}...")
+            self.log.debug("Using provided comfly API key: %s...", comfly_api_key[:10])
             self.comfly_api_key = comfly_api_key
-            config['comfly_api_key'] = comfly_api_key
-            config_changed = True
+            updates['comfly_api_key'] = comfly_api_key
 
         # 处理 OpenRouter API key
         if openrouter_api_key.strip():
-            print(f"[Tutu DEBUG] Using provided OpenRouter API key: {openrouter_api_key[:10]}...")
+            self.log.debug("Using provided OpenRouter API key: %s...", openrouter_api_key[:10])
             self.openrouter_api_key = openrouter_api_key
-            config['openrouter_api_key'] = openrouter_api_key
-            config_changed = True
+            updates['openrouter_api_key'] = openrouter_api_key
 
         # 处理 APICore.ai API key
         if apicore_api_key.strip():
-            print(f"[Tutu DEBUG] Using provided APICore.ai API key: {apicore_api_key[:10]}...")
+            self.log.debug("Using provided APICore.ai API key: %s...", apicore_api_key[:10])
             self.apicore_api_key = apicore_api_key
-            config['apicore_api_key'] = apicore_api_key
-            config_changed = True
+            updates['apicore_api_key'] = apicore_api_key
 
-        # 保存配置
-        if config_changed:
-            save_config(config)
+        # 只有密钥变化时才保存配置（延迟写入，不阻塞执行）
+        if updates:
+            update_config(updates)
 
     def _sanitize_content_for_debug(self, content):
         """Sanitize content for debug logging"""
@@ -1633,20 +1826,20 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
 
             # 验证提供商匹配
             if api_provider == "OpenRouter" and provider_tag != "OpenRouter":
-                print(f"[Tutu WARNING] 选择了OpenRouter但模型是{provider_tag}的")
+                self.log.warning("选择了OpenRouter但模型是%s的", provider_tag)
                 return None
             elif api_provider == "ai.comfly.chat" and provider_tag != "Comfly":
-                print(f"[Tutu WARNING] 选择了ai.comfly.chat但模型是{provider_tag}的")
+                self.log.warning("选择了ai.comfly.chat但模型是%s的", provider_tag)
                 return None
             elif api_provider == "APICore.ai" and provider_tag != "APICore":
-                print(f"[Tutu WARNING] 选择了APICore.ai但模型是{provider_tag}的")
+                self.log.warning("选择了APICore.ai但模型是%s的", provider_tag)
                 return None
 
-            print(f"[Tutu DEBUG] 解析模型: {provider_tag} -> {actual_model}")
+            self.log.debug("解析模型: %s -> %s", provider_tag, actual_model)
             return actual_model
 
         except Exception as e:
-            print(f"[Tutu ERROR] 模型名称解析失败: {e}")
+            self.log.error("模型名称解析失败: %s", e)
             return model_with_tag
 
     def _get_model_suggestions(self, api_provider):
@@ -1735,45 +1928,72 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
 
 **注意**: API密钥是敏感信息，请妥善保管。"""
 
+    @profilable("gemini", report_index=1)
     def process(self, prompt, api_provider, model, num_images, temperature, top_p, timeout=120,
                 input_image_1=None, input_image_2=None, input_image_3=None, input_image_4=None, input_image_5=None,
-                comfly_api_key="", openrouter_api_key="", apicore_api_key=""):
+                comfly_api_key="", openrouter_api_key="", apicore_api_key="",
+                input_image_encoding="PNG", max_input_image_kb=0, downscale_inputs=True,
+                batch_size_mode="pad to largest", target_resolution="1024x1024", log_level="INFO",
+                timings_log_level="INFO", profile=False, memory_budget_mb=0):
+
+        self.log.set_verbosity(log_level)
+        # 只有输出耗时日志或设置了内存预算时才启动后台RSS采样，否则只在各阶段结束时采样
+        sample_interval = RSS_SAMPLE_INTERVAL if timings_log_level != "OFF" or memory_budget_mb else 0
+        self.timings = StageTimer(MemoryTracker(sample_interval), request_id=new_request_id(), provider=api_provider, model=model,
+                                  images_requested=num_images)
+        self.timings_log_level = timings_log_level
 
         # 记录处理开始信息
         self._log_process_start(prompt, api_provider, model, input_image_1, input_image_2, input_image_3, input_image_4, input_image_5)
 
         # 根据API提供商设置端点
         api_endpoint = self._get_api_endpoint(api_provider)
-        print(f"[Tutu DEBUG] API Endpoint: {api_endpoint}")
+        self.log.debug("API Endpoint: %s", api_endpoint)
 
         # 处理模型选择并验证
         actual_model = self._parse_and_validate_model(model, api_provider)
         if not actual_model:
             suggestions = self._get_model_suggestions(api_provider)
             error_msg = f"❌ 模型选择错误！\n\n当前选择: '{model}'\nAPI提供商: '{api_provider}'\n\n💡 建议选择:\n{suggestions}\n\n请重新选择正确的模型。"
-            print(f"[Tutu ERROR] {error_msg}")
+            self.log.error("%s", error_msg)
             return self.handle_error(input_image_1, input_image_2, input_image_3, input_image_4, input_image_5, error_msg)
 
         model = actual_model
-        print(f"[Tutu DEBUG] Using actual model: {model}")
+        self.log.debug("Using actual model: %s", model)
+
+        # 输入图片长边上限（关闭时发送原始分辨率）
+        self.input_max_side = get_input_max_side(model) if downscale_inputs else 0
+        self.log.debug("Input image max side: %s", self.input_max_side or 'unlimited')
 
         # 处理API Key更新和保存
         self._update_api_keys(comfly_api_key, openrouter_api_key, apicore_api_key)
             
         # 显示当前使用的API key
         current_api_key = self.get_current_api_key(api_provider)
-        print(f"[Tutu DEBUG] Using {api_provider} API key: {current_api_key[:10] if current_api_key else 'None'}...")
+        self.log.debug("Using %s API key: %s...", api_provider, current_api_key[:10] if current_api_key else 'None')
 
         self.timeout = timeout
-        
-        print(f"[Tutu DEBUG] Final parameters:")
-        print(f"[Tutu DEBUG] - Model: {model}")
-        print(f"[Tutu DEBUG] - Temperature: {temperature}")
-        print(f"[Tutu DEBUG] - API Key length: {len(current_api_key) if current_api_key else 0}")
+        self.image_encoding = input_image_encoding
+        self.image_byte_budget = max_input_image_kb * 1024
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+
+        target_size = None
+        if batch_size_mode == "letterbox to target":
+            try:
+                target_size = self.parse_resolution(target_resolution)
+            except ValueError:
+                self.log.warning("无效的目标分辨率 '%s'，改用 pad to largest", target_resolution)
+                batch_size_mode = "pad to largest"
+
+        self.log.debug("Final parameters:")
+        self.log.debug("- Model: %s", model)
+        self.log.debug("- Temperature: %s", temperature)
+        self.log.debug("- API Key length: %s", len(current_api_key) if current_api_key else 0)
         
         try:
 
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            build_started = time.perf_counter()
 
             # 构建请求内容
             content, has_images = self._build_request_content(prompt, api_provider, num_images, input_image_1, input_image_2, input_image_3, input_image_4, input_image_5)
@@ -1809,32 +2029,39 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
                 }
                 use_streaming = True
 
-            # 添加调试日志
-            print(f"\n[Tutu DEBUG] API Request Details:")
-            print(f"[Tutu DEBUG] API Provider: {api_provider}")
-            print(f"[Tutu DEBUG] Model: {model}")
-            print(f"[Tutu DEBUG] Has images: {has_images}")
-            if api_provider != "APICore.ai":
-                print(f"[Tutu DEBUG] Messages count: {len(messages)}")
-            print(f"[Tutu DEBUG] Content type: {type(content)}")
-            print(f"[Tutu DEBUG] Content length: {len(str(content))}")
-
-            # 记录payload大小（但不打印图片数据）
-            payload_copy = payload.copy()
-            if api_provider != "APICore.ai" and 'messages' in payload:
-                payload_copy['messages'] = [{
-                    'role': msg['role'],
-                    'content': self._sanitize_content_for_debug(msg['content'])
-                } for msg in payload['messages']]
-            
-            print(f"[Tutu DEBUG] Payload structure: {json.dumps(payload_copy, indent=2, ensure_ascii=False)}")
+            # 自行序列化请求体，以便统计发送的字节数（与 requests 的 json= 参数等价）
+            request_body = json.dumps(payload, allow_nan=False).encode("utf-8")
+            self.timings.count("request_bytes", len(request_body))
+            self.timings.add("payload_build", time.perf_counter() - build_started)
+
+            # 添加调试日志（序列化payload开销较大，仅在DEBUG级别执行）
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("API Request Details:")
+                self.log.debug("API Provider: %s", api_provider)
+                self.log.debug("Model: %s", model)
+                self.log.debug("Has images: %s", has_images)
+                if api_provider != "APICore.ai":
+                    self.log.debug("Messages count: %s", len(messages))
+                self.log.debug("Content type: %s", type(content))
+                self.log.debug("Content length: %s", len(str(content)))
+
+                # 记录payload大小（但不打印图片数据）
+                payload_copy = payload.copy()
+                if api_provider != "APICore.ai" and 'messages' in payload:
+                    payload_copy['messages'] = [{
+                        'role': msg['role'],
+                        'content': self._sanitize_content_for_debug(msg['content'])
+                    } for msg in payload['messages']]
+
+                self.log.debug("Payload structure: %s", json.dumps(payload_copy, indent=2, ensure_ascii=False))
             
             # 检查API Key
             headers = self.get_headers(api_provider)
-            print(f"[Tutu DEBUG] Headers: {dict(headers)}")
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("Headers: %s", secure_log_headers(headers))
 
             if not current_api_key or len(current_api_key) < 10:
-                print(f"[Tutu DEBUG] WARNING: API Key seems invalid: '{current_api_key[:10] if current_api_key else 'None'}...")
+                self.log.warning("API Key seems invalid: '%s...", current_api_key[:10] if current_api_key else 'None')
 
                 # 提供详细的API密钥配置指导
                 key_error_msg = self._get_api_key_error_message(api_provider, current_api_key)
@@ -1846,59 +2073,66 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
             pbar.update_absolute(10)
 
             try:
-                print(f"[Tutu DEBUG] Sending request to: {api_endpoint}")
-
-                if api_provider == "APICore.ai":
-                    # APICore.ai 使用标准JSON响应，不是流式
-                    response = requests.post(
-                        api_endpoint,
-                        headers=headers,
-                        json=payload,
-                        timeout=self.timeout
-                        # 不设置stream=True
-                    )
-                else:
-                    # 其他提供商使用流式响应
-                    response = requests.post(
-                        api_endpoint,
-                        headers=headers,
-                        json=payload,
-                        timeout=self.timeout,
-                        stream=True  # Enable streaming for SSE
-                    )
-
-                print(f"[Tutu DEBUG] Response status: {response.status_code}")
-                print(f"[Tutu DEBUG] Response headers: {dict(response.headers)}")
+                self.log.debug("Sending request to: %s", api_endpoint)
+
+                # 流式请求在收到响应头时返回，非流式请求包含读取响应体的时间
+                with self.timings.span("connect_ttfb"):
+                    if api_provider == "APICore.ai":
+                        # APICore.ai 使用标准JSON响应，不是流式
+                        response = requests.post(
+                            api_endpoint,
+                            headers=headers,
+                            data=request_body,
+                            timeout=self.timeout
+                            # 不设置stream=True
+                        )
+                    else:
+                        # 其他提供商使用流式响应
+                        response = requests.post(
+                            api_endpoint,
+                            headers=headers,
+                            data=request_body,
+                            timeout=self.timeout,
+                            stream=True  # Enable streaming for SSE
+                        )
+                self.timings.meta["http_status"] = response.status_code
+
+                self.log.debug("Response status: %s", response.status_code)
+                self.log.debug("Response headers: %s", dict(response.headers))
 
                 # 如果状态码不是200，尝试读取错误响应
                 if response.status_code != 200:
                     try:
                         error_text = response.text[:1000]  # 只读取前1000字符
-                        print(f"[Tutu DEBUG] Error response body: {error_text}")
+                        self.log.debug("Error response body: %s", error_text)
                     except:
-                        print(f"[Tutu DEBUG] Could not read error response body")
+                        self.log.debug("Could not read error response body")
 
                 response.raise_for_status()
 
                 # 处理响应 - 根据API提供商选择不同的处理方式
-                if api_provider == "APICore.ai":
-                    # APICore.ai 返回标准JSON响应
-                    response_text = self.process_apicore_response(response)
-                else:
-                    # 其他提供商处理SSE流
-                    response_text = self.process_sse_stream(response, api_provider)
+                with self.timings.span("stream"):
+                    if api_provider == "APICore.ai":
+                        # APICore.ai 返回标准JSON响应
+                        response_text = self.process_apicore_response(response)
+                    else:
+                        # 其他提供商处理SSE流
+                        response_text = self.process_sse_stream(response, api_provider)
+                self.timings.count("response_bytes", response_bytes(response))
+                # 请求体（含输入图片的base64）和响应对象不再需要
+                payload = request_body = content = messages = response = None
 
-                print(f"[Tutu DEBUG] 响应处理完成，获得响应文本长度: {len(response_text)}")
+                self.log.debug("响应处理完成，获得响应文本长度: %s", len(response_text))
 
             except requests.exceptions.Timeout:
-                print(f"[Tutu DEBUG] Request timeout after {self.timeout} seconds")
+                self.log.debug("Request timeout after %s seconds", self.timeout)
                 raise TimeoutError(f"API request timed out after {self.timeout} seconds")
             except requests.exceptions.HTTPError as e:
-                print(f"[Tutu DEBUG] HTTP Error: {e}")
-                print(f"[Tutu DEBUG] Response status: {e.response.status_code}")
+                self.log.debug("HTTP Error: %s", e)
+                self.log.debug("Response status: %s", e.response.status_code)
                 try:
                     error_detail = e.response.text[:500]
-                    print(f"[Tutu DEBUG] Error detail: {error_detail}")
+                    self.log.debug("Error detail: %s", error_detail)
                     
                     # 特殊处理404错误（模型不存在）
                     if e.response.status_code == 404 and "No endpoints found" in error_detail:
@@ -1921,7 +2155,8 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
                 except:
                     raise Exception(f"HTTP Error: {str(e)}")
             except requests.exceptions.RequestException as e:
-                print(f"[Tutu DEBUG] Request Exception: {str(e)}")
+                self.log.debug("Request Exception: %s", e)
+                self.timings.meta["error_class"] = classify_api_error(e)
                 raise Exception(f"API request failed: {str(e)}")
             
             pbar.update_absolute(40)
@@ -1930,70 +2165,105 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
             truncated_response = self._truncate_base64_in_response(response_text, max_base64_len=100)
             formatted_response = f"**User prompt**: {prompt}\n\n**Response** ({timestamp}):\n{truncated_response}"
             
-            print(f"[Tutu DEBUG] 准备提取图片URL，响应文本长度: {len(response_text)}")
+            self.log.debug("准备提取图片URL，响应文本长度: %s", len(response_text))
             image_urls = self.extract_image_urls(response_text)
-            print(f"[Tutu DEBUG] 图片URL提取完成，找到{len(image_urls)}个URL")
+            self.log.debug("图片URL提取完成，找到%s个URL", len(image_urls))
+
+            # 解码前按响应文本和图片头中的尺寸估算内存（uint8帧 + float32 batch），
+            # 超出预算时使用低内存模式：逐张解码并释放base64文本，帧转存到临时文件。
+            # HTTP图片尚未下载、尺寸未知，不计入估算
+            low_memory = False
+            if self.memory_budget:
+                sizes = [data_url_image_size(url) for url in image_urls if url.startswith('data:image/')]
+                expected_bytes = len(response_text) + batch_memory_bytes(
+                    [size for size in sizes if size], batch_size_mode, target_size)
+                self.log.debug("预计内存: %.1fMB (预算 %sMB)", expected_bytes / (1024 * 1024), memory_budget_mb)
+                low_memory = expected_bytes > self.memory_budget
+            if low_memory:
+                # 之后只保留各图片URL；调试输出改用截断后的文本
+                response_text = truncated_response
+                self.timings.meta["low_memory"] = True
+                self.log.info("低内存模式: 预算 %sMB", memory_budget_mb)
             
             if image_urls:
+                spill_dir = tempfile.mkdtemp(prefix="tutu_spill_", dir=folder_paths.get_temp_directory()) if low_memory else None
                 try:
-                    images = []
-                    first_image_url = ""  
-                    
-                    for i, url in enumerate(image_urls):
+                    # 解码后的uint8像素，可直接用于重新编码或缓存
+                    frames = []
+                    first_image_url = ""
+
+                    for i in range(len(image_urls)):
+                        url = image_urls[i]
                         pbar.update_absolute(40 + (i+1) * 50 // len(image_urls))
-                        
+
                         if i == 0:
-                            first_image_url = url  
-                        
+                            first_image_url = url
+                        elif low_memory:
+                            # 解码后立即释放这张图片的base64文本
+                            image_urls[i] = None
+
                         try:
                             if url.startswith('data:image/'):
                                 # Handle base64 data URL
-                                base64_data = url.split(',', 1)[1]
-                                image_data = base64.b64decode(base64_data)
-                                pil_image = Image.open(BytesIO(image_data))
+                                with self.timings.span("decode"):
+                                    base64_data = url.split(',', 1)[1]
+                                    image_data = base64.b64decode(base64_data)
                             else:
                                 # Handle HTTP URL
-                                img_response = requests.get(url, timeout=self.timeout)
-                                img_response.raise_for_status()
-                                pil_image = Image.open(BytesIO(img_response.content))
+                                with self.timings.span("download"):
+                                    img_response = requests.get(url, timeout=self.timeout)
+                                    img_response.raise_for_status()
+                                    image_data = img_response.content
+                                self.timings.count("download_bytes", len(image_data))
 
                             # 直接使用生成的原图，不进行尺寸调整以避免白边
-                            img_tensor = pil2tensor(pil_image)
-                            images.append(img_tensor)
-                            
+                            with self.timings.span("decode"):
+                                if spill_dir is not None:
+                                    # 直接解码到映射文件，不再分配完整的uint8帧
+                                    frames.append(decode_image_to_file(image_data, spill_dir))
+                                else:
+                                    frames.append(decode_image_bytes(image_data))
+                                image_data = base64_data = url = None
+
                         except Exception as img_error:
-                            print(f"Error processing image URL {i+1}: {str(img_error)}")
+                            self.log.error("Error processing image URL %s: %s", i + 1, img_error)
                             continue
-                    
-                    if images:
-                        try:
-                            combined_tensor = torch.cat(images, dim=0)
-                        except RuntimeError:
-                            combined_tensor = images[0] if images else None
-                            
+
+                    if frames:
+                        # uint8帧直接缩放写入预分配的float32 batch，尺寸不一致时按 batch_size_mode 对齐
+                        with self.timings.span("tensor_assembly"):
+                            combined_tensor = normalize_batch(frames, batch_size_mode, target_size)
+                        self.timings.meta["images_returned"] = len(frames)
+
                         pbar.update_absolute(100)
-                        return (combined_tensor, formatted_response, first_image_url)
+                        return (combined_tensor, formatted_response, first_image_url, self._finish_timings())
                     else:
                         raise Exception("No images could be processed successfully")
                     
                 except Exception as e:
-                    print(f"Error processing image URLs: {str(e)}")
+                    self.log.error("Error processing image URLs: %s", e)
+                finally:
+                    if spill_dir is not None:
+                        # 映射文件的帧需先释放（Windows 下才能删除）
+                        frames = None
+                        shutil.rmtree(spill_dir, ignore_errors=True)
 
             # No image URLs found in response - 可能是SSE解析问题
-            print(f"[Tutu WARNING] ⚠️  响应中未找到图片URL - 可能是SSE解析问题")
+            self.log.warning("⚠️  响应中未找到图片URL - 可能是SSE解析问题")
             # 简单显示响应内容，避免base64刷屏
-            if 'data:image/' in response_text:
-                base64_count = response_text.count('data:image/')
-                print(f"[Tutu DEBUG] 📝 当前解析响应: 包含{base64_count}个base64图片({len(response_text)}字符)")
-            elif len(response_text) > 200:
-                print(f"[Tutu DEBUG] 📝 当前解析响应: {repr(response_text[:200])}...")
-            else:
-                print(f"[Tutu DEBUG] 📝 当前解析响应: {repr(response_text)}")
-            print(f"[Tutu DEBUG] 🔍 Gemini 2.5 Flash Image Preview 支持图片生成，问题可能在数据解析上")
-            print(f"[Tutu DEBUG] 💡 检查点:")
-            print(f"[Tutu DEBUG]    1. SSE流是否完整解析？")
-            print(f"[Tutu DEBUG]    2. JSON数据是否被正确拼接？")
-            print(f"[Tutu DEBUG]    3. 编码是否正确处理？")
+            if self.log.isEnabledFor(logging.DEBUG):
+                if 'data:image/' in response_text:
+                    base64_count = response_text.count('data:image/')
+                    self.log.debug("📝 当前解析响应: 包含%s个base64图片(%s字符)", base64_count, len(response_text))
+                elif len(response_text) > 200:
+                    self.log.debug("📝 当前解析响应: %r...", response_text[:200])
+                else:
+                    self.log.debug("📝 当前解析响应: %r", response_text)
+            self.log.debug("🔍 Gemini 2.5 Flash Image Preview 支持图片生成，问题可能在数据解析上")
+            self.log.debug("💡 检查点:")
+            self.log.debug("1. SSE流是否完整解析？")
+            self.log.debug("2. JSON数据是否被正确拼接？")
+            self.log.debug("3. 编码是否正确处理？")
             
             pbar.update_absolute(100)
 
@@ -2017,43 +2287,59 @@ CRITICAL: You MUST return actual {num_images} images, not text descriptions. Eac
             formatted_response += debug_info
                 
             if reference_image is not None:
-                return (reference_image, formatted_response, "")
+                return (reference_image, formatted_response, "", self._finish_timings())
             else:
                 default_image = Image.new('RGB', (1024, 1024), color='white')
                 default_tensor = pil2tensor(default_image)
-                return (default_tensor, formatted_response, "")
+                return (default_tensor, formatted_response, "", self._finish_timings())
             
         except TimeoutError as e:
             error_message = f"API timeout error: {str(e)}"
-            print(f"[Tutu DEBUG] TimeoutError occurred: {error_message}")
+            self.timings.meta.setdefault("error_class", classify_api_error(e))
+            self.log.debug("TimeoutError occurred: %s", error_message)
             return self.handle_error(input_image_1, input_image_2, input_image_3, input_image_4, input_image_5, error_message)
             
         except Exception as e:
             error_message = f"Error calling Gemini API: {str(e)}"
-            print(f"[Tutu DEBUG] Exception occurred:")
-            print(f"[Tutu DEBUG] - Type: {type(e).__name__}")
-            print(f"[Tutu DEBUG] - Message: {str(e)}")
-            print(f"[Tutu DEBUG] - Full error: {repr(e)}")
+            self.timings.meta.setdefault("error_class", classify_api_error(e))
+            self.log.debug("Exception occurred:")
+            self.log.debug("- Type: %s", type(e).__name__)
+            self.log.debug("- Message: %s", e)
+            self.log.debug("- Full error: %r", e)
             
             # 打印更多上下文信息
-            print(f"[Tutu DEBUG] Context at error:")
-            print(f"[Tutu DEBUG] - Current model: {model if 'model' in locals() else 'undefined'}")
-            print(f"[Tutu DEBUG] - API key present: {bool(current_api_key)}")
-            print(f"[Tutu DEBUG] - API key length: {len(current_api_key) if current_api_key else 0}")
+            self.log.debug("Context at error:")
+            self.log.debug("- Current model: %s", model if 'model' in locals() else 'undefined')
+            self.log.debug("- API key present: %s", bool(current_api_key))
+            self.log.debug("- API key length: %s", len(current_api_key) if current_api_key else 0)
             
             return self.handle_error(input_image_1, input_image_2, input_image_3, input_image_4, input_image_5, error_message)
     
+    def _finish_timings(self):
+        """记录本次生成的阶段耗时摘要和指标，并返回 timings 输出的JSON"""
+        if self.timings.memory is not None:
+            self.timings.memory.stop()
+        self.timings.meta.setdefault("images_returned", 0)
+        record_generation(self.timings)
+        record_request(self.timings)
+        level = getattr(logging, self.timings_log_level, None)
+        if isinstance(level, int):
+            self.log.log(level, "阶段耗时: %s", self.timings)
+        return self.timings.to_json()
+
     def handle_error(self, input_image_1, input_image_2, input_image_3, input_image_4, input_image_5, error_message):
         """Handle errors with appropriate image output"""
+        self.timings.meta["error"] = error_message.splitlines()[0] if error_message else ""
+        self.timings.meta.setdefault("error_class", "general_error")
         # 按优先级返回第一个可用的图片
         for img in [input_image_1, input_image_2, input_image_3, input_image_4, input_image_5]:
             if img is not None:
-                return (img, error_message, "")
+                return (img, error_message, "", self._finish_timings())
         
         # 如果没有输入图片，创建默认图片 (1024x1024)
         default_image = Image.new('RGB', (1024, 1024), color='white')
         default_tensor = pil2tensor(default_image)
-        return (default_tensor, error_message, "")
+        return (default_tensor, error_message, "", self._finish_timings())
 
 
 WEB_DIRECTORY = "./web"    
@@ -6,46 +6,39 @@ Author: Tutu API Team
 Version: 2.0.0 - Unified Architecture
 """
 
-import re
+import functools
+import itertools
 import json
-import os
+import math
+import random
+import re
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
+from types import MappingProxyType
+
+from .metrics import registry as metrics_registry
+from .preset_store import get_preset_store
+from .prompt_template import clean_text, compile_template
+from .telemetry import profilable
 
 # ======================== Template Management Functions ========================
 
 def get_presets_file():
     """Get the path to presets file"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, "presets.json")
+    return get_preset_store().path
 
 def load_templates():
-    """Load all templates from file"""
-    try:
-        with open(get_presets_file(), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("[Prompt Master] Template file not found, using empty config")
-        return {"gemini": []}
-    except json.JSONDecodeError:
-        print("[Prompt Master] Template file format error, using default config")
-        return {"gemini": []}
+    """Load all templates (shared preset store, reloaded only when the file changes)"""
+    return get_preset_store().data()
 
 # Template saving functionality removed for simplicity
 
 def get_template_options():
     """Get template options for dropdown"""
     try:
-        templates = load_templates()
-        gemini_templates = templates.get("gemini", [])
-        
-        # Start with built-in options
-        options = ["Custom Input", "Auto Detect Scene"]
-        
-        # Add saved templates
-        for template in gemini_templates:
-            options.append(template["name"])
-            
-        return options
+        # Start with built-in options, then add saved templates
+        return ["Custom Input", "Auto Detect Scene"] + get_preset_store().get_names("gemini")
     except:
         return ["Custom Input", "Auto Detect Scene"]
 
@@ -55,11 +48,7 @@ def get_template_by_name(name):
         return None
         
     try:
-        templates = load_templates()
-        for template in templates.get("gemini", []):
-            if template["name"] == name:
-                return template
-        return None
+        return get_preset_store().get_by_name("gemini", name)
     except:
         return None
 
@@ -67,143 +56,281 @@ def get_template_by_name(name):
 
 # ======================== Auto Detection System ========================
 
+# Keyword tables: category -> keywords. Order matters: it breaks ties in
+# detect_scene_type and sets the priority in detect_art_style.
+SCENE_KEYWORDS = {
+    "Professional Portrait": [
+        "person", "man", "woman", "face", "portrait", "headshot", "profile",
+        "character", "people", "human", "model", "actor", "celebrity"
+    ],
+    "Cinematic Landscape": [
+        "landscape", "mountain", "forest", "ocean", "beach", "sky", "sunset",
+        "sunrise", "nature", "outdoor", "scenery", "vista", "horizon"
+    ],
+    "Product Photography": [
+        "product", "bottle", "phone", "car", "watch", "jewelry", "gadget",
+        "device", "object", "item", "commercial", "brand"
+    ],
+    "Digital Concept Art": [
+        "fantasy", "dragon", "magic", "wizard", "castle", "sci-fi", "alien",
+        "spaceship", "futuristic", "concept", "creature", "mythical"
+    ],
+    "Anime Style Art": [
+        "anime", "manga", "kawaii", "chibi", "japanese", "otaku", "waifu",
+        "cartoon", "animated", "character design"
+    ],
+    "Architectural Photography": [
+        "building", "architecture", "house", "tower", "bridge", "city",
+        "urban", "structure", "construction", "skyscraper"
+    ],
+    "Gourmet Food Photography": [
+        "food", "dish", "meal", "restaurant", "cooking", "recipe", "cuisine",
+        "delicious", "tasty", "gourmet", "chef"
+    ]
+}
+
+ART_STYLE_KEYWORDS = {
+    "photography": ["photography", "photo", "portrait", "product", "commercial", "studio", "camera", "lens"],
+    "painting": ["painting", "oil", "watercolor", "acrylic", "canvas", "brush", "paint", "classical"],
+    "illustration": ["illustration", "anime", "cartoon", "comic", "manga", "character design", "concept art"],
+    "digital_art": ["digital", "render", "3d", "cgi", "computer", "photorealistic", "artstation"]
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+def _word_forms(word):
+    """The word plus its plural ("es" after s/x/z/ch/sh, otherwise "s")"""
+    return (word, word + ("es" if word.endswith(("s", "x", "z", "ch", "sh")) else "s"))
+
+def _trie_pattern(strings, separator):
+    """Regex alternation of strings with shared prefixes factored out, longest match first; spaces match separator"""
+    trie = {}
+    for string in strings:
+        node = trie
+        for char in string:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def build(node):
+        branches = [(separator if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if "" in node:
+            return f"(?:{'|'.join(branches)})?"
+        return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+
+    return build(trie)
+
+class KeywordMatcher:
+    """
+    Whole-word multi-keyword matcher compiled once from a keyword table
+
+    Every keyword form (singular and plural) of the table is compiled into
+    one prefix-factored regex alternation. The lowercased text is scanned
+    by that regex once, and both scores and first_match are derived from
+    the same hits. Keywords only match whole words, so "carpet" no longer
+    counts as "car". Multi-word keywords such as "character design" are
+    matched on consecutive words, and also count the keywords they
+    contain, as the old substring checks did.
+    """
+
+    def __init__(self, table):
+        self.categories = list(table)
+        # keyword -> indexes into self.categories
+        self._categories_by_keyword = {}
+        # form (singular/plural, words joined by one space) -> keyword
+        forms = {}
+        for index, keywords in enumerate(table.values()):
+            for keyword in keywords:
+                self._categories_by_keyword.setdefault(keyword, []).append(index)
+                words = _WORD.findall(keyword.lower())
+                for last in _word_forms(words[-1]):
+                    forms[" ".join(words[:-1] + [last])] = keyword
+
+        # form -> keywords it counts: its own plus those formed by a run of its words
+        self._keywords_by_form = {}
+        for form in forms:
+            words = form.split(" ")
+            runs = {" ".join(words[start:end]) for start in range(len(words)) for end in range(start + 1, len(words) + 1)}
+            self._keywords_by_form[form] = frozenset(forms[run] for run in runs if run in forms)
+        # form -> lowest category index of its keywords, for first_match
+        self._priority_by_form = {
+            form: min(index for keyword in keywords for index in self._categories_by_keyword[keyword])
+            for form, keywords in self._keywords_by_form.items()
+        }
+        # Words are separated by any non-word characters, as _WORD splits
+        # them. Each hit consumes the separator before it, so the regex
+        # engine skips ahead to the next separator instead of trying the
+        # alternation at every character.
+        self._pattern = re.compile(rf"[^a-z0-9]({_trie_pattern(forms, '[^a-z0-9]+')})(?![a-z0-9])") if forms else None
+
+    def _forms(self, text):
+        """Yield the keyword forms found in text, left to right"""
+        if self._pattern is None:
+            return
+        keywords_by_form = self._keywords_by_form
+        for match in self._pattern.finditer(" " + text.lower()):
+            form = match.group(1)
+            if form not in keywords_by_form:
+                # multi-word form written with other separators
+                form = " ".join(_WORD.findall(form))
+            yield form
+
+    def keywords(self, text):
+        """Return the set of distinct keywords found in text"""
+        found = set()
+        for form in self._forms(text):
+            found.update(self._keywords_by_form[form])
+        return found
+
+    def scores(self, text):
+        """Return {category: number of distinct keywords found}, in table order"""
+        counts = [0] * len(self.categories)
+        for keyword in self.keywords(text):
+            for index in self._categories_by_keyword[keyword]:
+                counts[index] += 1
+        return {category: count for category, count in zip(self.categories, counts) if count}
+
+    def first_match(self, text):
+        """Return the first category in table order with any keyword in text"""
+        best = len(self.categories)
+        for form in self._forms(text):
+            best = min(best, self._priority_by_form[form])
+            if best == 0:
+                break
+        return self.categories[best] if best < len(self.categories) else None
+
+SCENE_MATCHER = KeywordMatcher(SCENE_KEYWORDS)
+ART_STYLE_MATCHER = KeywordMatcher(ART_STYLE_KEYWORDS)
+
 def detect_scene_type(prompt_text):
     """Intelligently detect scene type from prompt"""
-    prompt_lower = prompt_text.lower()
-    
-    detection_map = {
-        "Professional Portrait": [
-            "person", "man", "woman", "face", "portrait", "headshot", "profile", 
-            "character", "people", "human", "model", "actor", "celebrity"
-        ],
-        "Cinematic Landscape": [
-            "landscape", "mountain", "forest", "ocean", "beach", "sky", "sunset", 
-            "sunrise", "nature", "outdoor", "scenery", "vista", "horizon"
-        ],
-        "Product Photography": [
-            "product", "bottle", "phone", "car", "watch", "jewelry", "gadget", 
-            "device", "object", "item", "commercial", "brand"
-        ],
-        "Digital Concept Art": [
-            "fantasy", "dragon", "magic", "wizard", "castle", "sci-fi", "alien", 
-            "spaceship", "futuristic", "concept", "creature", "mythical"
-        ],
-        "Anime Style Art": [
-            "anime", "manga", "kawaii", "chibi", "japanese", "otaku", "waifu", 
-            "cartoon", "animated", "character design"
-        ],
-        "Architectural Photography": [
-            "building", "architecture", "house", "tower", "bridge", "city", 
-            "urban", "structure", "construction", "skyscraper"
-        ],
-        "Gourmet Food Photography": [
-            "food", "dish", "meal", "restaurant", "cooking", "recipe", "cuisine", 
-            "delicious", "tasty", "gourmet", "chef"
-        ]
-    }
-    
-    # Score each category
-    scores = {}
-    for category, keywords in detection_map.items():
-        score = sum(1 for keyword in keywords if keyword in prompt_lower)
-        if score > 0:
-            scores[category] = score
-    
-    # Return highest scoring category or None
+    scores = SCENE_MATCHER.scores(prompt_text)
+
+    # Return highest scoring category (first in table order on ties) or None
     if scores:
-        best_match = max(scores, key=scores.get)
-        return best_match
-    
+        return max(scores, key=scores.get)
+
     return None
 
 # ======================== Optimization Functions ========================
 
+def _freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# Optimization tables based on official guidelines. Built once at import,
+# read-only and shared by every PromptOptimizer.
+
+# Quality enhancement terms - categorized by art style
+QUALITY_TERMS = _freeze({
+    "English": {
+        "basic": ["high quality", "detailed"],
+        "professional": ["highly detailed", "professional quality", "exceptional detail"],
+        "premium": ["studio-quality", "award-winning", "masterpiece"],
+        # Photography-specific terms
+        "photography": ["commercial photography", "professional photography", "studio photography"],
+        # Art-specific terms
+        "painting": ["artistic mastery", "fine art quality", "gallery-worthy"],
+        "illustration": ["professional illustration", "high-end artwork", "publication quality"],
+        "digital_art": ["digital mastery", "professional rendering", "high-resolution artwork"]
+    },
+    "Chinese": {
+        "basic": ["高质量", "详细"],
+        "professional": ["高度详细", "专业品质", "卓越细节"],
+        "premium": ["工作室品质", "获奖作品", "杰作"],
+        # Photography-specific terms
+        "photography": ["商业摄影级别", "专业摄影", "工作室摄影"],
+        # Art-specific terms
+        "painting": ["艺术大师级", "美术馆品质", "收藏级作品"],
+        "illustration": ["专业插画", "高端艺术品", "出版级质量"],
+        "digital_art": ["数字艺术大师级", "专业渲染", "高分辨率艺术品"]
+    }
+})
+
+# Camera control terms
+CAMERA_TERMS = _freeze({
+    "wide_angle": {"English": "wide-angle shot", "Chinese": "广角镜头拍摄"},
+    "macro": {"English": "macro photography", "Chinese": "微距摄影"},
+    "low_angle": {"English": "low-angle perspective", "Chinese": "低角度视角"},
+    "high_angle": {"English": "high-angle shot", "Chinese": "高角度俯拍"},
+    "close_up": {"English": "close-up composition", "Chinese": "特写构图"},
+    "medium_shot": {"English": "medium shot framing", "Chinese": "中景构图"}
+})
+
+# Lighting control terms
+LIGHTING_TERMS = _freeze({
+    "studio": {"English": "professional studio lighting", "Chinese": "专业工作室灯光"},
+    "natural": {"English": "natural lighting", "Chinese": "自然光照明"},
+    "golden": {"English": "golden hour lighting", "Chinese": "黄金时刻光线"},
+    "dramatic": {"English": "dramatic lighting", "Chinese": "戏剧性照明"},
+    "soft": {"English": "soft lighting", "Chinese": "柔和照明"}
+})
+
+# Node option -> table key
+CAMERA_MAP = _freeze({
+    "Wide-angle Lens": "wide_angle",
+    "Macro Shot": "macro",
+    "Low-angle Perspective": "low_angle",
+    "High-angle Shot": "high_angle",
+    "Close-up Shot": "close_up",
+    "Medium Shot": "medium_shot"
+})
+
+LIGHTING_MAP = _freeze({
+    "Studio Lighting": "studio",
+    "Natural Lighting": "natural",
+    "Golden Hour": "golden",
+    "Dramatic Lighting": "dramatic",
+    "Soft Lighting": "soft"
+})
+
+DETAIL_LEVELS = _freeze({
+    "Basic Detail": "basic",
+    "Professional Detail": "professional",
+    "Premium Quality": "premium",
+    "Masterpiece Level": "Masterpiece Level"
+})
+
+LANGUAGES = ("English Optimization", "Chinese Optimization")
+CAMERA_OPTIONS = ("Auto Select",) + tuple(CAMERA_MAP)
+LIGHTING_OPTIONS = ("Auto Select",) + tuple(LIGHTING_MAP)
+
 class PromptOptimizer:
-    """Advanced prompt optimization system"""
-    
+    """
+    Advanced prompt optimization system
+
+    Stateless apart from the output language: all term tables are the
+    shared module-level constants above, so creating one per call is cheap.
+    """
+
+    __slots__ = ("language", "lang_key")
+
+    quality_terms = QUALITY_TERMS
+    camera_terms = CAMERA_TERMS
+    lighting_terms = LIGHTING_TERMS
+
     def __init__(self, language="English Optimization"):
         self.language = language
-        self.setup_optimization_data()
-    
-    def setup_optimization_data(self):
-        """Setup optimization data based on official guidelines"""
-        
-        # Quality enhancement terms - categorized by art style
-        self.quality_terms = {
-            "English": {
-                "basic": ["high quality", "detailed"],
-                "professional": ["highly detailed", "professional quality", "exceptional detail"],
-                "premium": ["studio-quality", "award-winning", "masterpiece"],
-                # Photography-specific terms
-                "photography": ["commercial photography", "professional photography", "studio photography"],
-                # Art-specific terms
-                "painting": ["artistic mastery", "fine art quality", "gallery-worthy"],
-                "illustration": ["professional illustration", "high-end artwork", "publication quality"],
-                "digital_art": ["digital mastery", "professional rendering", "high-resolution artwork"]
-            },
-            "Chinese": {
-                "basic": ["高质量", "详细"],
-                "professional": ["高度详细", "专业品质", "卓越细节"],
-                "premium": ["工作室品质", "获奖作品", "杰作"],
-                # Photography-specific terms
-                "photography": ["商业摄影级别", "专业摄影", "工作室摄影"],
-                # Art-specific terms
-                "painting": ["艺术大师级", "美术馆品质", "收藏级作品"],
-                "illustration": ["专业插画", "高端艺术品", "出版级质量"],
-                "digital_art": ["数字艺术大师级", "专业渲染", "高分辨率艺术品"]
-            }
-        }
-        
-        # Camera control terms
-        self.camera_terms = {
-            "wide_angle": {"English": "wide-angle shot", "Chinese": "广角镜头拍摄"},
-            "macro": {"English": "macro photography", "Chinese": "微距摄影"},
-            "low_angle": {"English": "low-angle perspective", "Chinese": "低角度视角"},
-            "high_angle": {"English": "high-angle shot", "Chinese": "高角度俯拍"},
-            "close_up": {"English": "close-up composition", "Chinese": "特写构图"},
-            "medium_shot": {"English": "medium shot framing", "Chinese": "中景构图"}
-        }
-        
-        # Lighting control terms  
-        self.lighting_terms = {
-            "studio": {"English": "professional studio lighting", "Chinese": "专业工作室灯光"},
-            "natural": {"English": "natural lighting", "Chinese": "自然光照明"},
-            "golden": {"English": "golden hour lighting", "Chinese": "黄金时刻光线"},
-            "dramatic": {"English": "dramatic lighting", "Chinese": "戏剧性照明"},
-            "soft": {"English": "soft lighting", "Chinese": "柔和照明"}
-        }
-    
+        self.lang_key = "English" if language == "English Optimization" else "Chinese"
+
     def detect_art_style(self, prompt, template_name="Custom Input"):
         """Detect art style from prompt and template to choose appropriate quality terms"""
-        prompt_lower = prompt.lower()
-        template_lower = template_name.lower()
-        
-        # Photography styles
-        photography_keywords = ["photography", "photo", "portrait", "product", "commercial", "studio", "camera", "lens"]
-        if any(keyword in template_lower or keyword in prompt_lower for keyword in photography_keywords):
-            return "photography"
-        
-        # Painting styles
-        painting_keywords = ["painting", "oil", "watercolor", "acrylic", "canvas", "brush", "paint", "classical"]
-        if any(keyword in template_lower or keyword in prompt_lower for keyword in painting_keywords):
-            return "painting"
-            
-        # Illustration styles
-        illustration_keywords = ["illustration", "anime", "cartoon", "comic", "manga", "character design", "concept art"]
-        if any(keyword in template_lower or keyword in prompt_lower for keyword in illustration_keywords):
-            return "illustration"
-            
-        # Digital art styles
-        digital_keywords = ["digital", "render", "3d", "cgi", "computer", "photorealistic", "artstation"]
-        if any(keyword in template_lower or keyword in prompt_lower for keyword in digital_keywords):
-            return "digital_art"
-            
+        # One scan over template name and prompt; earlier styles take priority
+        art_style = ART_STYLE_MATCHER.first_match(f"{template_name}\n{prompt}")
+        if art_style:
+            return art_style
+
         # Default to general terms if no specific style detected
         return "premium"
     
-    def add_quality_enhancement(self, prompt, level="professional", template_name="Custom Input"):
-        """Add style-appropriate quality enhancement terms"""
-        lang_key = "English" if self.language == "English Optimization" else "Chinese"
+    def quality_terms_for(self, prompt, level="professional", template_name="Custom Input"):
+        """Return (style-appropriate quality terms not yet in prompt, detected art style)"""
+        terms = self.quality_terms[self.lang_key]
         
         # Detect art style to choose appropriate quality terms
         art_style = self.detect_art_style(prompt, template_name)
@@ -211,83 +338,304 @@ class PromptOptimizer:
         # Choose quality terms based on level and art style
         if level == "Masterpiece Level":
             # For masterpiece level, use style-specific terms when available
-            if art_style in self.quality_terms[lang_key]:
+            if art_style in terms:
                 # Use style-specific premium terms
-                style_terms = self.quality_terms[lang_key][art_style][:1]  # Take 1 style-specific term
-                general_terms = self.quality_terms[lang_key]["premium"][:1]  # Take 1 general premium term
+                style_terms = terms[art_style][:1]  # Take 1 style-specific term
+                general_terms = terms["premium"][:1]  # Take 1 general premium term
                 quality_list = style_terms + general_terms
             else:
                 # Fallback to premium general terms
-                quality_list = self.quality_terms[lang_key]["premium"]
+                quality_list = terms["premium"]
         else:
             # Use general quality terms for other levels
-            quality_list = self.quality_terms[lang_key].get(level, self.quality_terms[lang_key]["professional"])
+            quality_list = terms.get(level, terms["professional"])
+        
+        prompt_lower = prompt.lower()
+        return [term for term in quality_list[:2] if term.lower() not in prompt_lower], art_style  # First 2 terms
+    
+    def camera_term(self, camera_type):
+        """Return the camera control term for a node option, or "" """
+        camera_key = CAMERA_MAP.get(camera_type)
+        if camera_key and camera_key in self.camera_terms:
+            return self.camera_terms[camera_key][self.lang_key]
+        return ""
+    
+    def lighting_term(self, lighting_type):
+        """Return the lighting control term for a node option, or "" """
+        lighting_key = LIGHTING_MAP.get(lighting_type)
+        if lighting_key and lighting_key in self.lighting_terms:
+            return self.lighting_terms[lighting_key][self.lang_key]
+        return ""
+    
+    def add_quality_enhancement(self, prompt, level="professional", template_name="Custom Input"):
+        """Add style-appropriate quality enhancement terms"""
+        terms, art_style = self.quality_terms_for(prompt, level, template_name)
         
         enhancements = []
-        for term in quality_list[:2]:  # Add first 2 terms
-            if term.lower() not in prompt.lower():
-                prompt += f", {term}"
-                enhancements.append(f"Added quality term: {term} (style: {art_style})")
+        for term in terms:
+            prompt += f", {term}"
+            enhancements.append(f"Added quality term: {term} (style: {art_style})")
         
         return prompt, enhancements
     
     def add_camera_control(self, prompt, camera_type):
         """Add camera control terms"""
-        if camera_type == "Auto Select":
-            return prompt, []
-            
-        lang_key = "English" if self.language == "English Optimization" else "Chinese"
-        
-        camera_map = {
-            "Wide-angle Lens": "wide_angle",
-            "Macro Shot": "macro", 
-            "Low-angle Perspective": "low_angle",
-            "High-angle Shot": "high_angle",
-            "Close-up Shot": "close_up",
-            "Medium Shot": "medium_shot"
-        }
-        
-        camera_key = camera_map.get(camera_type)
-        if camera_key and camera_key in self.camera_terms:
-            term = self.camera_terms[camera_key][lang_key]
-            if term.lower() not in prompt.lower():
-                prompt += f", {term}"
-                return prompt, [f"Added camera control: {term}"]
+        term = self.camera_term(camera_type)
+        if term and term.lower() not in prompt.lower():
+            prompt += f", {term}"
+            return prompt, [f"Added camera control: {term}"]
         
         return prompt, []
     
     def add_lighting_control(self, prompt, lighting_type):
         """Add lighting control terms"""
-        if lighting_type == "Auto Select":
-            return prompt, []
-            
-        lang_key = "English" if self.language == "English Optimization" else "Chinese"
-        
-        lighting_map = {
-            "Studio Lighting": "studio",
-            "Natural Lighting": "natural",
-            "Golden Hour": "golden",
-            "Dramatic Lighting": "dramatic", 
-            "Soft Lighting": "soft"
-        }
-        
-        lighting_key = lighting_map.get(lighting_type)
-        if lighting_key and lighting_key in self.lighting_terms:
-            term = self.lighting_terms[lighting_key][lang_key]
-            if term.lower() not in prompt.lower():
-                prompt += f", {term}"
-                return prompt, [f"Added lighting control: {term}"]
+        term = self.lighting_term(lighting_type)
+        if term and term.lower() not in prompt.lower():
+            prompt += f", {term}"
+            return prompt, [f"Added lighting control: {term}"]
                 
         return prompt, []
     
     def clean_prompt(self, prompt):
-        """Clean and format prompt"""
-        # Remove extra commas and spaces
-        cleaned = re.sub(r'\s*,\s*,\s*', ', ', prompt)
-        cleaned = re.sub(r'\s+', ' ', cleaned)
-        cleaned = cleaned.strip()
-        
-        return cleaned
+        """Clean and format prompt (remove extra commas and spaces)"""
+        return clean_text(prompt)
+
+# ======================== Prompt Pipeline ========================
+
+def resolve_template(template_selection, original_input, get_template=get_template_by_name):
+    """
+    Step 1: Template Selection
+
+    Returns (selected_template, template_name, status message). get_template
+    can be swapped for a memoized lookup when many prompts share templates.
+    """
+    if template_selection == "Custom Input":
+        # No template, use raw input
+        return None, "Custom Input", "📝 Using custom input (no template)"
+
+    if template_selection == "Auto Detect Scene":
+        # Auto detect and apply template
+        detected_type = detect_scene_type(original_input)
+        if not detected_type:
+            return None, "Auto: No Detection", "🔍 No scene type detected, using raw input"
+        template = get_template(detected_type)
+        if template:
+            return template, f"Auto: {detected_type}", f"🔍 Auto-detected: {detected_type}"
+        return None, "Auto: No Match", f"🔍 Auto-detected {detected_type}, but template not found"
+
+    # Use selected template
+    template = get_template(template_selection)
+    if template:
+        return template, template_selection, f"📋 Using template: {template_selection}"
+    return None, "Template Not Found", f"❌ Template '{template_selection}' not found"
+
+def optimize_prompt(original_input, template_selection, language, detail_level,
+                    camera_control="Auto Select", lighting_control="Auto Select",
+                    quality_enhancement=True, custom_additions="", get_template=get_template_by_name):
+    """
+    Select Template → Optimize Prompt → Combine, without any logging
+
+    Returns (final_prompt, template_name, optimization_log, status message).
+    """
+    selected_template, template_name, status = resolve_template(template_selection, original_input, get_template)
+    optimization_log = []
+
+    # Templates are compiled once per distinct text; terms whose placeholder
+    # ({style}, {camera}, {lighting}) appears in the template go there
+    # instead of being appended to the prompt
+    renderer = compile_template(selected_template["config"]["prompt_template"]) if selected_template else None
+    slots = renderer.placeholders if renderer else frozenset()
+    values = {}
+
+    # Step 2: Prompt Optimization
+    optimizer = PromptOptimizer(language)
+    working_prompt = original_input
+
+    # Add quality enhancement
+    if quality_enhancement:
+        quality_level = DETAIL_LEVELS.get(detail_level, "professional")
+        if "style" in slots:
+            terms, art_style = optimizer.quality_terms_for(working_prompt, quality_level, template_name)
+            values["style"] = ", ".join(terms)
+            optimization_log.extend(f"Placed quality term in template: {term} (style: {art_style})" for term in terms)
+        else:
+            working_prompt, quality_log = optimizer.add_quality_enhancement(working_prompt, quality_level, template_name)
+            optimization_log.extend(quality_log)
+
+    # Add camera control
+    if "camera" in slots:
+        values["camera"] = optimizer.camera_term(camera_control)
+        if values["camera"]:
+            optimization_log.append(f"Placed camera control in template: {values['camera']}")
+    else:
+        working_prompt, camera_log = optimizer.add_camera_control(working_prompt, camera_control)
+        optimization_log.extend(camera_log)
+
+    # Add lighting control
+    if "lighting" in slots:
+        values["lighting"] = optimizer.lighting_term(lighting_control)
+        if values["lighting"]:
+            optimization_log.append(f"Placed lighting control in template: {values['lighting']}")
+    else:
+        working_prompt, lighting_log = optimizer.add_lighting_control(working_prompt, lighting_control)
+        optimization_log.extend(lighting_log)
+
+    # Add custom additions
+    if custom_additions.strip():
+        working_prompt += f", {custom_additions.strip()}"
+        optimization_log.append(f"Added custom terms: {custom_additions.strip()}")
+
+    # Step 3: Template Combination (rendering includes the cleanup)
+    if renderer:
+        final_prompt = renderer.render(prompt=working_prompt, **values)
+        optimization_log.append(f"Applied template: {template_name}")
+    else:
+        # No template, clean the optimized prompt and use it directly
+        final_prompt = optimizer.clean_prompt(working_prompt)
+
+    return final_prompt, template_name, optimization_log, status
+
+def split_ideas(texts):
+    """
+    Split batch input into individual ideas
+
+    Each text may hold several ideas, one per line. A line that is a JSON
+    string, or a JSON object with an "idea" or "prompt" field (JSONL), is
+    decoded; any other line is used as-is. Blank lines are skipped.
+    """
+    ideas = []
+    for text in texts:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] in '{"':
+                try:
+                    value = json.loads(line)
+                except json.JSONDecodeError:
+                    value = line
+                if isinstance(value, dict):
+                    value = value.get("idea") or value.get("prompt") or ""
+                line = str(value).strip()
+                if not line:
+                    continue
+            ideas.append(line)
+    return ideas
+
+def _permutation(total, seed):
+    """Lazy pseudo-random permutation of range(total): i -> (a*i + b) mod total"""
+    rng = random.Random(seed)
+    if total <= 1:
+        return range(total)
+    step = rng.randrange(1, total)
+    while math.gcd(step, total) != 1:
+        step = rng.randrange(1, total)
+    offset = rng.randrange(total)
+    return ((step * i + offset) % total for i in range(total))
+
+# Most variants one sweep may output, and most recent prompts remembered for dedupe
+MAX_VARIANTS = 4096
+
+def iter_prompt_variants(user_idea, template_selections, camera_controls, lighting_controls, detail_levels,
+                         language="English Optimization", quality_enhancement=True, custom_additions="",
+                         shuffle=False, seed=0, dedupe=True, dedupe_window=MAX_VARIANTS):
+    """
+    Lazily yield (prompt, label) for template × camera × lighting × detail
+
+    Combinations are decoded from their index on demand, so nothing is
+    materialized up front; stop consuming to stop generating. shuffle visits
+    the combinations in a seeded pseudo-random order (for sampling), and
+    dedupe skips prompts identical to one of the last dedupe_window yielded,
+    so its memory stays bounded however far the sweep is consumed.
+    """
+    axes = [list(template_selections), list(camera_controls), list(lighting_controls), list(detail_levels)]
+    total = math.prod(len(axis) for axis in axes)
+    indexes = _permutation(total, seed) if shuffle else range(total)
+    get_template = functools.lru_cache(maxsize=None)(get_template_by_name)
+    # Insertion-ordered, so the oldest prompt is evicted first
+    seen = {}
+
+    for index in indexes:
+        # Mixed-radix decode, last axis varies fastest
+        choice = []
+        for axis in reversed(axes):
+            index, position = divmod(index, len(axis))
+            choice.append(axis[position])
+        template_selection, camera_control, lighting_control, detail_level = reversed(choice)
+
+        prompt, template_name, _, _ = optimize_prompt(
+            user_idea, template_selection, language, detail_level, camera_control, lighting_control,
+            quality_enhancement, custom_additions, get_template=get_template
+        )
+        if dedupe:
+            if prompt in seen:
+                continue
+            seen[prompt] = None
+            if len(seen) > dedupe_window:
+                del seen[next(iter(seen))]
+        yield prompt, f"{template_name} | {camera_control} | {lighting_control} | {detail_level}"
+
+# ======================== Output Cache ========================
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with hit/miss counters"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return hits, misses, current size and hit ratio"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+# process_prompt outputs keyed on all inputs plus the preset store version,
+# so saving or editing presets invalidates old entries
+PROMPT_CACHE_SIZE = 1024
+prompt_cache = LRUCache(PROMPT_CACHE_SIZE)
+
+
+def _template_cache_stats():
+    info = compile_template.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+# 在 /tutu/metrics 中导出缓存命中率
+metrics_registry.register_cache("prompt_output", prompt_cache.stats)
+metrics_registry.register_cache("prompt_template", _template_cache_stats)
 
 # ======================== Main Node Class ========================
 
@@ -310,35 +658,12 @@ class TutuNanaBananaPromptMaster:
                     "default": "",
                     "placeholder": "Enter your creative idea here..."
                 }),
-                "language": ([
-                    "English Optimization",
-                    "Chinese Optimization"
-                ], {"default": "English Optimization"}),
-                "detail_level": ([
-                    "Basic Detail",
-                    "Professional Detail", 
-                    "Premium Quality",
-                    "Masterpiece Level"
-                ], {"default": "Professional Detail"}),
+                "language": (list(LANGUAGES), {"default": "English Optimization"}),
+                "detail_level": (list(DETAIL_LEVELS), {"default": "Professional Detail"}),
             },
             "optional": {
-                "camera_control": ([
-                    "Auto Select",
-                    "Wide-angle Lens",
-                    "Macro Shot",
-                    "Low-angle Perspective", 
-                    "High-angle Shot",
-                    "Close-up Shot",
-                    "Medium Shot"
-                ], {"default": "Auto Select"}),
-                "lighting_control": ([
-                    "Auto Select",
-                    "Studio Lighting",
-                    "Natural Lighting",
-                    "Golden Hour",
-                    "Dramatic Lighting",
-                    "Soft Lighting"
-                ], {"default": "Auto Select"}),
+                "camera_control": (list(CAMERA_OPTIONS), {"default": "Auto Select"}),
+                "lighting_control": (list(LIGHTING_OPTIONS), {"default": "Auto Select"}),
                 "quality_enhancement": ("BOOLEAN", {
                     "default": True,
                     "label_on": "Enable Quality Enhancement", 
@@ -348,6 +673,10 @@ class TutuNanaBananaPromptMaster:
                     "default": "",
                     "placeholder": "Additional custom terms (optional)..."
                 }),
+                "profile": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Run this execution under cProfile and tracemalloc; result paths are appended to the report"
+                }),
             }
         }
     
@@ -356,13 +685,22 @@ class TutuNanaBananaPromptMaster:
     FUNCTION = "process_prompt"
     CATEGORY = "Tutu"
 
+    @profilable("prompt_master", report_index=2)
     def process_prompt(self, template_selection, user_idea, language, detail_level,
                       camera_control="Auto Select", lighting_control="Auto Select", 
-                      quality_enhancement=True, custom_additions=""):
+                      quality_enhancement=True, custom_additions="", profile=False):
         """
         Main processing function - New unified logic:
         1. Select Template → 2. Optimize Prompt → 3. Combine → 4. Output
+
+        Results are memoized in prompt_cache; a hit returns without logging.
+        The processing time line is added to the report on every return.
         """
+        cache_key = (template_selection, user_idea, language, detail_level, camera_control,
+                     lighting_control, quality_enhancement, custom_additions, get_preset_store().version)
+        cached = prompt_cache.get(cache_key)
+        if cached is not None:
+            return self._with_processing_time(cached)
         
         print(f"\n[Prompt Master] 🎨 ========== Processing Started ==========")
         print(f"[Prompt Master] 📝 User Input: {user_idea}")
@@ -375,99 +713,11 @@ class TutuNanaBananaPromptMaster:
             return "Please enter your creative idea", "No Template", "Error: Empty input"
         
         original_input = user_idea.strip()
-        optimization_log = []
-        
-        # ======================== Step 1: Template Selection ========================
-        selected_template = None
-        template_name = "Custom Input"
-        
-        if template_selection == "Custom Input":
-            # No template, use raw input
-            optimized_prompt = original_input
-            template_name = "Custom Input"
-            print(f"[Prompt Master] 📝 Using custom input (no template)")
-            
-        elif template_selection == "Auto Detect Scene":
-            # Auto detect and apply template
-            detected_type = detect_scene_type(original_input)
-            if detected_type:
-                template = get_template_by_name(detected_type)
-                if template:
-                    selected_template = template
-                    template_name = f"Auto: {detected_type}"
-                    print(f"[Prompt Master] 🔍 Auto-detected: {detected_type}")
-                else:
-                    optimized_prompt = original_input
-                    template_name = "Auto: No Match"
-                    print(f"[Prompt Master] 🔍 Auto-detected {detected_type}, but template not found")
-            else:
-                optimized_prompt = original_input
-                template_name = "Auto: No Detection"
-                print(f"[Prompt Master] 🔍 No scene type detected, using raw input")
-        else:
-            # Use selected template
-            template = get_template_by_name(template_selection)
-            if template:
-                selected_template = template
-                template_name = template_selection
-                print(f"[Prompt Master] 📋 Using template: {template_selection}")
-            else:
-                optimized_prompt = original_input
-                template_name = "Template Not Found"
-                print(f"[Prompt Master] ❌ Template '{template_selection}' not found")
-        
-        # ======================== Step 2: Prompt Optimization ========================
-        
-        # Initialize optimizer
-        optimizer = PromptOptimizer(language)
-        
-        # Apply optimizations to user input
-        working_prompt = original_input
-        
-        # Add quality enhancement
-        if quality_enhancement:
-            quality_level = {
-                "Basic Detail": "basic",
-                "Professional Detail": "professional", 
-                "Premium Quality": "premium",
-                "Masterpiece Level": "Masterpiece Level"
-            }.get(detail_level, "professional")
-            
-            working_prompt, quality_log = optimizer.add_quality_enhancement(working_prompt, quality_level, template_name)
-            optimization_log.extend(quality_log)
-        
-        # Add camera control
-        working_prompt, camera_log = optimizer.add_camera_control(working_prompt, camera_control)
-        optimization_log.extend(camera_log)
-        
-        # Add lighting control
-        working_prompt, lighting_log = optimizer.add_lighting_control(working_prompt, lighting_control)
-        optimization_log.extend(lighting_log)
-        
-        # Add custom additions
-        if custom_additions.strip():
-            working_prompt += f", {custom_additions.strip()}"
-            optimization_log.append(f"Added custom terms: {custom_additions.strip()}")
-        
-        # Clean the optimized prompt
-        working_prompt = optimizer.clean_prompt(working_prompt)
-        
-        # ======================== Step 3: Template Combination ========================
-        
-        if selected_template:
-            # Apply template with optimized prompt
-            template_text = selected_template["config"]["prompt_template"]
-            if "{prompt}" in template_text:
-                final_prompt = template_text.replace("{prompt}", working_prompt)
-            else:
-                final_prompt = f"{template_text}, {working_prompt}"
-            optimization_log.append(f"Applied template: {template_name}")
-        else:
-            # No template, use optimized prompt directly
-            final_prompt = working_prompt
-        
-        # Final cleanup
-        final_prompt = optimizer.clean_prompt(final_prompt)
+        final_prompt, template_name, optimization_log, status = optimize_prompt(
+            original_input, template_selection, language, detail_level,
+            camera_control, lighting_control, quality_enhancement, custom_additions
+        )
+        print(f"[Prompt Master] {status}")
         
         # ======================== Generate Report ========================
         
@@ -479,10 +729,18 @@ class TutuNanaBananaPromptMaster:
         print(f"[Prompt Master] 📏 Output length: {len(final_prompt)} characters")
         print(f"[Prompt Master] 🎨 ========== Processing Finished ==========\n")
         
-        return final_prompt, template_name, report
+        result = (final_prompt, template_name, report)
+        prompt_cache.put(cache_key, result)
+        return self._with_processing_time(result)
+
+    @staticmethod
+    def _with_processing_time(result):
+        """Append the current time to the report of a (possibly cached) result"""
+        final_prompt, template_name, report = result
+        return final_prompt, template_name, f"{report}🕒 Processing time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
     
     def generate_report(self, original, final, template_name, log, language):
-        """Generate detailed processing report"""
+        """Generate detailed processing report (without the processing time)"""
         report = f"""🎨 Prompt Master Processing Report
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -495,17 +753,228 @@ class TutuNanaBananaPromptMaster:
 {chr(10).join([f"• {item}" for item in log]) if log else "• No specific optimizations applied"}
 
 ⭐ Unified template system - seamless integration
-🕒 Processing time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
         
         return report
 
+class TutuNanaBananaPromptMasterBatch:
+    """
+    🎨 Batch Prompt Master
+    Optimizes many ideas in one node execution using ComfyUI list inputs/outputs
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        input_types = TutuNanaBananaPromptMaster.INPUT_TYPES()
+        required = dict(input_types["required"])
+        del required["user_idea"]
+        required["ideas"] = ("STRING", {
+            "multiline": True,
+            "default": "",
+            "placeholder": "One idea per line, JSONL ({\"idea\": ...}) or a list of strings..."
+        })
+        return {"required": required, "optional": input_types["optional"]}
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("optimized_prompts", "templates_used", "batch_report")
+    OUTPUT_IS_LIST = (True, True, False)
+    FUNCTION = "process_batch"
+    CATEGORY = "Tutu"
+
+    @profilable("prompt_master_batch", report_index=2)
+    def process_batch(self, template_selection, ideas, language, detail_level,
+                      camera_control="Auto Select", lighting_control="Auto Select",
+                      quality_enhancement=True, custom_additions="", profile=False):
+        """Optimize every idea with the same settings; template lookups are shared"""
+        # INPUT_IS_LIST: every input arrives as a list, settings use the first value
+        def first(value):
+            return value[0] if isinstance(value, list) else value
+
+        (template_selection, language, detail_level, camera_control, lighting_control,
+         quality_enhancement, custom_additions) = map(first, (
+            template_selection, language, detail_level, camera_control, lighting_control,
+            quality_enhancement, custom_additions))
+        texts = ideas if isinstance(ideas, list) else [ideas]
+
+        idea_list = split_ideas(texts)
+        if not idea_list:
+            return [], [], "Error: Empty input"
+
+        print(f"[Prompt Master] 🎨 Batch: {len(idea_list)} ideas, template: {template_selection}, language: {language}")
+
+        get_template = functools.lru_cache(maxsize=None)(get_template_by_name)
+        prompts = []
+        template_names = []
+        for idea in idea_list:
+            final_prompt, template_name, _, _ = optimize_prompt(
+                idea, template_selection, language, detail_level, camera_control, lighting_control,
+                quality_enhancement, custom_additions, get_template=get_template
+            )
+            prompts.append(final_prompt)
+            template_names.append(template_name)
+
+        report = self.generate_batch_report(idea_list, prompts, template_names)
+        print(f"[Prompt Master] ✅ Batch completed: {len(prompts)} prompts")
+        return prompts, template_names, report
+
+    def generate_batch_report(self, ideas, prompts, template_names):
+        """Generate one summary report for the whole batch"""
+        usage = Counter(template_names)
+        input_chars = sum(len(idea) for idea in ideas)
+        output_chars = sum(len(prompt) for prompt in prompts)
+        report = f"""🎨 Prompt Master Batch Report
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📝 Ideas processed: {len(ideas)}
+📏 Average input length: {input_chars / len(ideas):.0f} characters
+📏 Average output length: {output_chars / len(prompts):.0f} characters
+
+🎯 Templates used:
+{chr(10).join([f"• {name}: {count}" for name, count in usage.most_common()])}
+
+🕒 Processing time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+"""
+
+        return report
+
+class TutuPromptVariantGenerator:
+    """
+    🎨 Prompt Variant Generator
+    Sweeps template × camera × lighting × detail level for one idea (A/B testing)
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "user_idea": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "placeholder": "Enter your creative idea here..."
+                }),
+                "templates": ("STRING", {
+                    "multiline": True,
+                    "default": "Custom Input",
+                    "tooltip": "Template names, one per line (Custom Input, Auto Detect Scene or saved templates), or 'all'"
+                }),
+                "camera_controls": ("STRING", {
+                    "default": "all",
+                    "tooltip": "Comma-separated camera options, or 'all'"
+                }),
+                "lighting_controls": ("STRING", {
+                    "default": "all",
+                    "tooltip": "Comma-separated lighting options, or 'all'"
+                }),
+                "detail_levels": ("STRING", {
+                    "default": "Professional Detail",
+                    "tooltip": "Comma-separated detail levels, or 'all'"
+                }),
+                "language": (list(LANGUAGES), {"default": "English Optimization"}),
+                "max_variants": ("INT", {
+                    "default": 64, "min": 0, "max": MAX_VARIANTS,
+                    "tooltip": f"Maximum number of variants to output (0 = all combinations, up to {MAX_VARIANTS})"
+                }),
+            },
+            "optional": {
+                "random_sample": ("BOOLEAN", {
+                    "default": False,
+                    "label_on": "Random Sample",
+                    "label_off": "In Order"
+                }),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffff}),
+                "dedupe": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Skip Identical Prompts",
+                    "label_off": "Keep Duplicates"
+                }),
+                "quality_enhancement": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Enable Quality Enhancement",
+                    "label_off": "Basic Quality Only"
+                }),
+                "custom_additions": ("STRING", {
+                    "default": "",
+                    "placeholder": "Additional custom terms (optional)..."
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("prompts", "variant_labels", "sweep_report")
+    OUTPUT_IS_LIST = (True, True, False)
+    FUNCTION = "generate_variants"
+    CATEGORY = "Tutu"
+
+    @staticmethod
+    def parse_options(text, options, separator=","):
+        """Parse a separated option list; 'all' selects every option, unknown names are skipped"""
+        if text.strip().lower() == "all":
+            return list(options)
+        selected = []
+        for name in (item.strip() for item in text.split(separator)):
+            if not name:
+                continue
+            if name in options:
+                if name not in selected:
+                    selected.append(name)
+            else:
+                print(f"[Prompt Master] ⚠️ Unknown option skipped: {name}")
+        return selected
+
+    def generate_variants(self, user_idea, templates, camera_controls, lighting_controls, detail_levels,
+                          language, max_variants, random_sample=False, seed=0, dedupe=True,
+                          quality_enhancement=True, custom_additions=""):
+        """Generate up to max_variants prompt variants without building the full product"""
+        if not user_idea.strip():
+            return [], [], "Error: Empty input"
+
+        axes = [
+            self.parse_options(templates, get_template_options(), separator="\n"),
+            self.parse_options(camera_controls, CAMERA_OPTIONS),
+            self.parse_options(lighting_controls, LIGHTING_OPTIONS),
+            self.parse_options(detail_levels, list(DETAIL_LEVELS)),
+        ]
+        total = math.prod(len(axis) for axis in axes)
+        if total == 0:
+            return [], [], "Error: Every option list needs at least one valid entry"
+        if max_variants <= 0 and total > MAX_VARIANTS:
+            return [], [], (f"Error: {total} combinations exceed the limit of {MAX_VARIANTS}; "
+                            "set max_variants (with Random Sample to spread them) or select fewer options")
+
+        variants = iter_prompt_variants(
+            user_idea.strip(), *axes, language=language, quality_enhancement=quality_enhancement,
+            custom_additions=custom_additions, shuffle=random_sample, seed=seed, dedupe=dedupe
+        )
+        variants = itertools.islice(variants, min(max_variants, MAX_VARIANTS) if max_variants > 0 else MAX_VARIANTS)
+
+        prompts = []
+        labels = []
+        for prompt, label in variants:
+            prompts.append(prompt)
+            labels.append(label)
+
+        report = f"""🎨 Prompt Variant Sweep Report
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🧮 Combinations: {total} ({' × '.join(str(len(axis)) for axis in axes)} template × camera × lighting × detail)
+📤 Variants output: {len(prompts)}
+🎲 Order: {f"random sample (seed {seed})" if random_sample else "in order"}
+♻️ Dedupe: {"on" if dedupe else "off"}
+"""
+        print(f"[Prompt Master] 🎨 Variant sweep: {len(prompts)} of {total} combinations")
+        return prompts, labels, report
+
 # ======================== Node Registration ========================
 
 NODE_CLASS_MAPPINGS = {
-    "TutuNanaBananaPromptMaster": TutuNanaBananaPromptMaster
+    "TutuNanaBananaPromptMaster": TutuNanaBananaPromptMaster,
+    "TutuNanaBananaPromptMasterBatch": TutuNanaBananaPromptMasterBatch,
+    "TutuPromptVariantGenerator": TutuPromptVariantGenerator
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "TutuNanaBananaPromptMaster": "🎨 Tutu Nano Banana Prompt Master"
+    "TutuNanaBananaPromptMaster": "🎨 Tutu Nano Banana Prompt Master",
+    "TutuNanaBananaPromptMasterBatch": "🎨 Tutu Nano Banana Prompt Master (Batch)",
+    "TutuPromptVariantGenerator": "🎨 Tutu Prompt Variant Generator"
 }
@@ -1,5 +1,7 @@
 from .Tutu import NODE_CLASS_MAPPINGS as TUTU_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as TUTU_DISPLAY_MAPPINGS, WEB_DIRECTORY
 from .TutuPromptMaster import NODE_CLASS_MAPPINGS as PROMPT_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PROMPT_DISPLAY_MAPPINGS
+from . import mjstyle  # 注册风格目录接口 (/tutu/mjstyle)
+from . import metrics  # 注册指标接口 (/tutu/metrics)
 
 # 合并所有节点映射
 NODE_CLASS_MAPPINGS = {**TUTU_MAPPINGS, **PROMPT_MAPPINGS}
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+请求日志分析
+
+按 provider 和 model 汇总 journal.py 写入的JSONL请求日志（含轮转文件），
+输出请求数、错误数以及耗时的 p50/p95/p99:
+    python analyze_journal.py [日志文件...] [--stage total|connect_ttfb|stream|...] [--json]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "tutu_journal.jsonl")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """线性插值的百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def journal_files(path):
+    """当前日志文件及其轮转文件 (path.1, path.2 ...)，从旧到新"""
+    rotated = [name for name in glob.glob(glob.escape(path) + ".*") if name.rsplit(".", 1)[-1].isdigit()]
+    rotated.sort(key=lambda name: int(name.rsplit(".", 1)[-1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_records(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程异常退出时最后一行可能不完整
+                    continue
+
+
+def summarize(records, stage="total"):
+    """返回 {(provider, model): {"requests", "errors", "samples", "p50", "p95", "p99", ...}}"""
+    groups = defaultdict(lambda: {"requests": 0, "errors": 0, "images_requested": 0, "images_returned": 0,
+                                  "values": []})
+    for record in records:
+        group = groups[(record.get("provider") or "", record.get("model") or "")]
+        group["requests"] += 1
+        if record.get("error_class"):
+            group["errors"] += 1
+        group["images_requested"] += record.get("images_requested") or 0
+        group["images_returned"] += record.get("images_returned") or 0
+        value = record.get("total_ms") if stage == "total" else (record.get("stages_ms") or {}).get(stage)
+        if value is not None:
+            group["values"].append(value)
+
+    summary = {}
+    for key, group in sorted(groups.items()):
+        values = sorted(group.pop("values"))
+        group["samples"] = len(values)
+        for pct in PERCENTILES:
+            group[f"p{pct}"] = percentile(values, pct)
+        summary[key] = group
+    return summary
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="日志文件（默认 logs/tutu_journal.jsonl 及其轮转文件）")
+    parser.add_argument("--stage", default="total", help="统计的阶段，默认总耗时")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    paths = args.paths or journal_files(os.environ.get("TUTU_JOURNAL", DEFAULT_PATH))
+    if not paths:
+        print("未找到请求日志", file=sys.stderr)
+        return 1
+    summary = summarize(read_records(paths), args.stage)
+
+    if args.json:
+        print(json.dumps([dict(provider=provider, model=model, stage=args.stage, **group)
+                          for (provider, model), group in summary.items()], ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"阶段: {args.stage} (ms)")
+    header = f"{'provider':<16} {'model':<48} {'requests':>8} {'errors':>6} {'images':>9} {'p50':>9} {'p95':>9} {'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for (provider, model), group in summary.items():
+        images = f"{group['images_returned']}/{group['images_requested']}"
+        print(f"{provider:<16} {model:<48} {group['requests']:>8} {group['errors']:>6} {images:>9} "
+              f"{_format_ms(group['p50']):>9} {_format_ms(group['p95']):>9} {_format_ms(group['p99']):>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Prompt Master 性能基准
+
+在大批量随机提示词上比较关键词检测和模板渲染的新旧实现:
+    python bench_prompt_master.py [--count 20000]
+"""
+import argparse
+import importlib
+import os
+import random
+import sys
+import time
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+prompt_master = load_package_module("TutuPromptMaster")
+prompt_template = load_package_module("prompt_template")
+
+FILLER = ("a an the with of in on at under beautiful bright dark old new small large red blue "
+          "green quiet busy morning evening standing sitting looking carpet cartoonish scarf").split()
+
+
+def legacy_detect_scene_type(prompt_text):
+    """原实现：逐个关键词做子串检查"""
+    prompt_lower = prompt_text.lower()
+    scores = {}
+    for category, keywords in prompt_master.SCENE_KEYWORDS.items():
+        score = sum(1 for keyword in keywords if keyword in prompt_lower)
+        if score > 0:
+            scores[category] = score
+    return max(scores, key=scores.get) if scores else None
+
+
+def legacy_detect_art_style(prompt, template_name="Custom Input"):
+    """原实现：按风格顺序做 any(...) 子串检查"""
+    prompt_lower = prompt.lower()
+    template_lower = template_name.lower()
+    for style, keywords in prompt_master.ART_STYLE_KEYWORDS.items():
+        if any(keyword in template_lower or keyword in prompt_lower for keyword in keywords):
+            return style
+    return "premium"
+
+
+def legacy_render(template_text, prompt):
+    """原实现：先清理提示词，str.replace 后再用两次正则清理整个输出"""
+    prompt = prompt_template.clean_text(prompt)
+    if "{prompt}" in template_text:
+        return prompt_template.clean_text(template_text.replace("{prompt}", prompt))
+    return prompt_template.clean_text(f"{template_text}, {prompt}")
+
+
+def compiled_render(template_text, prompt):
+    return prompt_template.compile_template(template_text).render(prompt=prompt)
+
+
+def make_prompts(count, seed=0):
+    rng = random.Random(seed)
+    keywords = [k for table in (prompt_master.SCENE_KEYWORDS, prompt_master.ART_STYLE_KEYWORDS)
+                for words in table.values() for k in words]
+    prompts = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(8, 40)) + rng.choices(keywords, k=rng.randint(0, 4))
+        rng.shuffle(words)
+        prompts.append(" ".join(words))
+    return prompts
+
+
+def bench(label, func, prompts, repeat=3):
+    best = min(_timed(func, prompts) for _ in range(repeat))
+    print(f"{label:<34} {best * 1000:9.1f} ms  {best / len(prompts) * 1e6:7.2f} µs/prompt")
+    return best
+
+
+def _timed(func, prompts):
+    start = time.perf_counter()
+    for prompt in prompts:
+        func(prompt)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000, help="提示词数量")
+    args = parser.parse_args()
+
+    prompts = make_prompts(args.count)
+    optimizer = prompt_master.PromptOptimizer()
+    print(f"提示词数量: {len(prompts)}\n")
+
+    for name, legacy, compiled in [
+        ("detect_scene_type", legacy_detect_scene_type, prompt_master.detect_scene_type),
+        ("detect_art_style", legacy_detect_art_style, optimizer.detect_art_style),
+    ]:
+        old = bench(f"{name} (substring)", legacy, prompts)
+        new = bench(f"{name} (compiled)", compiled, prompts)
+        # 结果不同的提示词来自子串误匹配（如 carpet -> car）
+        changed = sum(legacy(prompt) != compiled(prompt) for prompt in prompts)
+        print(f"{'':<34} {old / new:9.2f}x  结果不同: {changed}\n")
+
+    # 模板渲染：所有预设模板 × 提示词（未清理的提示词由渲染时清理，与 optimize_prompt 一致）
+    templates = [preset["config"]["prompt_template"]
+                 for preset in prompt_master.get_preset_store().get_presets("gemini")]
+    pairs = [(template, prompt) for prompt in prompts for template in templates][:len(prompts)]
+    old = bench("render (replace + clean)", lambda pair: legacy_render(*pair), pairs)
+    new = bench("render (compiled)", lambda pair: compiled_render(*pair), pairs)
+    changed = sum(legacy_render(*pair) != compiled_render(*pair) for pair in pairs)
+    print(f"{'':<34} {old / new:9.2f}x  结果不同: {changed}")
+
+
+if __name__ == "__main__":
+    main()
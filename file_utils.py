@@ -0,0 +1,139 @@
+import copy
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_TIMEOUT = 10.0
+LOCK_POLL_INTERVAL = 0.01
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Return a cheap change marker for a file.
+
+    Args:
+        path: File path
+
+    Returns:
+        Optional[Tuple[int, int]]: (mtime in ns, size in bytes), or None if
+        the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def atomic_write_json(path: str, data, indent: int = 2) -> None:
+    """
+    Write JSON to a file atomically.
+
+    The data is written to a temporary file in the same directory, flushed
+    to disk and then renamed over the target, so readers see either the old
+    or the new file, never a partially written one.
+
+    Args:
+        path: Target file path
+        data: JSON-serializable object
+        indent: JSON indentation
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp 创建的文件权限为 0600，沿用原文件的权限
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def _try_lock(fd) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(fd) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(path: str, timeout: float = LOCK_TIMEOUT):
+    """
+    Hold an exclusive advisory lock for a file across processes.
+
+    The lock is taken on a sidecar "<path>.lock" file rather than the file
+    itself, because atomic_write_json replaces the target's inode on every
+    write. Only writers need the lock; readers rely on the atomic rename.
+
+    Args:
+        path: File the lock protects
+        timeout: Seconds to wait for the lock before raising TimeoutError
+    """
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock on {path}")
+            time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+def update_json_file(path: str, update: Callable[[dict], bool], default: dict,
+                     indent: int = 2) -> Tuple[dict, Optional[Tuple[int, int]]]:
+    """
+    Read-modify-write a JSON file under file_lock.
+
+    The file is re-read inside the lock, so changes written by other
+    processes since the caller last loaded it are kept instead of being
+    overwritten with a stale copy.
+
+    Args:
+        path: JSON file path
+        update: Mutates the loaded data in place; returns False to skip the write
+        default: Data to start from when the file is missing or invalid
+        indent: JSON indentation
+
+    Returns:
+        Tuple[dict, Optional[Tuple[int, int]]]: The resulting data and the
+        file signature matching it
+    """
+    with file_lock(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = copy.deepcopy(default)
+        if update(data) is not False:
+            atomic_write_json(path, data, indent=indent)
+        return data, file_signature(path)
@@ -0,0 +1,180 @@
+"""
+Append-only JSONL journal of Gemini node requests.
+
+Every finished generation is summarized into one JSON line: request id,
+provider, model, requested/returned image counts, per-stage timings,
+payload/response sizes, peak memory, HTTP status, retries and error class. Records never
+contain API keys, prompts or image data. Lines are queued and written by a
+background thread, so the node never waits on disk I/O, and the file is
+rotated by size (tutu_journal.jsonl -> .1 -> .2 ...).
+
+Environment variables:
+- TUTU_JOURNAL            path of the journal file, or "off" to disable
+- TUTU_JOURNAL_MAX_MB     rotate when the file exceeds this size (default 10)
+- TUTU_JOURNAL_BACKUPS    rotated files to keep (default 5)
+
+analyze_journal.py reports latency percentiles from these files.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "logs", "tutu_journal.jsonl")
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# 只有这些元数据字段会写入日志，其余（如错误信息原文）一律不记录
+RECORD_FIELDS = ("provider", "model", "images_requested", "images_returned", "http_status", "error_class",
+                 "low_memory")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def make_record(timings) -> dict:
+    """Journal record for one generation from its StageTimer (see telemetry.py)"""
+    data = timings.as_dict()
+    counters = data["counters"]
+    record = {
+        "ts": round(time.time(), 3),
+        "request_id": data.get("request_id") or new_request_id(),
+    }
+    for field in RECORD_FIELDS:
+        record[field] = data.get(field)
+    record.update(
+        total_ms=data["total_ms"],
+        stages_ms=data["stages_ms"],
+        request_bytes=counters.get("request_bytes", 0),
+        response_bytes=counters.get("response_bytes", 0),
+        download_bytes=counters.get("download_bytes", 0),
+        retries=counters.get("retries", 0),
+        memory=data.get("memory", {}),
+    )
+    return record
+
+
+class RequestJournal:
+    """Size-rotated JSONL file fed through a queue by one daemon writer thread"""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def write(self, record: dict):
+        """Queue a record; returns immediately"""
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="TutuJournalWriter", daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def close(self, timeout=5.0):
+        """Write everything queued so far and stop the writer thread"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def flush(self, timeout=5.0):
+        """Block until the records queued so far are on disk"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            lines = []
+            events = []
+            stop = False
+            # 一次取完队列中已有的记录，合并为一次写入
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if lines:
+                try:
+                    self._append(lines)
+                except OSError as e:
+                    print(f"[Tutu] 请求日志写入失败: {e}")
+            for event in events:
+                event.set()
+            if stop:
+                return
+
+    def _append(self, lines):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "ab")
+        try:
+            size = f.tell()
+            for line in lines:
+                data = (line + "\n").encode("utf-8")
+                # 写入前轮转，文件大小不超过 max_bytes（单条记录超长时除外）
+                if self.max_bytes and size and size + len(data) > self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "ab")
+                    size = 0
+                f.write(data)
+                size += len(data)
+        finally:
+            f.close()
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def _journal_from_env():
+    path = os.environ.get("TUTU_JOURNAL", DEFAULT_PATH)
+    if path.strip().lower() in ("", "0", "off", "false", "none"):
+        return None
+    try:
+        max_bytes = int(float(os.environ.get("TUTU_JOURNAL_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024)
+        backups = int(os.environ.get("TUTU_JOURNAL_BACKUPS", DEFAULT_BACKUPS))
+    except ValueError:
+        max_bytes, backups = DEFAULT_MAX_BYTES, DEFAULT_BACKUPS
+    return RequestJournal(path, max_bytes, backups)
+
+
+request_journal = _journal_from_env()
+
+if request_journal is not None:
+    atexit.register(request_journal.close)
+
+
+def record_request(timings):
+    """Journal one finished generation; no-op when the journal is disabled"""
+    if request_journal is not None:
+        request_journal.write(make_record(timings))
@@ -0,0 +1,249 @@
+"""
+In-process metrics exported in the Prometheus text format.
+
+Counters and histograms are sharded per thread: each thread updates only
+its own dict, so recording a sample takes no lock. The shards are summed
+when /tutu/metrics is scraped. Cache statistics are pulled from registered
+callbacks at scrape time. Route registered on ComfyUI's PromptServer:
+
+- GET /tutu/metrics   all metrics (text/plain; version=0.0.4)
+"""
+
+import threading
+from typing import Callable, Dict, List, Tuple
+
+try:
+    from server import PromptServer
+except ImportError:  # 不在 ComfyUI 中运行（例如测试）
+    PromptServer = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 阶段耗时的直方图桶（秒），覆盖本地编码到长时间生成
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for thread-sharded metrics keyed by a tuple of label values"""
+
+    kind = ""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # 每个线程只在第一次记录时加锁注册自己的分片
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict() 复制在持有GIL时完成，不会与写入线程冲突
+        return [dict(shard) for shard in shards]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def values(self) -> Dict[Tuple, float]:
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def collect(self):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+                for key, value in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        state = shard.get(label_values)
+        if state is None:
+            # [每个桶的计数..., +Inf计数, 总和]
+            state = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def values(self) -> Dict[Tuple, list]:
+        totals = {}
+        for shard in self._snapshots():
+            for key, state in shard.items():
+                state = list(state)
+                total = totals.get(key)
+                totals[key] = state if total is None else [a + b for a, b in zip(total, state)]
+        return totals
+
+    def collect(self):
+        lines = []
+        for key, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named metrics plus cache statistics callbacks, rendered on scrape"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._caches: Dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def register_cache(self, name, stats: Callable[[], dict]):
+        """stats() returns {"hits", "misses", "size", "maxsize"} like LRUCache.stats()"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def _cache_lines(self) -> List[str]:
+        gauges = (
+            ("tutu_cache_hits_total", "counter", "Cache hits", "hits"),
+            ("tutu_cache_misses_total", "counter", "Cache misses", "misses"),
+            ("tutu_cache_size", "gauge", "Entries currently cached", "size"),
+            ("tutu_cache_hit_ratio", "gauge", "Hits divided by lookups", "hit_ratio"),
+        )
+        with self._lock:
+            caches = sorted(self._caches.items())
+        stats = {}
+        for name, callback in caches:
+            try:
+                stats[name] = callback()
+            except Exception:
+                continue
+        lines = []
+        for metric, kind, documentation, field in gauges:
+            lines.append(f"# HELP {metric} {documentation}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, values in stats.items():
+                if field == "hit_ratio" and field not in values:
+                    lookups = values.get("hits", 0) + values.get("misses", 0)
+                    value = values.get("hits", 0) / lookups if lookups else 0.0
+                else:
+                    value = values.get(field, 0)
+                lines.append(f'{metric}{{cache="{_escape(name)}"}} {_format_number(value)}')
+        return lines
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        lines.extend(self._cache_lines())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    "tutu_requests_total", "Generation requests by provider and model", ("provider", "model"))
+ERRORS = registry.counter(
+    "tutu_errors_total", "Failed generations by provider and handle_api_error category", ("provider", "category"))
+STAGE_SECONDS = registry.histogram(
+    "tutu_stage_duration_seconds", "Per-stage latency of a generation", ("provider", "stage"))
+BYTES = registry.counter(
+    "tutu_bytes_total", "Bytes sent to (out) and received from (in) the APIs", ("provider", "direction"))
+IMAGES_REQUESTED = registry.counter(
+    "tutu_images_requested_total", "Images requested (num_images)", ("provider",))
+IMAGES_PRODUCED = registry.counter(
+    "tutu_images_produced_total", "Images returned in the output batch", ("provider",))
+UPLOADS = registry.counter(
+    "tutu_upload_attempts_total", "Input image upload attempts by host and result", ("host", "result"))
+
+
+def record_generation(timings):
+    """Record one finished generation from its StageTimer (see telemetry.py)"""
+    meta = timings.meta
+    provider = meta.get("provider", "")
+    REQUESTS.inc(provider, meta.get("model", ""))
+    if meta.get("error_class"):
+        ERRORS.inc(provider, meta["error_class"])
+    for stage, seconds in timings.durations.items():
+        STAGE_SECONDS.observe(seconds, provider, stage)
+    STAGE_SECONDS.observe(timings.elapsed(), provider, "total")
+    counters = timings.counters
+    BYTES.inc(provider, "out", amount=counters.get("request_bytes", 0))
+    BYTES.inc(provider, "in", amount=counters.get("response_bytes", 0) + counters.get("download_bytes", 0))
+    IMAGES_REQUESTED.inc(provider, amount=meta.get("images_requested", 0))
+    IMAGES_PRODUCED.inc(provider, amount=meta.get("images_returned", 0))
+
+
+def register_routes(routes):
+    """Register the metrics route on an aiohttp RouteTableDef"""
+    from aiohttp import web
+
+    @routes.get("/tutu/metrics")
+    async def get_metrics(request):
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": CONTENT_TYPE})
+
+
+if PromptServer is not None and getattr(PromptServer, "instance", None) is not None:
+    register_routes(PromptServer.instance.routes)
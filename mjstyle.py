@@ -0,0 +1,298 @@
+"""
+Style catalog endpoints for the mjstyle picker (web/js/Tutu_mjstyle.js).
+
+The docs/mjstyle/*.json catalogs are loaded once into memory together with
+their serialized and gzip-compressed bodies and strong ETags, and reloaded
+only when a catalog file changes. Routes registered on ComfyUI's
+PromptServer:
+
+- GET /tutu/mjstyle             every catalog in one response
+- GET /tutu/mjstyle/{name}.json a single catalog
+- GET /tutu/mjstyle/search      paged search over style names and prompts
+                                (?q=&catalog=&offset=&limit=)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .file_utils import file_signature
+
+try:
+    from server import PromptServer
+except ImportError:  # 不在 ComfyUI 中运行（例如测试）
+    PromptServer = None
+
+MJSTYLE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "docs", "mjstyle")
+CACHE_CONTROL = "public, max-age=300"
+SEARCH_MAX_LIMIT = 100
+
+_TOKEN = re.compile(r"\w+")
+
+
+class CatalogBody(NamedTuple):
+    """A serialized response body with its precompressed form and ETags"""
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    gzip_etag: str
+
+
+def _make_body(data) -> CatalogBody:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    # mtime=0 keeps the compressed bytes (and so the ETag) stable across reloads
+    gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+    # Strong ETags must differ between content codings
+    return CatalogBody(body, gzip_body, f'"{digest}"', f'"{digest}-gzip"')
+
+
+def _tokens(text):
+    return _TOKEN.findall(str(text or "").lower())
+
+
+class StyleSearchIndex:
+    """
+    Search index over style names and prompts, built once per catalog load
+
+    Every token of a style's name and prompt goes into an inverted index
+    (token -> style ids) and a prefix trie whose nodes hold the ids of all
+    styles with a token under that prefix. Completed query words are looked
+    up in the inverted index; the last word is matched as a prefix through
+    the trie, so results update while typing.
+    Styles whose name has the term as a whole word rank first, then name
+    prefixes, then prompt-only matches; ties keep catalog order.
+    """
+
+    def __init__(self, styles: Dict[str, List[dict]]):
+        self.entries = []
+        self.inverted = {}
+        self.trie = {}
+        self._name_tokens = []
+        for catalog, items in styles.items():
+            for style in items:
+                if not isinstance(style, dict):
+                    continue
+                style_id = len(self.entries)
+                self.entries.append((catalog, style))
+                name_tokens = set(_tokens(style.get("name")))
+                self._name_tokens.append(name_tokens)
+                for token in name_tokens.union(_tokens(style.get("prompt"))):
+                    self.inverted.setdefault(token, set()).add(style_id)
+                    self._add_prefixes(token, style_id)
+
+    def _add_prefixes(self, token, style_id):
+        node = self.trie
+        for char in token:
+            # node layout: {char: (children, ids)}
+            children, ids = node.setdefault(char, ({}, set()))
+            ids.add(style_id)
+            node = children
+
+    def _prefix_ids(self, prefix):
+        node = self.trie
+        ids = set()
+        for char in prefix:
+            if char not in node:
+                return set()
+            node, ids = node[char]
+        return ids
+
+    def _score(self, style_id, terms):
+        name_tokens = self._name_tokens[style_id]
+        score = 0
+        for term in terms:
+            if term in name_tokens:
+                score += 2
+            elif any(token.startswith(term) for token in name_tokens):
+                score += 1
+        return score
+
+    def search(self, query, catalog=None, offset=0, limit=20):
+        """Return (total matches, page of (catalog, style) pairs)"""
+        terms = _tokens(query)
+        if terms:
+            matches = self._prefix_ids(terms[-1])
+            for term in terms[:-1]:
+                if not matches:
+                    break
+                matches = matches & self.inverted.get(term, set())
+            ordered = sorted(matches, key=lambda style_id: (-self._score(style_id, terms), style_id))
+        else:
+            ordered = range(len(self.entries))
+        if catalog:
+            ordered = [style_id for style_id in ordered if self.entries[style_id][0] == catalog]
+        ordered = list(ordered)
+        return len(ordered), [self.entries[style_id] for style_id in ordered[offset:offset + limit]]
+
+
+class CatalogSnapshot(NamedTuple):
+    signature: Tuple
+    styles: Dict[str, List[dict]]
+    bodies: Dict[str, CatalogBody]
+    index: CatalogBody
+    search: StyleSearchIndex
+
+
+class StyleCatalog:
+    """docs/mjstyle 目录的内存索引，文件变化时重新加载"""
+
+    def __init__(self, directory=MJSTYLE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _signature(self):
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            return ()
+        return tuple((name, file_signature(os.path.join(self.directory, name))) for name in names)
+
+    def _load(self, signature) -> CatalogSnapshot:
+        styles = {}
+        for name, _ in signature:
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[Tutu] 风格目录 {name} 读取失败: {e}")
+                continue
+            if isinstance(data, list):
+                styles[name[:-len(".json")]] = data
+        bodies = {name: _make_body(data) for name, data in styles.items()}
+        index = _make_body({"catalogs": styles, "names": list(styles)})
+        return CatalogSnapshot(signature, styles, bodies, index, StyleSearchIndex(styles))
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Current catalogs; reloads only when a catalog file was added, removed or changed"""
+        signature = self._signature()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.signature == signature:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.signature != signature:
+                snapshot = self._load(signature)
+                self._snapshot = snapshot
+            return snapshot
+
+    def index_body(self) -> CatalogBody:
+        """Combined body with every catalog: {"catalogs": {name: [...]}, "names": [...]}"""
+        return self.snapshot().index
+
+    def catalog_body(self, name) -> Optional[CatalogBody]:
+        """Body for one catalog, or None if it does not exist"""
+        return self.snapshot().bodies.get(name)
+
+    def search(self, query, catalog=None, offset=0, limit=20) -> dict:
+        """Paged search over style names and prompts"""
+        offset = max(0, offset)
+        limit = min(max(1, limit), SEARCH_MAX_LIMIT)
+        total, page = self.snapshot().search.search(query, catalog, offset, limit)
+        return {
+            "query": query,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "results": [dict(style, catalog=name) for name, style in page],
+        }
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Accept weak forms too: proxies may add W/ to what we sent
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def _accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().lower()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def catalog_response(entry: CatalogBody, if_none_match=None, accept_encoding=None):
+    """
+    Choose the representation for a request
+
+    Returns (status, headers, body): 304 with an empty body when the client
+    already has the current representation, otherwise 200 with the gzip
+    body if the client accepts it.
+    """
+    use_gzip = _accepts_gzip(accept_encoding)
+    etag = entry.gzip_etag if use_gzip else entry.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(if_none_match, etag):
+        return 304, headers, b""
+    headers["Content-Type"] = "application/json; charset=utf-8"
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return 200, headers, entry.gzip_body
+    return 200, headers, entry.body
+
+
+style_catalog = StyleCatalog()
+
+
+def register_routes(routes):
+    """Register the catalog routes on an aiohttp RouteTableDef"""
+    from aiohttp import web
+
+    class PrecompressedResponse(web.Response):
+        # The body is already gzip-encoded; ignore response compression
+        # middlewares (ComfyUI's --enable-compress-response-body)
+        def enable_compression(self, *args, **kwargs):
+            pass
+
+    def respond(request, entry):
+        status, headers, body = catalog_response(
+            entry, request.headers.get("If-None-Match"), request.headers.get("Accept-Encoding"))
+        return PrecompressedResponse(status=status, headers=headers, body=body if status == 200 else None)
+
+    @routes.get("/tutu/mjstyle")
+    async def get_style_index(request):
+        return respond(request, style_catalog.index_body())
+
+    @routes.get("/tutu/mjstyle/search")
+    async def search_styles(request):
+        query = request.query
+        try:
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", 20))
+        except ValueError:
+            return web.json_response({"error": "offset and limit must be integers"}, status=400)
+        return web.json_response(style_catalog.search(query.get("q", ""), query.get("catalog"), offset, limit))
+
+    @routes.get("/tutu/mjstyle/{name}.json")
+    async def get_style_catalog(request):
+        entry = style_catalog.catalog_body(request.match_info["name"])
+        if entry is None:
+            return web.json_response({"error": "catalog not found"}, status=404)
+        return respond(request, entry)
+
+
+if PromptServer is not None and getattr(PromptServer, "instance", None) is not None:
+    register_routes(PromptServer.instance.routes)
+    # 启动时预加载目录并建立搜索索引，第一次请求无需等待
+    style_catalog.snapshot()
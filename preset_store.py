@@ -0,0 +1,458 @@
+"""
+Shared preset repository behind the preset API.
+
+Tutu.py (preset management) and TutuPromptMaster.py (template lookups) both
+read presets through one store returned by get_preset_store():
+
+- PresetStore (default) keeps presets.json parsed in memory, indexed by id
+  and name per category, and re-reads it only when its mtime/size changes.
+- SQLitePresetStore keeps presets in presets.db with indexed lookups,
+  full-text search and transactional updates, for large template libraries
+  shared by several ComfyUI workers. It is used when presets.db exists or
+  TUTU_PRESET_BACKEND=sqlite is set, and imports presets.json once on
+  creation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .file_utils import file_signature, atomic_write_json, file_lock, update_json_file
+
+DEFAULT_PRESETS = {"gemini": []}
+
+
+class PresetIndex(NamedTuple):
+    signature: Optional[Tuple[int, int]]
+    version: int
+    data: Dict[str, list]
+    by_id: Dict[str, Dict[str, dict]]
+    by_name: Dict[str, Dict[str, dict]]
+
+
+def _build_index(signature, version, data):
+    by_id = {}
+    by_name = {}
+    for category, presets in data.items():
+        if not isinstance(presets, list):
+            continue
+        ids = by_id.setdefault(category, {})
+        names = by_name.setdefault(category, {})
+        for preset in presets:
+            # 与原来的线性查找一致：同名/同ID时以第一个为准
+            ids.setdefault(preset.get("id"), preset)
+            names.setdefault(preset.get("name"), preset)
+    return PresetIndex(signature, version, data, by_id, by_name)
+
+
+class PresetStore:
+    """presets.json 的共享索引，文件变化时自动重新加载"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._index = None
+        self._version = 0
+
+    def _current(self) -> PresetIndex:
+        index = self._index
+        if index is not None and index.signature == file_signature(self.path):
+            return index
+
+        with self._lock:
+            signature = file_signature(self.path)
+            index = self._index
+            if index is not None and index.signature == signature:
+                return index
+
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {category: [] for category in DEFAULT_PRESETS}
+            except json.JSONDecodeError:
+                print("[Tutu] 预设文件格式错误，使用默认配置")
+                data = {category: [] for category in DEFAULT_PRESETS}
+
+            self._version += 1
+            self._index = _build_index(signature, self._version, data)
+            return self._index
+
+    @property
+    def version(self) -> int:
+        """每次重新加载或保存后递增的版本号"""
+        return self._current().version
+
+    def exists(self) -> bool:
+        """预设文件是否存在"""
+        return os.path.exists(self.path)
+
+    def data(self) -> Dict[str, list]:
+        """所有预设（共享数据，调用方不要修改）"""
+        return self._current().data
+
+    def get_presets(self, category) -> List[dict]:
+        """获取分类下的所有预设（共享数据，调用方不要修改）"""
+        return self._current().data.get(category, [])
+
+    def get_by_id(self, category, preset_id) -> Optional[dict]:
+        """根据ID获取预设"""
+        return self._current().by_id.get(category, {}).get(preset_id)
+
+    def get_by_name(self, category, name) -> Optional[dict]:
+        """根据名称获取预设"""
+        return self._current().by_name.get(category, {}).get(name)
+
+    def get_names(self, category) -> List[str]:
+        """获取分类下的所有预设名称"""
+        return [p["name"] for p in self.get_presets(category)]
+
+    def search(self, query, category=None, limit=20) -> List[dict]:
+        """在名称、描述和提示词模板中搜索（不区分大小写的子串匹配）"""
+        terms = query.lower().split()
+        results = []
+        for name, presets in self._current().data.items():
+            if category is not None and name != category:
+                continue
+            for preset in presets:
+                text = " ".join([preset.get("name", ""), preset.get("description", ""),
+                                 preset.get("config", {}).get("prompt_template", "")]).lower()
+                if all(term in text for term in terms):
+                    results.append(preset)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def _install(self, presets, signature):
+        self._version += 1
+        self._index = _build_index(signature, self._version, presets)
+
+    def save_all(self, presets):
+        """保存所有预设并直接更新索引（调用方此后不应再修改 presets）"""
+        with self._lock, file_lock(self.path):
+            atomic_write_json(self.path, presets, indent=2)
+            self._install(presets, file_signature(self.path))
+
+    def _modify(self, modify) -> bool:
+        """在文件锁内重新读取文件并修改，保留其他进程同时写入的预设"""
+        changed = False
+
+        def update(presets):
+            nonlocal changed
+            changed = modify(presets)
+            return changed
+
+        with self._lock:
+            presets, signature = update_json_file(self.path, update, DEFAULT_PRESETS, indent=2)
+            if changed:
+                self._install(presets, signature)
+            return changed
+
+    def add(self, category, preset):
+        """添加预设"""
+        def modify(presets):
+            presets.setdefault(category, []).append(preset)
+            return True
+
+        self._modify(modify)
+
+    def update(self, category, preset_id, changes) -> bool:
+        """更新预设的字段，预设不存在时返回 False"""
+        def modify(presets):
+            for preset in presets.get(category, []):
+                if preset.get("id") == preset_id:
+                    preset.update(changes)
+                    return True
+            return False
+
+        return self._modify(modify)
+
+    def delete(self, category, preset_id) -> bool:
+        """删除预设，预设不存在时返回 False"""
+        def modify(presets):
+            remaining = [p for p in presets.get(category, []) if p.get("id") != preset_id]
+            if len(remaining) == len(presets.get(category, [])):
+                return False
+            presets[category] = remaining
+            return True
+
+        return self._modify(modify)
+
+
+class SQLitePresetStore:
+    """
+    SQLite 预设库：按分类/名称/ID 建立索引，支持全文搜索和事务更新
+
+    与 PresetStore 提供相同的接口。每个线程使用独立连接，数据库使用 WAL
+    模式，多个 ComfyUI 进程可同时读写。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS presets (
+            category TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            prompt_template TEXT NOT NULL DEFAULT '',
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (category, id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_presets_name ON presets (category, name, position);
+        CREATE INDEX IF NOT EXISTS idx_presets_position ON presets (category, position);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0');
+    """
+
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS presets_fts USING fts5(
+            name, description, prompt_template, content='presets', content_rowid='rowid'
+        );
+        CREATE TRIGGER IF NOT EXISTS presets_ai AFTER INSERT ON presets BEGIN
+            INSERT INTO presets_fts (rowid, name, description, prompt_template)
+            VALUES (new.rowid, new.name, new.description, new.prompt_template);
+        END;
+        CREATE TRIGGER IF NOT EXISTS presets_ad AFTER DELETE ON presets BEGIN
+            INSERT INTO presets_fts (presets_fts, rowid, name, description, prompt_template)
+            VALUES ('delete', old.rowid, old.name, old.description, old.prompt_template);
+        END;
+        CREATE TRIGGER IF NOT EXISTS presets_au AFTER UPDATE ON presets BEGIN
+            INSERT INTO presets_fts (presets_fts, rowid, name, description, prompt_template)
+            VALUES ('delete', old.rowid, old.name, old.description, old.prompt_template);
+            INSERT INTO presets_fts (rowid, name, description, prompt_template)
+            VALUES (new.rowid, new.name, new.description, new.prompt_template);
+        END;
+    """
+
+    def __init__(self, path, import_from=None):
+        self.path = path
+        self._local = threading.local()
+        created = not os.path.exists(path)
+
+        conn = self._connect()
+        with conn:
+            conn.executescript(self.SCHEMA)
+        try:
+            with conn:
+                conn.executescript(self.FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 时退回 LIKE 搜索
+            self.has_fts = False
+
+        if created and import_from and os.path.exists(import_from):
+            try:
+                self.import_json(import_from)
+            except Exception:
+                # 删除导入失败的新数据库，下次启动时重新导入，而不是留下一个空库
+                self.close()
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.remove(path + suffix)
+                    except FileNotFoundError:
+                        pass
+                raise
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的数据库连接，之后的调用会重新连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 立即获取写锁，有行被修改时提交前递增版本号"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        changes = conn.total_changes
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        # 未修改任何行（如更新不存在的预设）时不递增，避免无谓地清空各进程的缓存
+        if conn.total_changes != changes:
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _row_values(category, preset, position):
+        return (category, preset["id"], preset["name"], preset.get("description", ""),
+                preset.get("config", {}).get("prompt_template", ""), position,
+                json.dumps(preset, ensure_ascii=False))
+
+    def _insert(self, conn, category, preset, position):
+        # 同一分类内ID重复时保留第一个，与 PresetStore 的索引行为一致
+        conn.execute(
+            "INSERT OR IGNORE INTO presets (category, id, name, description, prompt_template, position, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._row_values(category, preset, position))
+
+    @property
+    def version(self) -> int:
+        """每次写入事务提交后递增的版本号（跨进程可见）"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row["value"])
+
+    def exists(self) -> bool:
+        """预设数据库是否存在"""
+        return os.path.exists(self.path)
+
+    def data(self) -> Dict[str, list]:
+        """所有预设（每次调用都会组装新的字典）"""
+        result = {category: [] for category in DEFAULT_PRESETS}
+        rows = self._connect().execute("SELECT category, data FROM presets ORDER BY category, position")
+        for row in rows:
+            result.setdefault(row["category"], []).append(json.loads(row["data"]))
+        return result
+
+    def get_presets(self, category) -> List[dict]:
+        """获取分类下的所有预设"""
+        rows = self._connect().execute(
+            "SELECT data FROM presets WHERE category = ? ORDER BY position", (category,))
+        return [json.loads(row["data"]) for row in rows]
+
+    def get_by_id(self, category, preset_id) -> Optional[dict]:
+        """根据ID获取预设"""
+        row = self._connect().execute(
+            "SELECT data FROM presets WHERE category = ? AND id = ?", (category, preset_id)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_by_name(self, category, name) -> Optional[dict]:
+        """根据名称获取预设（同名时返回第一个）"""
+        row = self._connect().execute(
+            "SELECT data FROM presets WHERE category = ? AND name = ? ORDER BY position LIMIT 1",
+            (category, name)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_names(self, category) -> List[str]:
+        """获取分类下的所有预设名称"""
+        rows = self._connect().execute(
+            "SELECT name FROM presets WHERE category = ? ORDER BY position", (category,))
+        return [row["name"] for row in rows]
+
+    def search(self, query, category=None, limit=20) -> List[dict]:
+        """全文搜索名称、描述和提示词模板"""
+        terms = query.split()
+        if not terms:
+            return []
+        conn = self._connect()
+        if self.has_fts:
+            # 每个词按前缀匹配，词之间为 AND
+            match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+            sql = ("SELECT p.data FROM presets_fts JOIN presets p ON p.rowid = presets_fts.rowid "
+                   "WHERE presets_fts MATCH ?")
+            params = [match]
+            if category is not None:
+                sql += " AND p.category = ?"
+                params.append(category)
+            sql += " ORDER BY rank LIMIT ?"
+        else:
+            clauses = []
+            params = []
+            for term in terms:
+                clauses.append("(name LIKE ? OR description LIKE ? OR prompt_template LIKE ?)")
+                params.extend([f"%{term}%"] * 3)
+            sql = "SELECT data FROM presets WHERE " + " AND ".join(clauses)
+            if category is not None:
+                sql += " AND category = ?"
+                params.append(category)
+            sql += " ORDER BY category, position LIMIT ?"
+        params.append(limit)
+        return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def save_all(self, presets):
+        """在一个事务中替换所有预设"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM presets")
+            for category, items in presets.items():
+                for position, preset in enumerate(items):
+                    self._insert(conn, category, preset, position)
+
+    def add(self, category, preset):
+        """添加预设"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM presets WHERE category = ?", (category,)).fetchone()
+            self._insert(conn, category, preset, row[0])
+
+    def update(self, category, preset_id, changes) -> bool:
+        """在事务中更新预设的字段，预设不存在时返回 False"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT position, data FROM presets WHERE category = ? AND id = ?",
+                (category, preset_id)).fetchone()
+            if row is None:
+                return False
+            preset = json.loads(row["data"])
+            preset.update(changes)
+            values = self._row_values(category, preset, row["position"])
+            conn.execute(
+                "UPDATE presets SET name = ?, description = ?, prompt_template = ?, data = ? "
+                "WHERE category = ? AND id = ?",
+                (values[2], values[3], values[4], values[6], category, preset_id))
+            return True
+
+    def delete(self, category, preset_id) -> bool:
+        """删除预设，预设不存在时返回 False"""
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM presets WHERE category = ? AND id = ?", (category, preset_id))
+            return cursor.rowcount > 0
+
+    def import_json(self, json_path):
+        """一次性从 presets.json 导入所有预设"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            presets = json.load(f)
+        self.save_all(presets)
+        print(f"[Tutu] 已从 {os.path.basename(json_path)} 导入 {sum(len(v) for v in presets.values())} 个预设到SQLite")
+
+
+_PRESET_DIR = os.path.dirname(os.path.realpath(__file__))
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_preset_store():
+    """
+    获取插件目录下的共享预设库
+
+    presets.db 存在或设置了环境变量 TUTU_PRESET_BACKEND=sqlite 时使用
+    SQLitePresetStore（首次创建时导入 presets.json），否则使用 presets.json。
+    SQLite 预设库无法打开或导入失败时给出警告并退回 presets.json。
+    """
+    global _default_store
+
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                json_path = os.path.join(_PRESET_DIR, 'presets.json')
+                db_path = os.path.join(_PRESET_DIR, 'presets.db')
+                backend = os.environ.get("TUTU_PRESET_BACKEND", "").lower()
+                if backend == "sqlite" or (backend != "json" and os.path.exists(db_path)):
+                    reason = "TUTU_PRESET_BACKEND=sqlite" if backend == "sqlite" else "presets.db 已存在"
+                    try:
+                        _default_store = SQLitePresetStore(db_path, import_from=json_path)
+                        print(f"[Tutu] 预设存储: SQLite ({os.path.basename(db_path)}，{reason})")
+                    except Exception as e:
+                        print(f"[Tutu] ⚠️ 无法使用SQLite预设库 ({e})，退回 {os.path.basename(json_path)}")
+                if _default_store is None:
+                    _default_store = PresetStore(json_path)
+                    print(f"[Tutu] 预设存储: JSON ({os.path.basename(json_path)})")
+    return _default_store
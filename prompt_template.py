@@ -0,0 +1,114 @@
+"""
+Compiled renderers for preset prompt_template strings.
+
+A template is parsed once into literal text and named placeholders
+({prompt}, {style}, {camera}, {lighting}); "{{" and "}}" produce literal
+braces and any other braces are kept as-is. Literal text is cleaned when
+the template is compiled, so rendering is a single join and the whole
+output only needs the clean_text regexes when a value could create
+repeated commas or whitespace at a junction.
+"""
+
+import functools
+import re
+from typing import FrozenSet, Tuple
+
+PLACEHOLDERS = ("prompt", "style", "camera", "lighting")
+
+_TOKEN = re.compile(r"\{\{|\}\}|\{(" + "|".join(PLACEHOLDERS) + r")\}")
+_REPEATED_COMMAS = re.compile(r'\s*,(?:\s*,)+\s*')  # a whole run of commas in one pass
+_WHITESPACE = re.compile(r'\s+')
+_EDGE_CHARS = " ,"
+
+
+def clean_text(text: str) -> str:
+    """Collapse repeated commas and whitespace and strip the ends"""
+    cleaned = _REPEATED_COMMAS.sub(', ', text)
+    cleaned = _WHITESPACE.sub(' ', cleaned)
+    return cleaned.strip()
+
+
+def _clean_literal(text: str) -> str:
+    # Same substitutions as clean_text, but keep the edges: they join values
+    return _WHITESPACE.sub(' ', _REPEATED_COMMAS.sub(', ', text))
+
+
+def _is_clean_value(value: str) -> bool:
+    """Whether inserting value can not create anything clean_text would change"""
+    # isprintable() is False for tabs/newlines, which clean_text would replace
+    return bool(value) and value[0] not in _EDGE_CHARS and value[-1] not in _EDGE_CHARS \
+        and value.isprintable() and ",," not in value and ", ," not in value and "  " not in value
+
+
+def _join(literals, values):
+    parts = [literals[0]]
+    for value, literal in zip(values, literals[1:]):
+        parts.append(value)
+        parts.append(literal)
+    return "".join(parts)
+
+
+class CompiledTemplate:
+    """
+    A parsed prompt template
+
+    literals has one more entry than names: the output is literals[0],
+    values[names[0]], literals[1], ... Templates without {prompt} get
+    ", {prompt}" appended, matching how templates were always applied.
+    """
+
+    __slots__ = ("source", "literals", "raw_literals", "names", "placeholders")
+
+    def __init__(self, source: str):
+        self.source = source
+        literals = []
+        names = []
+        parts = []
+        position = 0
+        for match in _TOKEN.finditer(source):
+            parts.append(source[position:match.start()])
+            token = match.group(0)
+            if match.group(1):
+                literals.append("".join(parts))
+                names.append(match.group(1))
+                parts = []
+            else:
+                parts.append(token[0])
+            position = match.end()
+        parts.append(source[position:])
+        literals.append("".join(parts))
+
+        if "prompt" not in names:
+            names.append("prompt")
+            literals[-1] += ", "
+            literals.append("")
+
+        # Uncleaned copies for the fallback, so it cleans the plain substitution
+        self.raw_literals: Tuple[str, ...] = tuple(literals)
+        literals = [_clean_literal(literal) for literal in literals]
+        literals[0] = literals[0].lstrip()
+        literals[-1] = literals[-1].rstrip()
+        self.literals: Tuple[str, ...] = tuple(literals)
+        self.names: Tuple[str, ...] = tuple(names)
+        self.placeholders: FrozenSet[str] = frozenset(names)
+
+    def render(self, **values) -> str:
+        """
+        Fill the placeholders and return the cleaned prompt
+
+        Values need not be cleaned (optimize_prompt passes its prompt as
+        built); missing ones render as empty. Output equals clean_text() of the
+        plain substitution, except that an empty placeholder leaves no
+        dangling comma at either end.
+        """
+        filled = [values.get(name, "") for name in self.names]
+        if all(map(_is_clean_value, filled)):
+            return _join(self.literals, filled)
+        text = clean_text(_join(self.raw_literals, filled))
+        return text.strip(" ,") if "" in filled else text
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(source: str) -> CompiledTemplate:
+    """Parse a template once; later calls with the same text reuse it"""
+    return CompiledTemplate(source)
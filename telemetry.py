@@ -0,0 +1,312 @@
+"""
+Per-generation timing spans and on-demand profiling for the nodes.
+
+A StageTimer is created for every TutuGeminiAPI.process call. Stages are
+measured with time.perf_counter() (monotonic) and accumulate, so a stage
+that runs once per image (download, decode) reports its total. Spans nest:
+payload_build includes the image_encode and upload time spent inside it.
+Counters record sizes such as request and response bytes. A MemoryTracker
+attached to the timer samples the process RSS from a background thread
+(and at every stage boundary) until it is stopped, so the reported peak
+covers the inside of stream/decode/tensor_assembly; while tracemalloc is
+tracing (profile input, PYTHONTRACEMALLOC) it also reports the traced
+allocation deltas of the generation.
+
+Node functions decorated with @profilable run under cProfile and
+tracemalloc when their "profile" input is on or TUTU_PROFILE=1 is set; the
+.prof file and an allocation report go to ComfyUI's temp directory and
+their paths are appended to the node's report output.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import folder_paths
+except ImportError:  # 不在 ComfyUI 中运行（例如测试）
+    folder_paths = None
+
+try:
+    import psutil
+except ImportError:  # RSS 统计不可用，只报告 tracemalloc
+    psutil = None
+
+PROFILE_TOP_N = 25
+
+# 各阶段名称，按请求流程排序；结果中只包含实际执行过的阶段
+STAGES = (
+    "payload_build",    # 构建请求内容与payload（含 image_encode / upload）
+    "image_encode",     # 输入图片编码为 PNG/JPEG/WebP
+    "upload",           # APICore.ai 输入图片上传到临时托管服务
+    "connect_ttfb",     # 发送请求到收到响应头
+    "stream",           # 读取并解析响应体（SSE流或JSON）
+    "download",         # 下载生成图片的URL
+    "decode",           # base64/图片字节解码为像素
+    "tensor_assembly",  # 合并为 IMAGE batch
+)
+
+
+def response_bytes(response) -> int:
+    """Bytes read from the wire for a requests response, 0 if unknown"""
+    raw = getattr(response, "raw", None)
+    try:
+        read = raw.tell()
+        if read:
+            return read
+    except Exception:
+        pass
+    # 非流式响应已经读完，直接使用内容长度
+    content = getattr(response, "_content", None)
+    return len(content) if isinstance(content, (bytes, bytearray)) else 0
+
+
+_MB = 1024 * 1024
+RSS_SAMPLE_INTERVAL = 0.005  # 秒；一次 memory_info() 约 10µs
+
+
+def _sample_rss(tracker_ref, stopped, interval):
+    # 只持有弱引用：未调用 stop() 的 tracker 被回收后线程自行退出
+    while not stopped.wait(interval):
+        tracker = tracker_ref()
+        if tracker is None:
+            return
+        tracker.sample()
+        del tracker
+
+
+class MemoryTracker:
+    """
+    RSS and tracemalloc deltas of one generation, relative to its start
+
+    With psutil available, RSS is sampled every sample_interval seconds by
+    a daemon thread until stop(); the peak is the largest sample, so
+    allocations that live shorter than the interval can still be missed.
+    """
+
+    __slots__ = ("_process", "_lock", "_stopped", "rss_start", "rss_peak", "traced_start", "__weakref__")
+
+    def __init__(self, sample_interval=RSS_SAMPLE_INTERVAL):
+        self._process = psutil.Process() if psutil is not None else None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.rss_start = self.rss_peak = self.rss()
+        self.traced_start = None
+        if tracemalloc.is_tracing():
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self._process is not None and sample_interval:
+            threading.Thread(target=_sample_rss, args=(weakref.ref(self), self._stopped, sample_interval),
+                             name="TutuRssSampler", daemon=True).start()
+
+    def stop(self):
+        """Stop background sampling; the figures stay readable"""
+        self._stopped.set()
+
+    def rss(self) -> Optional[int]:
+        if self._process is None:
+            return None
+        try:
+            return self._process.memory_info().rss
+        except Exception:
+            return None
+
+    def sample(self):
+        """Record the current RSS; the peak is the largest sample taken"""
+        rss = self.rss()
+        if rss is not None:
+            with self._lock:
+                if self.rss_peak is None or rss > self.rss_peak:
+                    self.rss_peak = rss
+        return rss
+
+    def as_dict(self) -> dict:
+        """{"rss_start_mb", "rss_end_mb", "rss_peak_mb", "rss_peak_delta_mb", "traced_*_mb"} as available"""
+        data = {}
+        rss = self.sample()
+        if rss is not None and self.rss_start is not None:
+            data.update(
+                rss_start_mb=round(self.rss_start / _MB, 1),
+                rss_end_mb=round(rss / _MB, 1),
+                rss_peak_mb=round(self.rss_peak / _MB, 1),
+                rss_peak_delta_mb=round((self.rss_peak - self.rss_start) / _MB, 1),
+            )
+        if self.traced_start is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            data.update(
+                traced_delta_mb=round((current - self.traced_start) / _MB, 1),
+                traced_peak_delta_mb=round((peak - self.traced_start) / _MB, 1),
+            )
+        return data
+
+
+class StageTimer:
+    """Monotonic stage spans and counters for one generation"""
+
+    __slots__ = ("started", "durations", "counters", "meta", "memory")
+
+    def __init__(self, memory: Optional[MemoryTracker] = None, **meta):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.meta = meta
+        self.memory = memory
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add(stage, time.perf_counter() - start)
+            if self.memory is not None:
+                self.memory.sample()
+
+    def add(self, stage, seconds):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        """{"total_ms", "stages_ms": {stage: ms}, "counters": {...}, "memory": {...}, **meta}"""
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        stages = sorted(self.durations, key=lambda stage: order.get(stage, len(order)))
+        data = dict(
+            self.meta,
+            total_ms=round(self.elapsed() * 1000, 3),
+            stages_ms={stage: round(self.durations[stage] * 1000, 3) for stage in stages},
+            counters=dict(self.counters),
+        )
+        if self.memory is not None:
+            data["memory"] = self.memory.as_dict()
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), ensure_ascii=False)
+
+    def __str__(self):
+        # 供日志使用的单行摘要，只在日志级别启用时才会格式化
+        data = self.as_dict()
+        parts = [f"{stage}={ms:.1f}ms" for stage, ms in data["stages_ms"].items()]
+        parts += [f"{name}={value}" for name, value in data["counters"].items()]
+        memory = data.get("memory") or {}
+        if "rss_peak_mb" in memory:
+            parts.append(f"rss_peak={memory['rss_peak_mb']}MB(+{memory['rss_peak_delta_mb']})")
+        if "traced_peak_delta_mb" in memory:
+            parts.append(f"traced_peak=+{memory['traced_peak_delta_mb']}MB")
+        return f"total={data['total_ms']:.1f}ms " + " ".join(parts)
+
+
+def profile_directory() -> str:
+    """ComfyUI temp directory (tempfile's outside ComfyUI)"""
+    if folder_paths is not None:
+        directory = folder_paths.get_temp_directory()
+    else:
+        directory = tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def profiling_requested(setting=False) -> bool:
+    """Node setting (a list for INPUT_IS_LIST nodes) or the TUTU_PROFILE environment variable"""
+    if isinstance(setting, list):
+        setting = setting[0] if setting else False
+    return bool(setting) or os.environ.get("TUTU_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class ProfileSession:
+    """cProfile plus tracemalloc around one call, written out by stop()"""
+
+    def __init__(self, label, top_n=PROFILE_TOP_N, directory=None):
+        self.label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+        self.top_n = top_n
+        self.directory = directory
+        self.profiler = cProfile.Profile()
+        self._started_tracemalloc = False
+        self.prof_path: Optional[str] = None
+        self.report_path: Optional[str] = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        """Stop profiling and write <label>_<time>.prof and .txt; returns the two paths"""
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        directory = self.directory or profile_directory()
+        base = os.path.join(directory, f"tutu_profile_{self.label}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}")
+        self.prof_path = base + ".prof"
+        self.report_path = base + ".txt"
+        self.profiler.dump_stats(self.prof_path)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        stats = io.StringIO()
+        pstats.Stats(self.profiler, stream=stats).sort_stats("cumulative").print_stats(self.top_n)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            f.write(f"{self.label}: {elapsed * 1000:.1f} ms\n")
+            f.write(f"tracemalloc: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top_n} allocations by line (live at end of call):\n")
+            for stat in snapshot.statistics("lineno")[:self.top_n]:
+                f.write(f"  {stat}\n")
+            f.write(f"\nTop {self.top_n} functions by cumulative time:\n")
+            f.write(stats.getvalue())
+        return self.prof_path, self.report_path
+
+    def summary(self) -> str:
+        return f"**Profile**: {self.prof_path}\n**Allocations**: {self.report_path}"
+
+
+def profilable(label, report_index):
+    """
+    Profile a node function when its profile input or TUTU_PROFILE asks for it
+
+    The summary with the result paths is appended to the string output at
+    report_index; cached results are left untouched because a new tuple is
+    returned.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not profiling_requested(kwargs.get("profile", False)):
+                return func(self, *args, **kwargs)
+            session = ProfileSession(label)
+            session.start()
+            try:
+                result = func(self, *args, **kwargs)
+            finally:
+                session.stop()
+            print(f"[Tutu] 性能分析结果: {session.prof_path}")
+            outputs = list(result)
+            outputs[report_index] = f"{outputs[report_index]}\n\n{session.summary()}"
+            return tuple(outputs)
+        return wrapper
+    return decorate
@@ -83,7 +83,7 @@ class IntegrationTestSuite:
             print(f"[测试生成] 提示词: {prompt}")
 
             # 执行生成
-            result_tensor, response_text, image_url = self.api_instance.process(
+            result_tensor, response_text, image_url, timings = self.api_instance.process(
                 prompt=prompt,
                 api_provider=provider,
                 model=model,
@@ -272,7 +272,7 @@ class IntegrationTestSuite:
             test_image1 = torch.rand(1, 512, 512, 3)  # 随机测试图像
             test_image2 = torch.rand(1, 512, 512, 3)  # 随机测试图像
 
-            result_tensor, response_text, image_url = self.api_instance.process(
+            result_tensor, response_text, image_url, timings = self.api_instance.process(
                 prompt="将第一张图片的风格应用到第二张图片上",
                 api_provider="APICore.ai",
                 model="[APICore] gemini-2.5-flash-image",
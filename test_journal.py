@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+请求日志 (journal.py / analyze_journal.py) 测试
+
+验证后台写入、按大小轮转、记录中不含敏感字段以及百分位统计
+"""
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+os.environ["TUTU_JOURNAL"] = "off"  # 测试不写入默认日志文件
+journal = load_package_module("journal")
+telemetry = load_package_module("telemetry")
+analyze_journal = load_package_module("analyze_journal")
+
+
+def _timings(provider="OpenRouter", model="m", total_stage=0.1, error_class=None):
+    timings = telemetry.StageTimer(request_id=journal.new_request_id(), provider=provider, model=model,
+                                   images_requested=2)
+    timings.add("stream", total_stage)
+    timings.count("request_bytes", 10)
+    timings.meta["http_status"] = 200
+    timings.meta["images_returned"] = 2
+    timings.meta["error"] = "HTTP 401 Error: invalid key sk-secret"
+    if error_class:
+        timings.meta["error_class"] = error_class
+    return timings
+
+
+def test_record_fields():
+    """测试记录只包含白名单字段"""
+    print("=== 测试记录内容 ===")
+    record = journal.make_record(_timings())
+    assert set(record) == {"ts", "request_id", "provider", "model", "images_requested", "images_returned",
+                           "http_status", "error_class", "total_ms", "stages_ms", "request_bytes",
+                           "response_bytes", "download_bytes", "retries", "low_memory", "memory"}
+    assert "sk-secret" not in json.dumps(record)
+    assert record["stages_ms"]["stream"] == 100.0
+    print("✓ 不包含错误原文等非白名单字段")
+
+
+def test_background_writer_and_rotation():
+    """测试后台写入与按大小轮转"""
+    print("\n=== 测试写入与轮转 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "logs", "journal.jsonl")
+        writer = journal.RequestJournal(path, max_bytes=2000, backups=2)
+        for _ in range(40):
+            writer.write(journal.make_record(_timings()))
+        writer.close()
+
+        files = sorted(os.listdir(os.path.dirname(path)))
+        assert files == ["journal.jsonl", "journal.jsonl.1", "journal.jsonl.2"], files
+        assert all(os.path.getsize(os.path.join(temp_dir, "logs", name)) <= 2000 for name in files)
+        records = list(analyze_journal.read_records(analyze_journal.journal_files(path)))
+        assert records and all(record["provider"] == "OpenRouter" for record in records)
+        assert analyze_journal.journal_files(path)[-1] == path
+        print(f"✓ 轮转后保留 {len(files)} 个文件、{len(records)} 条记录")
+
+        # flush 之后记录已写入磁盘
+        writer.write(journal.make_record(_timings(provider="APICore.ai")))
+        writer.flush()
+        with open(path, "r", encoding="utf-8") as f:
+            assert json.loads(f.read().splitlines()[-1])["provider"] == "APICore.ai"
+        writer.close()
+        print("✓ flush 等待写入完成")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_percentiles():
+    """测试按 provider/model 的百分位统计"""
+    print("\n=== 测试百分位统计 ===")
+    assert analyze_journal.percentile([], 50) is None
+    assert analyze_journal.percentile([5.0], 99) == 5.0
+    assert analyze_journal.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+
+    records = [journal.make_record(_timings(total_stage=ms / 1000)) for ms in range(1, 101)]
+    records.append(journal.make_record(_timings(provider="APICore.ai", error_class="timeout_error")))
+    summary = analyze_journal.summarize(records, stage="stream")
+    openrouter = summary[("OpenRouter", "m")]
+    assert openrouter["requests"] == 100 and openrouter["errors"] == 0
+    assert abs(openrouter["p50"] - 50.5) < 1e-6
+    assert abs(openrouter["p99"] - 99.01) < 1e-6
+    assert summary[("APICore.ai", "m")]["errors"] == 1
+    print("✓ p50/p95/p99 与错误数正确")
+
+
+def main():
+    """运行所有测试"""
+    test_record_fields()
+    test_background_writer_and_rotation()
+    test_percentiles()
+    print("\n🎉 所有请求日志测试通过")
+
+
+if __name__ == "__main__":
+    main()
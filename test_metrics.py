@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+指标 (metrics.py) 测试
+
+验证多线程计数、直方图分桶、生成记录以及 Prometheus 文本格式输出
+"""
+import importlib
+import os
+import sys
+import threading
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+metrics = load_package_module("metrics")
+telemetry = load_package_module("telemetry")
+
+
+def test_counter_across_threads():
+    """测试各线程分片的计数在导出时正确合并"""
+    print("=== 测试多线程计数 ===")
+    registry = metrics.Registry()
+    counter = registry.counter("test_calls_total", "Calls", ("provider",))
+
+    def worker():
+        for _ in range(1000):
+            counter.inc("OpenRouter")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("APICore.ai", amount=5)
+
+    assert counter.values() == {("OpenRouter",): 8000, ("APICore.ai",): 5}
+    assert 'test_calls_total{provider="OpenRouter"} 8000' in registry.render()
+    # 同名指标重复注册时返回已有实例
+    assert registry.counter("test_calls_total", "Calls", ("provider",)) is counter
+    print("✓ 8个线程共8000次计数无丢失")
+
+
+def test_histogram_buckets():
+    """测试直方图累计分桶、总和与计数"""
+    print("\n=== 测试直方图 ===")
+    registry = metrics.Registry()
+    histogram = registry.histogram("test_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "decode")
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="decode",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="decode",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{stage="decode",le="+Inf"} 4' in text
+    assert 'test_seconds_count{stage="decode"} 4' in text
+    assert 'test_seconds_sum{stage="decode"} 4.25' in text
+    print("✓ 分桶为累计计数")
+
+
+def test_record_generation_and_caches():
+    """测试从阶段耗时记录生成指标以及缓存命中率"""
+    print("\n=== 测试生成记录与缓存统计 ===")
+    timings = telemetry.StageTimer(provider="ai.comfly.chat", model='model "x"', images_requested=4)
+    timings.add("stream", 2.0)
+    timings.count("request_bytes", 300)
+    timings.count("response_bytes", 1000)
+    timings.count("download_bytes", 24)
+    timings.meta["images_returned"] = 3
+    timings.meta["error_class"] = "timeout_error"
+    metrics.record_generation(timings)
+
+    metrics.registry.register_cache("test_cache", lambda: {"hits": 3, "misses": 1, "size": 2, "maxsize": 8})
+    metrics.registry.register_cache("broken_cache", lambda: 1 / 0)
+    text = metrics.registry.render()
+    assert 'tutu_requests_total{provider="ai.comfly.chat",model="model \\"x\\""} 1' in text
+    assert 'tutu_errors_total{provider="ai.comfly.chat",category="timeout_error"} 1' in text
+    assert 'tutu_bytes_total{provider="ai.comfly.chat",direction="in"} 1024' in text
+    assert 'tutu_bytes_total{provider="ai.comfly.chat",direction="out"} 300' in text
+    assert 'tutu_images_requested_total{provider="ai.comfly.chat"} 4' in text
+    assert 'tutu_images_produced_total{provider="ai.comfly.chat"} 3' in text
+    assert 'tutu_stage_duration_seconds_count{provider="ai.comfly.chat",stage="stream"} 1' in text
+    assert 'tutu_cache_hit_ratio{cache="test_cache"} 0.75' in text
+    assert 'broken_cache' not in text
+    print("✓ 请求、错误、字节数、图片数与缓存命中率均已导出")
+
+
+def main():
+    """运行所有测试"""
+    test_counter_across_threads()
+    test_histogram_buckets()
+    test_record_generation_and_caches()
+    print("\n🎉 所有指标测试通过")
+
+
+if __name__ == "__main__":
+    main()
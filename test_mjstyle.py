@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+风格目录接口 (mjstyle.py) 测试
+
+验证目录加载、合并索引、ETag/gzip 协商、文件变化后的重新加载以及风格搜索
+"""
+import gzip
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+mjstyle = load_package_module("mjstyle")
+
+
+def test_bundled_catalogs():
+    """测试加载 docs/mjstyle 中的目录并生成合并索引"""
+    print("=== 测试目录加载 ===")
+    catalog = mjstyle.StyleCatalog()
+    index = json.loads(catalog.index_body().body)
+    assert set(index["names"]) >= {"mj_art", "mj_hd"}
+    with open(os.path.join(mjstyle.MJSTYLE_DIR, "mj_art.json"), 'r', encoding='utf-8') as f:
+        assert index["catalogs"]["mj_art"] == json.load(f)
+
+    entry = catalog.catalog_body("mj_hd")
+    assert gzip.decompress(entry.gzip_body) == entry.body
+    assert catalog.catalog_body("missing") is None
+    assert catalog.snapshot() is catalog.snapshot()
+    print("✓ 合并索引包含所有目录，gzip 内容一致")
+
+
+def test_conditional_and_encoding():
+    """测试 ETag 条件请求与 gzip 协商"""
+    print("\n=== 测试 ETag 与 gzip ===")
+    entry = mjstyle.StyleCatalog().index_body()
+
+    status, headers, body = mjstyle.catalog_response(entry, accept_encoding="gzip, deflate, br")
+    assert status == 200 and body == entry.gzip_body
+    assert headers["Content-Encoding"] == "gzip" and headers["ETag"] == entry.gzip_etag
+    assert "max-age" in headers["Cache-Control"]
+
+    status, headers, body = mjstyle.catalog_response(entry, accept_encoding="gzip;q=0")
+    assert status == 200 and body == entry.body and "Content-Encoding" not in headers
+
+    status, _, body = mjstyle.catalog_response(entry, if_none_match=entry.etag)
+    assert status == 304 and body == b""
+    status, _, _ = mjstyle.catalog_response(entry, if_none_match=f'"other", W/{entry.gzip_etag}',
+                                            accept_encoding="gzip")
+    assert status == 304
+    # 不同编码的 ETag 不同，不会互相命中
+    status, _, _ = mjstyle.catalog_response(entry, if_none_match=entry.etag, accept_encoding="gzip")
+    assert status == 200
+    print("✓ 条件请求返回304，按 Accept-Encoding 选择 gzip")
+
+
+def test_reload_on_change():
+    """测试目录文件变化后重新加载，ETag 随内容变化"""
+    print("\n=== 测试重新加载 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "custom.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{"name": "A", "prompt": "a", "negative_prompt": ""}], f)
+        catalog = mjstyle.StyleCatalog(temp_dir)
+        etag = catalog.catalog_body("custom").etag
+
+        time.sleep(0.01)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{"name": "B", "prompt": "b", "negative_prompt": ""}], f)
+        assert catalog.catalog_body("custom").etag != etag
+        assert json.loads(catalog.catalog_body("custom").body)[0]["name"] == "B"
+        print("✓ 文件修改后内容与ETag更新")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_search_index():
+    """测试前缀搜索、词索引、排序与分页"""
+    print("\n=== 测试风格搜索 ===")
+    index = mjstyle.StyleSearchIndex({
+        "art": [
+            {"name": "Oil painting", "prompt": "classical oil on canvas"},
+            {"name": "Watercolor", "prompt": "soft watercolor painting"},
+            {"name": "Painterly portrait", "prompt": "portrait"},
+        ],
+        "hd": [{"name": "Cinematic", "prompt": "cinematic film still, oil lamp"}],
+    })
+    names = lambda page: [style["name"] for _, style in page]
+
+    # 名称整词命中优先于名称前缀，再其次是仅提示词命中，同分保持原顺序
+    total, page = index.search("paint")
+    assert total == 3 and names(page) == ["Oil painting", "Painterly portrait", "Watercolor"]
+    total, page = index.search("painting")
+    assert names(page) == ["Oil painting", "Watercolor"]
+
+    # 已输入完整的词走倒排索引，最后一个词按前缀匹配
+    assert names(index.search("oil c")[1]) == ["Oil painting", "Cinematic"]
+    assert index.search("oi painting")[0] == 0
+    assert names(index.search("oil", catalog="hd")[1]) == ["Cinematic"]
+
+    total, page = index.search("", offset=1, limit=2)
+    assert total == 4 and names(page) == ["Watercolor", "Painterly portrait"]
+
+    result = mjstyle.StyleCatalog().search("conceptual", limit=1000)
+    assert result["limit"] == mjstyle.SEARCH_MAX_LIMIT
+    assert result["results"][0]["name"] == "Conceptual art" and result["results"][0]["catalog"] == "mj_art"
+    print("✓ 搜索结果、排序与分页正确")
+
+
+def main():
+    """运行所有测试"""
+    test_bundled_catalogs()
+    test_conditional_and_encoding()
+    test_reload_on_change()
+    test_search_index()
+    print("\n🎉 所有风格目录测试通过")
+
+
+if __name__ == "__main__":
+    main()
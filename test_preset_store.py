@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+预设库 (preset_store.py) 测试
+
+验证索引查找、文件变化后自动重新加载、保存后的索引更新、并发写入以及SQLite后端
+"""
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+preset_store = load_package_module("preset_store")
+
+
+def _write_presets(path, presets):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(presets, f)
+
+
+def _make_store(presets):
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "presets.json")
+    _write_presets(path, presets)
+    return preset_store.PresetStore(path), temp_dir
+
+
+def test_indexed_lookups():
+    """测试按ID和名称的索引查找"""
+    print("=== 测试索引查找 ===")
+    store, temp_dir = _make_store({"gemini": [
+        {"id": "a", "name": "Alpha", "config": {"prompt_template": "A {prompt}"}},
+        {"id": "b", "name": "Beta", "config": {"prompt_template": "B {prompt}"}},
+        {"id": "c", "name": "Alpha", "config": {"prompt_template": "duplicate"}},
+    ]})
+    try:
+        assert store.get_by_id("gemini", "b")["name"] == "Beta"
+        # 同名时与原线性查找一致，返回第一个
+        assert store.get_by_name("gemini", "Alpha")["id"] == "a"
+        assert store.get_by_name("gemini", "Missing") is None
+        assert store.get_by_id("other", "a") is None
+        assert store.get_names("gemini") == ["Alpha", "Beta", "Alpha"]
+        print("✓ 索引查找结果正确")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_reload_on_file_change():
+    """测试文件变化后重新加载，未变化时不重新解析"""
+    print("\n=== 测试文件变化检测 ===")
+    store, temp_dir = _make_store({"gemini": [{"id": "a", "name": "Alpha"}]})
+    try:
+        version = store.version
+        assert store.version == version
+
+        time.sleep(0.01)
+        _write_presets(store.path, {"gemini": [{"id": "a", "name": "Alpha"}, {"id": "b", "name": "Beta"}]})
+        assert store.get_by_name("gemini", "Beta") is not None
+        assert store.version > version
+        print("✓ 外部修改后自动重新加载")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_save_all_updates_index():
+    """测试保存后索引立即更新且文件内容正确"""
+    print("\n=== 测试保存 ===")
+    store, temp_dir = _make_store({"gemini": []})
+    try:
+        version = store.version
+        store.save_all({"gemini": [{"id": "x", "name": "Saved"}]})
+        assert store.get_by_id("gemini", "x")["name"] == "Saved"
+        assert store.version == version + 1
+
+        with open(store.path, 'r', encoding='utf-8') as f:
+            assert json.load(f)["gemini"][0]["id"] == "x"
+        assert [name for name in os.listdir(temp_dir) if name.endswith(".tmp")] == []
+        print("✓ 保存后索引与文件一致")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_missing_and_invalid_file():
+    """测试文件不存在或格式错误时返回默认结构"""
+    print("\n=== 测试缺失/损坏文件 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = preset_store.PresetStore(os.path.join(temp_dir, "presets.json"))
+        assert not store.exists()
+        assert store.data() == {"gemini": []}
+
+        with open(store.path, 'w', encoding='utf-8') as f:
+            f.write("{not json")
+        assert store.get_presets("gemini") == []
+        print("✓ 返回默认结构")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_granular_updates_both_backends():
+    """测试两种后端的添加/更新/删除接口一致"""
+    print("\n=== 测试添加/更新/删除 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        stores = [
+            preset_store.PresetStore(os.path.join(temp_dir, "presets.json")),
+            preset_store.SQLitePresetStore(os.path.join(temp_dir, "presets.db")),
+        ]
+        for store in stores:
+            store.add("gemini", {"id": "p1", "name": "One", "config": {"prompt_template": "a {prompt}"}})
+            store.add("gemini", {"id": "p2", "name": "Two", "config": {"prompt_template": "b {prompt}"}})
+            assert store.get_names("gemini") == ["One", "Two"]
+
+            assert store.update("gemini", "p1", {"name": "Uno"})
+            assert not store.update("gemini", "missing", {"name": "x"})
+            assert store.get_by_name("gemini", "Uno")["id"] == "p1"
+            assert store.get_by_name("gemini", "One") is None
+
+            assert store.delete("gemini", "p2")
+            assert not store.delete("gemini", "p2")
+            assert store.data()["gemini"] == [store.get_by_id("gemini", "p1")]
+            print(f"✓ {type(store).__name__} 接口行为一致")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sqlite_import_and_search():
+    """测试从 presets.json 一次性导入以及全文搜索"""
+    print("\n=== 测试SQLite导入与搜索 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(temp_dir, "presets.json")
+        _write_presets(json_path, {"gemini": [
+            {"id": "portrait", "name": "Professional Portrait", "description": "Studio portrait",
+             "config": {"prompt_template": "headshot photograph of {prompt}, studio lighting"}},
+            {"id": "landscape", "name": "Cinematic Landscape", "description": "Epic landscape",
+             "config": {"prompt_template": "landscape photograph of {prompt}, golden hour"}},
+        ]})
+        db_path = os.path.join(temp_dir, "presets.db")
+        store = preset_store.SQLitePresetStore(db_path, import_from=json_path)
+        assert store.get_names("gemini") == ["Professional Portrait", "Cinematic Landscape"]
+
+        assert [p["id"] for p in store.search("studio")] == ["portrait"]
+        # 前缀匹配 photograph
+        assert sorted(p["id"] for p in store.search("photo")) == ["landscape", "portrait"]
+        assert [p["id"] for p in store.search("golden land")] == ["landscape"]
+        assert store.search("studio", category="other") == []
+
+        # 已存在的数据库不会重复导入
+        store.delete("gemini", "landscape")
+        reopened = preset_store.SQLitePresetStore(db_path, import_from=json_path)
+        assert reopened.get_names("gemini") == ["Professional Portrait"]
+        assert reopened.search("golden") == []
+        print("✓ 导入、搜索与更新后的全文索引正确")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sqlite_transaction_rollback():
+    """测试写入失败时事务回滚"""
+    print("\n=== 测试SQLite事务回滚 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = preset_store.SQLitePresetStore(os.path.join(temp_dir, "presets.db"))
+        store.save_all({"gemini": [{"id": "a", "name": "A"}]})
+        version = store.version
+        try:
+            store.save_all({"gemini": [{"id": "b", "name": "B"}, {"id": "c"}]})
+        except KeyError:
+            pass
+        assert store.get_names("gemini") == ["A"]
+        assert store.version == version
+        print("✓ 失败的写入不会留下部分数据")
+
+        # 没有修改任何行的写入不递增版本号
+        assert store.update("gemini", "missing", {"name": "X"}) is False
+        assert store.delete("gemini", "missing") is False
+        assert store.version == version
+        assert store.delete("gemini", "a") is True
+        assert store.version == version + 1
+        print("✓ 空操作不递增版本号")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_get_preset_store_falls_back_to_json():
+    """测试SQLite预设库导入失败时退回JSON，且只尝试一次"""
+    print("\n=== 测试预设库后端选择 ===")
+    temp_dir = tempfile.mkdtemp()
+    original_dir = preset_store._PRESET_DIR
+    original_backend = os.environ.pop("TUTU_PRESET_BACKEND", None)
+    preset_store._PRESET_DIR = temp_dir
+    preset_store._default_store = None
+    try:
+        json_path = os.path.join(temp_dir, "presets.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            f.write("{not json")
+        os.environ["TUTU_PRESET_BACKEND"] = "sqlite"
+        store = preset_store.get_preset_store()
+        assert isinstance(store, preset_store.PresetStore)
+        assert preset_store.get_preset_store() is store
+        # 导入失败的新数据库被删除，下次启动时会重新导入
+        assert not os.path.exists(os.path.join(temp_dir, "presets.db"))
+        print("✓ 导入失败时退回 presets.json")
+
+        _write_presets(json_path, {"gemini": [{"id": "a", "name": "A"}]})
+        preset_store._default_store = None
+        store = preset_store.get_preset_store()
+        assert isinstance(store, preset_store.SQLitePresetStore)
+        assert store.get_names("gemini") == ["A"]
+        store.close()
+        print("✓ 修复后重新导入到SQLite")
+    finally:
+        preset_store._PRESET_DIR = original_dir
+        preset_store._default_store = None
+        os.environ.pop("TUTU_PRESET_BACKEND", None)
+        if original_backend is not None:
+            os.environ["TUTU_PRESET_BACKEND"] = original_backend
+        shutil.rmtree(temp_dir)
+
+
+def test_concurrent_writers_keep_all_updates():
+    """测试多个写入方（模拟多个进程）同时添加预设时不会丢失更新"""
+    print("\n=== 测试并发写入 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "presets.json")
+        _write_presets(path, {"gemini": []})
+
+        def writer(worker):
+            # 每个写入方使用独立的 store，只能依靠文件锁互斥
+            store = preset_store.PresetStore(path)
+            for i in range(10):
+                store.add("gemini", {"id": f"{worker}-{i}", "name": f"{worker}-{i}"})
+
+        threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(path, 'r', encoding='utf-8') as f:
+            assert len(json.load(f)["gemini"]) == 40
+        assert preset_store.PresetStore(path).get_by_id("gemini", "3-9") is not None
+        print("✓ 40次并发添加全部保留")
+
+        file_utils = load_package_module("file_utils")
+        with file_utils.file_lock(path):
+            try:
+                with file_utils.file_lock(path, timeout=0.05):
+                    pass
+            except TimeoutError:
+                print("✓ 锁被占用时超时报错")
+            else:
+                raise AssertionError("文件锁应当互斥")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    """运行所有测试"""
+    test_indexed_lookups()
+    test_reload_on_file_change()
+    test_save_all_updates_index()
+    test_missing_and_invalid_file()
+    test_granular_updates_both_backends()
+    test_sqlite_import_and_search()
+    test_sqlite_transaction_rollback()
+    test_get_preset_store_falls_back_to_json()
+    test_concurrent_writers_keep_all_updates()
+    print("\n🎉 所有预设库测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Prompt Master (TutuPromptMaster.py) 测试
+
+验证关键词匹配器的整词匹配、评分、场景/艺术风格检测、共享的优化词表、批量处理、变体生成以及输出缓存
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+prompt_master = load_package_module("TutuPromptMaster")
+preset_store = load_package_module("preset_store")
+
+
+def test_whole_word_matching():
+    """测试关键词按整词匹配，不再匹配单词内部"""
+    print("=== 测试整词匹配 ===")
+    matcher = prompt_master.KeywordMatcher({"vehicle": ["car", "watch"], "home": ["carpet"]})
+    assert matcher.scores("a red carpet") == {"home": 1}
+    assert matcher.scores("Cars and WATCHES") == {"vehicle": 2}
+    assert matcher.scores("she cares, he watched") == {}
+    print("✓ carpet 不再匹配 car，复数形式仍可匹配")
+
+
+def test_scores_count_distinct_keywords():
+    """测试评分为各分类命中的不同关键词数量"""
+    print("\n=== 测试分类评分 ===")
+    scores = prompt_master.SCENE_MATCHER.scores("a woman in a forest, forest mountains at sunset")
+    assert scores == {"Professional Portrait": 1, "Cinematic Landscape": 3}
+
+    # 长关键词同时计入其包含的短关键词
+    scores = prompt_master.SCENE_MATCHER.scores("character design")
+    assert scores == {"Professional Portrait": 1, "Anime Style Art": 1}
+    print("✓ 一次扫描得到所有分类的评分")
+
+
+def test_detect_scene_type():
+    """测试场景检测结果"""
+    print("\n=== 测试场景检测 ===")
+    detect = prompt_master.detect_scene_type
+    assert detect("a woman standing on a beach at sunset") == "Cinematic Landscape"
+    assert detect("a luxury watch on marble") == "Product Photography"
+    assert detect("a dragon guarding a castle") == "Digital Concept Art"
+    assert detect("a persian carpet") is None
+    # 同分时取表中靠前的分类
+    assert detect("character design") == "Professional Portrait"
+    print("✓ 场景检测结果正确")
+
+
+def test_detect_art_style():
+    """测试艺术风格检测的优先级"""
+    print("\n=== 测试艺术风格检测 ===")
+    optimizer = prompt_master.PromptOptimizer()
+    assert optimizer.detect_art_style("an oil painting of a harbor") == "painting"
+    assert optimizer.detect_art_style("oil painting", "Professional Portrait") == "photography"
+    assert optimizer.detect_art_style("a 3d render") == "digital_art"
+    assert optimizer.detect_art_style("a boiling kettle") == "premium"
+    assert optimizer.detect_art_style("Character-Design sheet, cartoonish") == "illustration"
+    assert optimizer.detect_art_style("photoshop brushes") == "painting"
+    print("✓ 按原有优先级返回风格")
+
+    # first_match 与按关键词集合取最先分类的结果一致
+    matcher = prompt_master.ART_STYLE_MATCHER
+    for text in ("concept  art", "studios and paints", "oil_paint", "oil—painting", "éoil paints", "3d", "x3d cgix", ""):
+        indexes = [i for keyword in matcher.keywords(text) for i in matcher._categories_by_keyword[keyword]]
+        assert matcher.first_match(text) == (matcher.categories[min(indexes)] if indexes else None), text
+        assert set(matcher.scores(text)) == {matcher.categories[i] for i in indexes}, text
+    print("✓ first_match 与评分来自同一次匹配，结果一致")
+
+
+def test_shared_frozen_tables():
+    """测试优化词表只构建一次且不可修改"""
+    print("\n=== 测试共享只读词表 ===")
+    first = prompt_master.PromptOptimizer("English Optimization")
+    second = prompt_master.PromptOptimizer("Chinese Optimization")
+    assert first.quality_terms is second.quality_terms is prompt_master.QUALITY_TERMS
+    assert isinstance(prompt_master.QUALITY_TERMS["English"]["basic"], tuple)
+    try:
+        prompt_master.CAMERA_MAP["Fisheye"] = "fisheye"
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("词表应当只读")
+
+    prompt, log = second.add_camera_control("一只猫", "Macro Shot")
+    assert prompt == "一只猫, 微距摄影" and len(log) == 1
+    prompt, _ = first.add_lighting_control("a cat, golden hour lighting", "Golden Hour")
+    assert prompt == "a cat, golden hour lighting"
+    print("✓ 所有实例共享同一份只读词表")
+
+
+def test_split_ideas():
+    """测试批量输入按行/JSONL拆分"""
+    print("\n=== 测试批量输入拆分 ===")
+    texts = ['a cat\n\n{"idea": "a dog"}\n"a bird"\n{"prompt": "a fish"}\n{broken', "a horse"]
+    assert prompt_master.split_ideas(texts) == ["a cat", "a dog", "a bird", "a fish", "{broken", "a horse"]
+    print("✓ 纯文本、JSON字符串和JSONL对象均可识别")
+
+
+def test_batch_matches_single():
+    """测试批量节点结果与逐条处理一致"""
+    print("\n=== 测试批量处理 ===")
+    single = prompt_master.TutuNanaBananaPromptMaster()
+    batch = prompt_master.TutuNanaBananaPromptMasterBatch()
+    ideas = ["a woman on a beach at sunset", "a luxury watch", "a persian carpet"]
+
+    prompts, templates, report = batch.process_batch(
+        ["Custom Input"], ["\n".join(ideas)], ["English Optimization"], ["Premium Quality"],
+        ["Macro Shot"], ["Soft Lighting"], [True], [""]
+    )
+    assert len(prompts) == len(templates) == 3
+    for idea, prompt, template in zip(ideas, prompts, templates):
+        expected = single.process_prompt("Custom Input", idea, "English Optimization", "Premium Quality",
+                                         "Macro Shot", "Soft Lighting", True, "")
+        assert (prompt, template) == expected[:2]
+    assert "Ideas processed: 3" in report
+    assert batch.process_batch(["Custom Input"], ["  \n"], ["English Optimization"], ["Basic Detail"])[0] == []
+    print("✓ 批量结果与逐条处理一致")
+
+
+def test_variant_generator():
+    """测试组合变体生成：惰性、采样与去重"""
+    print("\n=== 测试变体生成 ===")
+    cameras = ["Auto Select", "Macro Shot", "Close-up Shot"]
+    lightings = ["Auto Select", "Soft Lighting"]
+    levels = ["Basic Detail", "Professional Detail"]
+    variants = list(prompt_master.iter_prompt_variants(
+        "a cat", ["Custom Input"], cameras, lightings, levels, dedupe=False))
+    assert len(variants) == 12
+    assert variants[1][1] == "Custom Input | Auto Select | Auto Select | Professional Detail"
+    assert len({prompt for prompt, _ in variants}) == 12
+
+    # 随机采样覆盖同样的组合，只是顺序不同
+    shuffled = list(prompt_master.iter_prompt_variants(
+        "a cat", ["Custom Input"], cameras, lightings, levels, shuffle=True, seed=3))
+    assert sorted(shuffled) == sorted(variants)
+
+    # 未使用的组合不会被计算
+    huge = prompt_master.iter_prompt_variants("a cat", ["Custom Input"] * 1000, cameras * 1000, lightings, levels)
+    assert next(huge)[0] == variants[0][0]
+
+    generator = prompt_master.TutuPromptVariantGenerator()
+    prompts, labels, report = generator.generate_variants(
+        "a cat", "Custom Input\nCustom Input", "Macro Shot, Fisheye", "all", "Basic Detail", "English Optimization", 4)
+    assert len(prompts) == len(labels) == 4
+    assert "Combinations: 6" in report
+
+    # 组合数超出上限时 0（全部）被拒绝，输出数量不超过上限
+    max_variants = prompt_master.MAX_VARIANTS
+    prompt_master.MAX_VARIANTS = 5
+    try:
+        prompts, labels, report = generator.generate_variants(
+            "a cat", "Custom Input", "all", "all", "Basic Detail", "English Optimization", 0)
+        assert prompts == [] and report.startswith("Error:")
+        prompts, _, _ = generator.generate_variants(
+            "a cat", "Custom Input", "all", "all", "Basic Detail", "English Optimization", 100, dedupe=False)
+        assert len(prompts) == 5
+    finally:
+        prompt_master.MAX_VARIANTS = max_variants
+
+    # 去重只记住最近的提示词
+    repeated = list(prompt_master.iter_prompt_variants(
+        "a cat", ["Custom Input"] * 3, cameras, ["Auto Select"], ["Basic Detail"], dedupe_window=2))
+    assert len(repeated) == 9
+    repeated = list(prompt_master.iter_prompt_variants(
+        "a cat", ["Custom Input"] * 3, cameras, ["Auto Select"], ["Basic Detail"], dedupe_window=3))
+    assert len(repeated) == 3
+    print("✓ 组合按需生成，支持采样与去重")
+
+
+def test_prompt_cache():
+    """测试输出缓存的命中统计以及预设变化后的失效"""
+    print("\n=== 测试输出缓存 ===")
+    temp_dir = tempfile.mkdtemp()
+    original_get_store = prompt_master.get_preset_store
+    store = preset_store.PresetStore(os.path.join(temp_dir, "presets.json"))
+    store.save_all({"gemini": [{"id": "t", "name": "Poster", "config": {"prompt_template": "poster of {prompt}"}}]})
+    prompt_master.get_preset_store = lambda: store
+    prompt_master.prompt_cache.clear()
+    try:
+        node = prompt_master.TutuNanaBananaPromptMaster()
+        args = ("Poster", "a cat", "English Optimization", "Basic Detail")
+        first = node.process_prompt(*args)
+        second = node.process_prompt(*args)
+        assert second[:2] == first[:2]
+        assert prompt_master.prompt_cache.stats()["hits"] == 1
+        # 缓存中不含处理时间，每次返回时重新添加
+        assert second[2].count("🕒 Processing time: ") == 1
+        assert "Processing time" not in next(iter(prompt_master.prompt_cache._data.values()))[2]
+
+        store.update("gemini", "t", {"config": {"prompt_template": "flyer of {prompt}"}})
+        updated = node.process_prompt(*args)
+        assert updated[0].startswith("flyer of a cat")
+        assert prompt_master.prompt_cache.stats()["misses"] == 2
+
+        # 模板中的 {camera} 占位符接收镜头术语，而不是追加到提示词末尾
+        store.update("gemini", "t", {"config": {"prompt_template": "{camera} of {prompt}, {lighting}"}})
+        placed = node.process_prompt("Poster", "a cat", "English Optimization", "Basic Detail",
+                                     "Macro Shot", "Auto Select", False)
+        assert placed[0] == "macro photography of a cat"
+
+        cache = prompt_master.LRUCache(maxsize=2)
+        for key in "abc":
+            cache.put(key, key)
+        assert cache.get("a") is None and cache.get("c") == "c"
+        print("✓ 重复调用命中缓存，预设修改后重新计算")
+    finally:
+        prompt_master.get_preset_store = original_get_store
+        prompt_master.prompt_cache.clear()
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    """运行所有测试"""
+    test_whole_word_matching()
+    test_scores_count_distinct_keywords()
+    test_detect_scene_type()
+    test_detect_art_style()
+    test_shared_frozen_tables()
+    test_split_ideas()
+    test_batch_matches_single()
+    test_variant_generator()
+    test_prompt_cache()
+    print("\n🎉 所有 Prompt Master 测试通过")
+
+
+if __name__ == "__main__":
+    main()
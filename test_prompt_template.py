@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+提示词模板渲染 (prompt_template.py) 测试
+
+验证占位符、转义以及渲染结果与"替换后再清理"完全一致
+"""
+import importlib
+import os
+import random
+import sys
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+prompt_template = load_package_module("prompt_template")
+
+
+def _reference(template, values):
+    """参考实现：逐个 str.replace 后整体清理"""
+    text = template if "{prompt}" in template else f"{template}, {{prompt}}"
+    empty = False
+    for name in prompt_template.PLACEHOLDERS:
+        placeholder = f"{{{name}}}"
+        if placeholder in text:
+            empty = empty or not values.get(name)
+            text = text.replace(placeholder, values.get(name, ""))
+    # 空占位符不留下首尾多余的逗号
+    text = prompt_template.clean_text(text)
+    return text.strip(" ,") if empty else text
+
+
+def test_placeholders_and_escaping():
+    """测试命名占位符、转义和未知占位符"""
+    print("=== 测试占位符与转义 ===")
+    compiled = prompt_template.compile_template("{{literal}} {camera} shot of {prompt}, {unknown}")
+    assert compiled.placeholders == {"camera", "prompt"}
+    assert compiled.render(prompt="a cat", camera="macro") == "{literal} macro shot of a cat, {unknown}"
+
+    # 没有 {prompt} 的模板在末尾追加
+    assert prompt_template.compile_template("oil painting").render(prompt="a cat") == "oil painting, a cat"
+    assert prompt_template.compile_template("x {prompt}") is prompt_template.compile_template("x {prompt}")
+    print("✓ 占位符、转义与追加规则正确")
+
+    # 连续多个逗号一次清理完成，清理结果再次清理不变
+    assert prompt_template.clean_text("a ,,, b , ,, c") == "a, b, c"
+    assert prompt_template.compile_template("photo of {prompt}").render(prompt="cat , ,, dog") == "photo of cat, dog"
+    print("✓ 单次清理即可合并逗号")
+
+
+def test_render_matches_replace_and_clean():
+    """测试渲染结果与替换后清理完全一致，包括空值和需要清理的边界"""
+    print("\n=== 测试渲染等价性 ===")
+    rng = random.Random(0)
+    pieces = ["a", "photo", " ", "  ", ",", ", ", " ,", "\n", "{prompt}", "{style}", "{camera}", "{lighting}"]
+    values = ["", "a cat", " cat ", "cat,", ", cat", "a,, b", "a , , b", "a ,,, b", "x  y", "a\nb", "studio lighting"]
+    for _ in range(5000):
+        template = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 10)))
+        sample = {name: rng.choice(values) for name in prompt_template.PLACEHOLDERS}
+        rendered = prompt_template.compile_template(template).render(**sample)
+        assert rendered == _reference(template, sample), (template, sample)
+    print("✓ 5000个随机模板的渲染结果一致")
+
+
+def main():
+    """运行所有测试"""
+    test_placeholders_and_escaping()
+    test_render_matches_replace_and_clean()
+    print("\n🎉 所有模板渲染测试通过")
+
+
+if __name__ == "__main__":
+    main()
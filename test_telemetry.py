@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+阶段耗时与性能分析 (telemetry.py) 测试
+
+验证阶段耗时的累加、嵌套、计数器、JSON输出结构、内存统计以及按需性能分析
+"""
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_package_module(name):
+    """不执行 __init__.py（依赖 ComfyUI 运行时）直接加载包内模块"""
+    if "tutu_pkg" not in sys.modules:
+        package = types.ModuleType("tutu_pkg")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["tutu_pkg"] = package
+    return importlib.import_module(f"tutu_pkg.{name}")
+
+
+telemetry = load_package_module("telemetry")
+
+
+def test_spans_accumulate_and_nest():
+    """测试同名阶段累加、嵌套阶段分别计时"""
+    print("=== 测试阶段计时 ===")
+    timer = telemetry.StageTimer(provider="OpenRouter")
+    with timer.span("payload_build"):
+        with timer.span("image_encode"):
+            time.sleep(0.01)
+    for _ in range(2):
+        with timer.span("decode"):
+            time.sleep(0.005)
+
+    assert timer.durations["payload_build"] >= timer.durations["image_encode"] >= 0.01
+    assert timer.durations["decode"] >= 0.01
+    print("✓ 嵌套与累加正确")
+
+    # 异常时同样记录耗时
+    try:
+        with timer.span("download"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert "download" in timer.durations
+    print("✓ 异常时仍记录耗时")
+
+
+def test_json_output():
+    """测试 timings 输出的JSON结构与阶段顺序"""
+    print("\n=== 测试JSON输出 ===")
+    timer = telemetry.StageTimer(provider="APICore.ai", images_requested=2)
+    timer.add("tensor_assembly", 0.002)
+    timer.add("connect_ttfb", 0.5)
+    timer.add("payload_build", 0.001)
+    timer.count("request_bytes", 100)
+    timer.count("request_bytes", 20)
+
+    data = json.loads(timer.to_json())
+    assert data["provider"] == "APICore.ai"
+    assert data["images_requested"] == 2
+    assert list(data["stages_ms"]) == ["payload_build", "connect_ttfb", "tensor_assembly"]
+    assert data["stages_ms"]["connect_ttfb"] == 500.0
+    assert data["counters"] == {"request_bytes": 120}
+    assert data["total_ms"] >= 0
+    assert "connect_ttfb=500.0ms" in str(timer)
+    print("✓ JSON结构正确")
+
+
+def test_response_bytes():
+    """测试响应字节数的获取"""
+    print("\n=== 测试响应字节数 ===")
+
+    class Raw:
+        def tell(self):
+            return 42
+
+    class Streamed:
+        raw = Raw()
+
+    class Buffered:
+        raw = None
+        _content = b"abcd"
+
+    assert telemetry.response_bytes(Streamed()) == 42
+    assert telemetry.response_bytes(Buffered()) == 4
+    assert telemetry.response_bytes(object()) == 0
+    print("✓ 流式与非流式响应都能统计")
+
+
+def test_memory_accounting():
+    """测试内存统计（RSS 需要 psutil，tracemalloc 仅在追踪时报告）"""
+    print("\n=== 测试内存统计 ===")
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        timer = telemetry.StageTimer(telemetry.MemoryTracker(), provider="OpenRouter")
+        with timer.span("decode"):
+            data = bytearray(8 * 1024 * 1024)
+        del data
+        memory = timer.as_dict()["memory"]
+        assert "traced_peak=+" in str(timer)
+    finally:
+        tracemalloc.stop()
+    assert memory["traced_peak_delta_mb"] >= 8.0
+    assert memory["traced_delta_mb"] < memory["traced_peak_delta_mb"]
+    if telemetry.psutil is not None:
+        assert memory["rss_peak_mb"] >= max(memory["rss_start_mb"], memory["rss_end_mb"]) - 0.1
+        assert "rss_peak=" in str(timer)
+    print(f"✓ 内存统计: {memory}")
+
+    # 未追踪时不启动 tracemalloc，也不报告其数据
+    timer = telemetry.StageTimer(telemetry.MemoryTracker())
+    assert not any(key.startswith("traced_") for key in timer.as_dict()["memory"])
+    assert "memory" not in telemetry.StageTimer().as_dict()
+    print("✓ 未追踪时只报告 RSS")
+
+
+def test_rss_sampling():
+    """测试后台采样记录阶段内部的RSS峰值"""
+    print("\n=== 测试RSS后台采样 ===")
+    rss = {"value": 100 * 1024 * 1024}
+
+    class FakeProcess:
+        def memory_info(self):
+            return types.SimpleNamespace(rss=rss["value"])
+
+    original = telemetry.psutil
+    telemetry.psutil = types.SimpleNamespace(Process=FakeProcess)
+    try:
+        timer = telemetry.StageTimer(telemetry.MemoryTracker(sample_interval=0.001))
+        with timer.span("decode"):
+            # 峰值只出现在阶段内部，阶段边界的采样看不到
+            rss["value"] = 500 * 1024 * 1024
+            time.sleep(0.05)
+            rss["value"] = 120 * 1024 * 1024
+        timer.memory.stop()
+        memory = timer.as_dict()["memory"]
+    finally:
+        telemetry.psutil = original
+    assert memory["rss_start_mb"] == 100.0 and memory["rss_end_mb"] == 120.0
+    assert memory["rss_peak_mb"] == 500.0 and memory["rss_peak_delta_mb"] == 400.0
+    assert "rss_peak=500.0MB(+400.0)" in str(timer)
+    print("✓ 阶段内部的峰值被记录")
+
+
+def test_profiling():
+    """测试性能分析输出文件以及报告中的路径"""
+    print("\n=== 测试性能分析 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        session = telemetry.ProfileSession("unit test", top_n=5, directory=temp_dir)
+        session.start()
+        data = [bytearray(1024) for _ in range(200)]
+        prof_path, report_path = session.stop()
+        assert os.path.dirname(prof_path) == temp_dir and "unit_test" in prof_path
+        assert os.path.getsize(prof_path) > 0
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = f.read()
+        assert "Top 5 allocations by line" in report and "cumulative time" in report
+        assert prof_path in session.summary()
+        del data
+        print("✓ 生成 .prof 文件与分配报告")
+
+        class Node:
+            @telemetry.profilable("node", report_index=1)
+            def run(self, text, profile=False):
+                return ("out", text)
+
+        os.environ.pop("TUTU_PROFILE", None)
+        assert Node().run("report") == ("out", "report")
+        result = Node().run("report", profile=[True])
+        assert result[0] == "out" and result[1].startswith("report\n\n**Profile**: ")
+        profiled_path = result[1].split("**Profile**: ")[1].splitlines()[0]
+        assert os.path.exists(profiled_path)
+        os.remove(profiled_path)
+        os.remove(profiled_path[:-len(".prof")] + ".txt")
+
+        os.environ["TUTU_PROFILE"] = "1"
+        try:
+            assert telemetry.profiling_requested(False)
+        finally:
+            os.environ.pop("TUTU_PROFILE")
+        assert not telemetry.profiling_requested([False])
+        print("✓ 节点设置或环境变量启用，结果路径写入报告输出")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    """运行所有测试"""
+    test_spans_accumulate_and_nest()
+    test_json_output()
+    test_response_bytes()
+    test_memory_accounting()
+    test_rss_sampling()
+    test_profiling()
+    print("\n🎉 所有阶段耗时测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+utils.py 图像转换工具测试
+
+验证批量 tensor/PIL 转换与逐张转换结果一致
+"""
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+# 添加当前目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import pil2tensor, tensor2pil, tensor2uint8, decode_image_bytes, uint8_to_tensor, encode_image, is_photographic, normalize_batch, downscale_to_max_side, decode_image_to_file, image_size, batch_memory_bytes, parse_resolution
+
+
+def _reference_tensor2pil(image):
+    """逐帧转换的参考实现"""
+    if image.dim() <= 3:
+        image = image.unsqueeze(0)
+    return [Image.fromarray(np.clip(255.0 * frame.cpu().numpy(), 0, 255).astype(np.uint8)) for frame in image]
+
+
+def test_tensor2pil_batch():
+    """测试批量 tensor 转 PIL"""
+    print("=== 测试批量 tensor2pil ===")
+    batch = torch.rand(16, 32, 24, 3) * 1.2 - 0.1
+    images = tensor2pil(batch)
+    expected = _reference_tensor2pil(batch)
+
+    assert len(images) == 16
+    for image, reference in zip(images, expected):
+        assert image.size == (24, 32)
+        assert np.array_equal(np.asarray(image), np.asarray(reference))
+    print("✓ 16帧批量转换结果与逐帧转换一致")
+
+
+def test_tensor2pil_single_frame():
+    """测试单帧 [H, W, 3] 输入"""
+    print("\n=== 测试单帧 tensor2pil ===")
+    frame = torch.rand(8, 8, 3)
+    images = tensor2pil(frame)
+    assert len(images) == 1
+    assert images[0].mode == 'RGB'
+    assert tensor2uint8(frame).shape == (1, 8, 8, 3)
+    print("✓ 单帧输入返回一张RGB图片")
+
+
+def test_pil2tensor_batch():
+    """测试同尺寸图片列表预分配转换"""
+    print("\n=== 测试批量 pil2tensor ===")
+    images = [Image.new('RGB', (20, 10), color=(i * 50, 100, 200)) for i in range(4)]
+    images.append(Image.new('RGBA', (20, 10), color=(1, 2, 3, 4)))
+
+    batch = pil2tensor(images)
+    assert batch.shape == (5, 10, 20, 3)
+    assert batch.dtype == torch.float32
+    for i, image in enumerate(images):
+        expected = torch.from_numpy(np.asarray(image.convert('RGB')).astype(np.float32) / 255.0)
+        assert torch.allclose(batch[i], expected, atol=1e-6)
+    print("✓ 批量结果与逐张转换一致")
+
+
+def test_pil2tensor_edge_cases():
+    """测试空列表与尺寸不一致的列表"""
+    print("\n=== 测试 pil2tensor 边界情况 ===")
+    assert pil2tensor([]).numel() == 0
+
+    mixed = [Image.new('RGB', (8, 8)), Image.new('RGB', (4, 4))]
+    try:
+        pil2tensor(mixed)
+    except RuntimeError:
+        print("✓ 尺寸不一致时保持原有的拼接报错行为")
+    else:
+        raise AssertionError("尺寸不一致的图片不应被拼接")
+
+
+def test_decode_image_bytes():
+    """测试图片字节直接解码为 uint8 并写入 float32 batch"""
+    print("\n=== 测试 decode_image_bytes / uint8_to_tensor ===")
+    source = Image.new('RGBA', (12, 6), color=(10, 20, 30, 255))
+    buffered = BytesIO()
+    source.save(buffered, format="PNG")
+
+    frame = decode_image_bytes(buffered.getvalue())
+    assert frame.dtype == np.uint8
+    assert frame.shape == (6, 12, 3)
+
+    batch = uint8_to_tensor([frame, frame])
+    assert batch.shape == (2, 6, 12, 3)
+    assert torch.allclose(batch[0], pil2tensor(source)[0])
+
+    try:
+        uint8_to_tensor([frame, frame[:3]])
+    except ValueError:
+        print("✓ 尺寸不一致的帧抛出 ValueError")
+    else:
+        raise AssertionError("尺寸不一致的帧不应被合并")
+
+
+def test_image_size_and_batch_memory():
+    """测试从图片头读取尺寸以及batch内存估算"""
+    print("\n=== 测试 image_size / batch_memory_bytes ===")
+    buffered = BytesIO()
+    Image.new('RGB', (300, 200), color=(1, 2, 3)).save(buffered, format="PNG")
+    data = buffered.getvalue()
+    assert image_size(data) == (300, 200)
+    assert image_size(data[:64]) == (300, 200)
+    assert image_size(b"not an image") is None
+
+    sizes = [(300, 200), (100, 50)]
+    frames = 300 * 200 * 3 + 100 * 50 * 3
+    assert batch_memory_bytes(sizes) == frames + 2 * 300 * 200 * 12
+    assert batch_memory_bytes(sizes, "resize to first") == frames + 2 * 300 * 200 * 12
+    assert batch_memory_bytes(sizes, "letterbox to target", (64, 32)) == frames + 2 * 64 * 32 * 12
+    assert batch_memory_bytes([]) == 0
+    # 与 normalize_batch 实际分配的 float32 batch 一致
+    batch = normalize_batch([np.zeros((h, w, 3), dtype=np.uint8) for w, h in sizes])
+    assert batch.numel() * 4 == batch_memory_bytes(sizes) - frames
+    print("✓ 只读取图片头即可得到尺寸，估算与实际batch一致")
+
+
+def test_decode_image_to_file():
+    """测试直接解码到映射文件后仍可组装为 batch"""
+    print("\n=== 测试 decode_image_to_file ===")
+    import shutil
+    import tempfile
+    import utils
+    directory = tempfile.mkdtemp()
+    chunk_bytes = utils.SPILL_CHUNK_BYTES
+    try:
+        # 用很小的行块覆盖分块复制和RGBA转换
+        utils.SPILL_CHUNK_BYTES = 12 * 3 * 4
+        frame = np.random.randint(0, 256, (10, 12, 3), dtype=np.uint8)
+        rgba = Image.fromarray(frame).convert('RGBA')
+        buffer = BytesIO()
+        rgba.save(buffer, format='PNG')
+        spilled = decode_image_to_file(buffer.getvalue(), directory)
+        assert isinstance(spilled, np.memmap) and spilled.shape == (10, 12, 3)
+        assert np.array_equal(spilled, frame)
+        assert len(os.listdir(directory)) == 1
+        batch = normalize_batch([spilled, frame[:3]])
+        assert torch.equal(batch[0], uint8_to_tensor(frame)[0])
+        del spilled
+        print("✓ 映射文件中的帧与原图一致")
+    finally:
+        utils.SPILL_CHUNK_BYTES = chunk_bytes
+        shutil.rmtree(directory)
+
+
+def test_encode_image_policies():
+    """测试输入图片编码策略与字节预算"""
+    print("\n=== 测试 encode_image ===")
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(rng.integers(0, 256, size=(128, 128, 3), dtype=np.uint8))
+    graphic = Image.new('RGB', (128, 128), color='white')
+
+    assert is_photographic(photo)
+    assert not is_photographic(graphic)
+
+    data, mime_type = encode_image(graphic, "PNG")
+    assert mime_type == "image/png"
+    assert np.array_equal(decode_image_bytes(data), np.asarray(graphic))
+
+    assert encode_image(photo, "JPEG (high quality)")[1] == "image/jpeg"
+    assert encode_image(photo, "Auto")[1] == "image/jpeg"
+    assert encode_image(graphic, "Auto")[1] == "image/png"
+
+    png_size = len(encode_image(photo, "PNG")[0])
+    data, mime_type = encode_image(photo, "PNG", byte_budget=png_size // 2)
+    assert len(data) <= png_size // 2
+    assert mime_type == "image/jpeg"
+
+    # 有预算时在同等质量的无损编码中选最小的
+    gradient = Image.fromarray(np.tile(np.arange(256, dtype=np.uint8), (64, 1)), 'L').convert('RGB')
+    lossless = [len(encode_image(gradient, policy)[0]) for policy in ("PNG", "WebP (lossless)")]
+    data, _ = encode_image(gradient, "PNG", byte_budget=max(lossless))
+    assert len(data) == min(lossless)
+    assert np.array_equal(decode_image_bytes(data), np.asarray(gradient))
+
+    # 大图与调色板图也能判断
+    assert not is_photographic(Image.new('P', (4000, 3000)))
+    assert is_photographic(photo.resize((2048, 2048), Image.NEAREST))
+
+    # 预算无法满足时返回最小的编码结果
+    data, _ = encode_image(photo, "PNG", byte_budget=1)
+    assert len(data) < png_size
+    print("✓ 编码策略与字节预算行为正确")
+
+
+def test_normalize_batch_modes():
+    """测试不同尺寸结果的batch对齐，确保不会丢弃任何一张图片"""
+    print("\n=== 测试 normalize_batch ===")
+    wide = np.zeros((100, 200, 3), dtype=np.uint8)
+    square = np.zeros((50, 50, 3), dtype=np.uint8)
+    frames = [wide, square, wide]
+
+    padded = normalize_batch(frames, "pad to largest")
+    assert padded.shape == (3, 100, 200, 3)
+    # 小图居中，四周用白色填充
+    assert padded[1, 0, 0].eq(1.0).all()
+    assert padded[1, 50, 100].eq(0.0).all()
+
+    letterboxed = normalize_batch(frames, "letterbox to target", (64, 64))
+    assert letterboxed.shape == (3, 64, 64, 3)
+    assert letterboxed[0, 0, 0].eq(1.0).all()
+    assert letterboxed[0, 32, 32].eq(0.0).all()
+
+    resized = normalize_batch(frames, "resize to first")
+    assert resized.shape == (3, 100, 200, 3)
+    assert resized[1].eq(0.0).all()
+
+    same_size = normalize_batch([wide, wide], "resize to first")
+    assert same_size.shape == (2, 100, 200, 3)
+    print("✓ 三种对齐模式均保留全部图片")
+
+    # 目标分辨率：非正数与格式错误都抛出 ValueError（节点据此回退到 pad to largest）
+    assert parse_resolution("1024x768") == (1024, 768)
+    for text in ("0x0", "-5x10", "1024x0", "1024", "axb", "1x2x3"):
+        try:
+            parse_resolution(text)
+        except ValueError:
+            continue
+        raise AssertionError(f"{text} 应被拒绝")
+    print("✓ 非正数或格式错误的目标分辨率被拒绝")
+
+
+def test_downscale_to_max_side():
+    """测试输入图片按长边上限缩小"""
+    print("\n=== 测试 downscale_to_max_side ===")
+    image = Image.new('RGB', (3000, 1500), color=(200, 100, 50))
+
+    reduced = downscale_to_max_side(image, 512)
+    assert reduced.size == (512, 256)
+    assert reduced.getpixel((100, 100)) == (200, 100, 50)
+
+    assert downscale_to_max_side(image, 0) is image
+    assert downscale_to_max_side(image, 4096) is image
+    print("✓ 超出上限时缩小，未超出或关闭时返回原图")
+
+
+def main():
+    """运行所有测试"""
+    test_tensor2pil_batch()
+    test_tensor2pil_single_frame()
+    test_pil2tensor_batch()
+    test_pil2tensor_edge_cases()
+    test_decode_image_bytes()
+    test_image_size_and_batch_memory()
+    test_decode_image_to_file()
+    test_encode_image_policies()
+    test_normalize_batch_modes()
+    test_downscale_to_max_side()
+    print("\n🎉 所有 utils 测试通过")
+
+
+if __name__ == "__main__":
+    main()
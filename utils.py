@@ -1,54 +1,375 @@
+import os
+import tempfile
 import numpy as np
 import torch
-from PIL import Image
-from typing import List, Union
+import torch.nn.functional as F
+from io import BytesIO
+from PIL import Image, features
+from typing import List, Optional, Tuple, Union
+
+def _pil_to_rgb(image: Image.Image) -> Image.Image:
+    """Return an RGB view of the image, converting only when needed."""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
 
 def pil2tensor(image: Union[Image.Image, List[Image.Image]]) -> torch.Tensor:
     """
     Convert PIL image(s) to tensor, matching ComfyUI's implementation.
-    
+
+    Lists of equally sized images are written into one preallocated
+    [B, H, W, 3] tensor instead of being concatenated from per-image tensors.
+
     Args:
         image: Single PIL Image or list of PIL Images
-        
+
     Returns:
         torch.Tensor: Image tensor with values normalized to [0, 1]
     """
     if isinstance(image, list):
         if len(image) == 0:
             return torch.empty(0)
-        return torch.cat([pil2tensor(img) for img in image], dim=0)
 
-    # Convert PIL image to RGB if needed
-    if image.mode == 'RGBA':
-        image = image.convert('RGB')
-    elif image.mode != 'RGB':
-        image = image.convert('RGB')
+        images = [_pil_to_rgb(img) for img in image]
+        if len({img.size for img in images}) > 1:
+            # 尺寸不一致时无法放入同一个batch，保持原有的拼接行为
+            return torch.cat([pil2tensor(img) for img in images], dim=0)
+
+        return uint8_to_tensor([np.asarray(img) for img in images])
+
+    # Normalize to [0, 1] and return tensor with shape [1, H, W, 3]
+    return uint8_to_tensor(np.asarray(_pil_to_rgb(image)))
+
+def tensor2uint8(image: torch.Tensor) -> np.ndarray:
+    """
+    Convert an image tensor to a uint8 numpy array in one pass.
+
+    The scale/clamp/cast runs once over the whole batch on the tensor's own
+    device, so only uint8 data is copied to the CPU.
+
+    Args:
+        image: Tensor with shape [B, H, W, C] or [H, W, C], values in range [0, 1]
 
-    # Convert to numpy array and normalize to [0, 1]
-    img_array = np.array(image).astype(np.float32) / 255.0
-    
-    # Return tensor with shape [1, H, W, 3]
-    return torch.from_numpy(img_array)[None,]
+    Returns:
+        np.ndarray: uint8 array with shape [B, H, W, C]
+    """
+    if image.dim() <= 3:
+        image = image.unsqueeze(0)
+    frames = image.detach().mul(255.0).clamp_(0, 255).to(dtype=torch.uint8)
+    return frames.cpu().numpy()
 
 def tensor2pil(image: torch.Tensor) -> List[Image.Image]:
     """
     Convert tensor to PIL image(s), matching ComfyUI's implementation.
-    
+
     Args:
         image: Tensor with shape [B, H, W, 3] or [H, W, 3], values in range [0, 1]
-        
+
     Returns:
         List[Image.Image]: List of PIL Images
     """
-    batch_count = image.size(0) if len(image.shape) > 3 else 1
-    if batch_count > 1:
-        out = []
-        for i in range(batch_count):
-            out.extend(tensor2pil(image[i]))
-        return out
-
-    # Convert tensor to numpy array, scale to [0, 255], and clip values
-    numpy_image = np.clip(255.0 * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8)
-    
-    # Convert numpy array to PIL Image
-    return [Image.fromarray(numpy_image)]
\ No newline at end of file
+    frames = tensor2uint8(image)
+    if frames.shape[-1] == 1:
+        frames = frames[..., 0]
+
+    # 每一帧都是batch数组上的零拷贝视图
+    return [Image.fromarray(frame) for frame in frames]
+
+def decode_image_bytes(data: bytes) -> np.ndarray:
+    """
+    Decode encoded image bytes (PNG/JPEG/WebP...) to an RGB uint8 array.
+
+    The uint8 pixels can be re-encoded or cached as-is; convert them to an
+    IMAGE tensor with uint8_to_tensor only when the float batch is needed.
+
+    Args:
+        data: Encoded image file contents
+
+    Returns:
+        np.ndarray: uint8 array with shape [H, W, 3]
+    """
+    with Image.open(BytesIO(data)) as image:
+        return np.asarray(_pil_to_rgb(image))
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) from the header of encoded image bytes.
+
+    Only the header is parsed, so a prefix of the file is enough for PNG,
+    WebP and most JPEGs. Returns None when the size cannot be determined.
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+# 转存到映射文件时每次复制的行块大小（字节）
+SPILL_CHUNK_BYTES = 4 * 1024 * 1024
+
+def decode_image_to_file(data: bytes, directory: str) -> np.memmap:
+    """
+    Decode encoded image bytes straight into a memory-mapped file in directory.
+
+    Rows are converted to RGB and copied in small strips, so besides
+    Pillow's decoded image no full-size array is ever allocated. The
+    returned array can be passed to normalize_batch like a decoded frame;
+    its pages are backed by the file, so the OS can drop them while the
+    remaining images are decoded. Remove the directory once the frames are
+    no longer referenced.
+
+    Args:
+        data: Encoded image file contents
+        directory: Existing directory for the spill file
+
+    Returns:
+        np.memmap: uint8 array with shape [H, W, 3]
+    """
+    with Image.open(BytesIO(data)) as image:
+        width, height = image.size
+        fd, path = tempfile.mkstemp(suffix=".u8", dir=directory)
+        os.close(fd)
+        spilled = np.memmap(path, dtype=np.uint8, mode="w+", shape=(height, width, 3))
+        rows = max(1, SPILL_CHUNK_BYTES // (width * 3))
+        for top in range(0, height, rows):
+            bottom = min(height, top + rows)
+            spilled[top:bottom] = np.asarray(_pil_to_rgb(image.crop((0, top, width, bottom))))
+    spilled.flush()
+    return spilled
+
+def uint8_to_tensor(frames: Union[np.ndarray, List[np.ndarray]]) -> torch.Tensor:
+    """
+    Scale uint8 frames straight into a preallocated float32 IMAGE batch.
+
+    Each frame is multiplied into its slot of the output in a single fused
+    step, so no intermediate float copies of the frames are created.
+
+    Args:
+        frames: List of [H, W, 3] uint8 arrays of equal size, or one
+            [B, H, W, 3] uint8 array
+
+    Returns:
+        torch.Tensor: Image tensor with shape [B, H, W, 3] and values in [0, 1]
+
+    Raises:
+        ValueError: If the frames do not all have the same shape
+    """
+    if isinstance(frames, np.ndarray) and frames.ndim == 3:
+        frames = frames[None,]
+    if len(frames) == 0:
+        return torch.empty(0)
+
+    shape = frames[0].shape
+    if any(frame.shape != shape for frame in frames):
+        raise ValueError(f"Frames have different shapes: {[frame.shape for frame in frames]}")
+
+    batch = torch.empty((len(frames),) + tuple(shape), dtype=torch.float32)
+    batch_array = batch.numpy()
+    for i, frame in enumerate(frames):
+        np.multiply(frame, 1.0 / 255.0, out=batch_array[i], casting='unsafe')
+    return batch
+
+def downscale_to_max_side(image: Image.Image, max_side: int) -> Image.Image:
+    """
+    Shrink an image so its long side is at most max_side pixels.
+
+    Large factors are first reduced with Image.reduce() (fast integer box
+    downsampling), then the remaining scale is done with LANCZOS.
+
+    Args:
+        image: PIL Image to shrink
+        max_side: Maximum long side in pixels (0 = no limit)
+
+    Returns:
+        Image.Image: The original image if it already fits, else a smaller copy
+    """
+    long_side = max(image.size)
+    if not max_side or long_side <= max_side:
+        return image
+
+    scale = long_side / max_side
+    target = (max(1, round(image.width / scale)), max(1, round(image.height / scale)))
+
+    # 先整数倍快速缩小，保留至少2倍余量给LANCZOS以保证质量
+    factor = int(scale // 2)
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image.resize(target, Image.LANCZOS)
+
+# 输入图片编码策略（节点下拉选项）
+IMAGE_ENCODING_OPTIONS = ["PNG", "WebP (lossless)", "JPEG (high quality)", "Auto"]
+
+# (Pillow格式, MIME类型, 保存参数)
+_PNG_FAST = ("PNG", "image/png", {"compress_level": 1})
+_WEBP_LOSSLESS = ("WEBP", "image/webp", {"lossless": True, "quality": 50, "method": 2})
+_JPEG_QUALITIES = [("JPEG", "image/jpeg", {"quality": q, "subsampling": 0 if q >= 90 else 2}) for q in (95, 90, 85)]
+
+def _encode(image: Image.Image, fmt: str, params: dict) -> bytes:
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffered = BytesIO()
+    image.save(buffered, format=fmt, **params)
+    return buffered.getvalue()
+
+def is_photographic(image: Image.Image) -> bool:
+    """
+    Guess whether an image is photo-like (many colors, no transparency).
+
+    Screenshots, line art and flat graphics compress far better losslessly,
+    while photos are much smaller as high-quality JPEG.
+    """
+    if "A" in image.getbands() and image.getextrema()[-1][0] < 255:
+        return False
+    # 先最近邻缩到64px再转RGB，避免整幅图像的颜色转换拷贝，也不会插值出新颜色
+    scale = 64 / max(image.size)
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.NEAREST)
+    return image.convert("RGB").getcolors(256) is None
+
+def encode_image(image: Image.Image, encoding: str = "PNG", byte_budget: int = 0) -> Tuple[bytes, str]:
+    """
+    Encode a PIL image for a request body or upload according to a policy.
+
+    Args:
+        image: PIL Image to encode
+        encoding: One of IMAGE_ENCODING_OPTIONS. "Auto" uses lossless
+            encoding for graphics and high-quality JPEG for photos.
+        byte_budget: Maximum encoded size in bytes (0 = unlimited). With a
+            budget, encodings of equal quality (PNG and lossless WebP) are
+            all tried and the smallest that fits is used; lower JPEG
+            qualities are only tried when nothing better fits. If none
+            fits, the smallest result is returned.
+
+    Returns:
+        Tuple[bytes, str]: Encoded bytes and their MIME type
+    """
+    webp = [_WEBP_LOSSLESS] if features.check("webp") else []
+    lossy = [[jpeg] for jpeg in _JPEG_QUALITIES]
+    if encoding == "Auto":
+        tiers = lossy if is_photographic(image) else [[_PNG_FAST] + webp] + lossy
+    elif encoding == "WebP (lossless)":
+        tiers = [webp + [_PNG_FAST]] + lossy
+    elif encoding == "JPEG (high quality)":
+        tiers = lossy
+    else:
+        tiers = [[_PNG_FAST] + webp] + lossy
+
+    smallest = None
+    for tier in tiers:
+        if not byte_budget:
+            fmt, mime_type, params = tier[0]
+            return _encode(image, fmt, params), mime_type
+        best = min(((_encode(image, fmt, params), mime_type) for fmt, mime_type, params in tier),
+                   key=lambda encoded: len(encoded[0]))
+        if len(best[0]) <= byte_budget:
+            return best
+        if smallest is None or len(best[0]) < len(smallest[0]):
+            smallest = best
+    return smallest
+
+# 多张结果尺寸不一致时的batch对齐方式（节点下拉选项）
+BATCH_SIZE_MODES = ["pad to largest", "letterbox to target", "resize to first"]
+
+def parse_resolution(text: str) -> Tuple[int, int]:
+    """
+    Parse a "WIDTHxHEIGHT" string such as "1024x1024".
+
+    Raises:
+        ValueError: If the text is malformed or a dimension is not positive
+    """
+    width, height = map(int, text.split('x'))
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Resolution must be positive: {text!r}")
+    return (width, height)
+
+def _resize_group(group: torch.Tensor, size: Tuple[int, int]) -> torch.Tensor:
+    """Resize a [N, H, W, 3] batch to (height, width) with one interpolate call."""
+    if tuple(group.shape[1:3]) == tuple(size):
+        return group
+    resized = F.interpolate(group.permute(0, 3, 1, 2), size=size, mode='bicubic',
+                            align_corners=False, antialias=True)
+    return resized.clamp_(0, 1).permute(0, 2, 3, 1)
+
+def batch_memory_bytes(sizes: List[Tuple[int, int]], mode: str = "pad to largest",
+                       target_size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    Bytes held while normalize_batch assembles frames of the given sizes.
+
+    Counts the uint8 frames and the float32 output batch, which are alive
+    at the same time.
+
+    Args:
+        sizes: (width, height) of each frame
+        mode: One of BATCH_SIZE_MODES, as passed to normalize_batch
+        target_size: (width, height) for "letterbox to target"
+
+    Returns:
+        int: Estimated bytes
+    """
+    if not sizes:
+        return 0
+    if mode == "letterbox to target" and target_size is not None:
+        out_w, out_h = target_size
+    elif mode == "resize to first" or len(set(sizes)) == 1:
+        out_w, out_h = sizes[0]
+    else:
+        out_w, out_h = max(w for w, _ in sizes), max(h for _, h in sizes)
+    return sum(w * h * 3 for w, h in sizes) + len(sizes) * out_w * out_h * 3 * 4
+
+def normalize_batch(frames: List[np.ndarray], mode: str = "pad to largest",
+                    target_size: Optional[Tuple[int, int]] = None, fill: float = 1.0) -> torch.Tensor:
+    """
+    Assemble uint8 frames of possibly different sizes into one IMAGE batch.
+
+    Frames are grouped by size; each group is converted and resized with a
+    single batched torch interpolation and written into a preallocated output.
+
+    Args:
+        frames: List of [H, W, 3] uint8 arrays
+        mode: One of BATCH_SIZE_MODES:
+            "pad to largest" centers every frame on a canvas of the largest
+            width and height without resampling;
+            "letterbox to target" scales every frame to fit target_size,
+            preserving aspect ratio, and centers it;
+            "resize to first" resizes every frame to the first frame's size.
+        target_size: (width, height), required for "letterbox to target"
+        fill: Padding value in [0, 1] (1.0 = white)
+
+    Returns:
+        torch.Tensor: Image tensor with shape [B, H, W, 3]
+    """
+    if len(frames) == 0:
+        return torch.empty(0)
+
+    sizes = [frame.shape[:2] for frame in frames]
+    if mode != "letterbox to target" and len(set(sizes)) == 1:
+        return uint8_to_tensor(frames)
+
+    if mode == "letterbox to target":
+        if target_size is None:
+            raise ValueError("target_size is required for letterbox mode")
+        out_h, out_w = target_size[1], target_size[0]
+    elif mode == "resize to first":
+        out_h, out_w = sizes[0]
+    else:
+        out_h, out_w = max(h for h, _ in sizes), max(w for _, w in sizes)
+
+    batch = torch.full((len(frames), out_h, out_w, 3), fill, dtype=torch.float32)
+    groups = {}
+    for i, size in enumerate(sizes):
+        groups.setdefault(size, []).append(i)
+
+    for (h, w), indices in groups.items():
+        if mode == "letterbox to target":
+            scale = min(out_w / w, out_h / h)
+            new_h, new_w = max(1, int(h * scale)), max(1, int(w * scale))
+        elif mode == "resize to first":
+            new_h, new_w = out_h, out_w
+        else:
+            new_h, new_w = h, w
+
+        group = _resize_group(uint8_to_tensor([frames[i] for i in indices]), (new_h, new_w))
+        top, left = (out_h - new_h) // 2, (out_w - new_w) // 2
+        batch[indices, top:top + new_h, left:left + new_w] = group
+
+    return batch